@@ -0,0 +1,76 @@
+"""
+Compares the eager and the TorchScript captioning backend side by side on the bundled test frames.
+
+Reports the mean latency per caption for both backends and whether the captions are identical.
+
+Usage:
+    poetry run python benchmarks/caption_backends.py [--precision fp32] [--repeat 3]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from NoKeeA.AI import video2text as v2t
+from NoKeeA.AI.caption_export import trace_caption_model
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "tests" / "assets"
+FRAMES = [ASSETS_DIR / "sample_frame.jpg", ASSETS_DIR / "text_frame.png"]
+
+
+def caption_frames(inputs: list, repeat: int):
+    """
+        Captions the preprocessed frames repeat times.
+
+        Returns:
+        - Mean seconds per caption and the captions of the last run.
+        """
+    captions = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        captions = []
+        for frame_inputs in inputs:
+            with torch.inference_mode():
+                output = v2t.blip_model.generate(**frame_inputs, max_length=50)
+            captions.append(v2t.blip_processor.decode(
+                output[0], skip_special_tokens=True).strip())
+    return (time.perf_counter() - start) / (repeat * len(inputs)), captions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--precision", default="fp32", choices=v2t.BLIP2_PRECISIONS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    v2t.load_image_description_model(args.precision, "eager")
+    inputs = []
+    for frame in FRAMES:
+        frame_inputs = v2t.blip_processor(
+            Image.open(frame).convert("RGB"), return_tensors="pt")
+        if args.precision == "bf16":
+            frame_inputs["pixel_values"] = frame_inputs["pixel_values"].to(
+                torch.bfloat16)
+        inputs.append(frame_inputs)
+
+    eager_latency, eager_captions = caption_frames(inputs, args.repeat)
+
+    start = time.perf_counter()
+    v2t.blip_model, backend = trace_caption_model(
+        v2t.blip_model, inputs[0]["pixel_values"])
+    trace_seconds = time.perf_counter() - start
+    traced_latency, traced_captions = caption_frames(inputs, args.repeat)
+
+    print(f"{'backend':<12} {'latency [s]':>12}")
+    print(f"{'eager':<12} {eager_latency:>12.3f}")
+    print(f"{backend:<12} {traced_latency:>12.3f}   (tracing took {trace_seconds:.1f} s)")
+    for frame, eager, traced in zip(FRAMES, eager_captions, traced_captions):
+        print(f"{frame.name}: {'equal' if eager == traced else 'DIFFERENT'}")
+        print(f"  eager:  {eager}")
+        print(f"  traced: {traced}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmarks the BLIP2 loading modes (fp32, bf16, int8) on the bundled test frames.
+
+Every mode runs in a fresh Python process, so the reported peak RSS belongs to that mode only.
+
+Usage:
+    poetry run python benchmarks/caption_precision.py [--modes fp32 bf16 int8] [--repeat 3]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "tests" / "assets"
+FRAMES = [ASSETS_DIR / "sample_frame.jpg", ASSETS_DIR / "text_frame.png"]
+
+
+def peak_rss_mb():
+    """
+        Returns the peak resident set size of the current process in MB.
+        """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def run_mode(mode: str, repeat: int) -> dict:
+    """
+        Loads the captioner in the given mode and captions the test frames.
+
+        Returns:
+        - Load time, captions per second, peak RSS and the generated captions.
+        """
+    import torch
+    from PIL import Image
+    from NoKeeA.AI import video2text as v2t
+
+    start = time.perf_counter()
+    v2t.load_image_description_model(mode)
+    load_seconds = time.perf_counter() - start
+
+    images = [Image.open(frame).convert("RGB") for frame in FRAMES]
+    captions = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        captions = []
+        for image in images:
+            inputs = v2t.blip_processor(image, return_tensors="pt")
+            if mode == "bf16":
+                inputs["pixel_values"] = inputs["pixel_values"].to(
+                    torch.bfloat16)
+            with torch.inference_mode():
+                output = v2t.blip_model.generate(**inputs, max_length=50)
+            captions.append(v2t.blip_processor.decode(
+                output[0], skip_special_tokens=True).strip())
+    caption_seconds = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "captions_per_second": repeat * len(images) / caption_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "captions": captions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_mode(args.single, args.repeat)))
+        return
+
+    results = []
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", mode, "--repeat", str(args.repeat)],
+            capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6} {'load [s]':>9} {'captions/s':>11} {'peak RSS [MB]':>14}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['load_seconds']:>9.1f} "
+              f"{result['captions_per_second']:>11.2f} {result['peak_rss_mb']:>14.0f}")
+    for result in results:
+        print(f"{result['mode']}: {result['captions']}")
+
+
+if __name__ == "__main__":
+    main()
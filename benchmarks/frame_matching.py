@@ -0,0 +1,84 @@
+"""
+Benchmarks the matching of frames to transcript segments (video2text.match_frames_with_audio) on synthetic videos.
+
+Generates a transcript with segments of 2-8 seconds separated by short pauses and frames sampled every second
+for every video length, and compares the interval-indexed matching with the former nested loop over all segments
+and frames.
+
+Usage:
+    poetry run python benchmarks/frame_matching.py [--hours 0.5 1 4] [--frame-rate 1] [--repeat 3]
+"""
+import argparse
+import math
+import random
+import time
+
+from NoKeeA.AI import video2text as v2t
+
+
+def synthetic_video(hours: float, frame_rate: float, seed: int = 0):
+    """
+        Returns transcript segments and frames of a synthetic video of the given length.
+        """
+    rng = random.Random(seed)
+    duration = hours * 3600
+    segments = []
+    time_ = 0.0
+    while time_ < duration:
+        length = rng.uniform(2, 8)
+        segments.append({"start": round(time_, 2), "end": round(time_ + length, 2), "text": "word " * 10})
+        time_ += length + rng.choice((0, 0, 0.5, 3))
+    frames = [{"path": f"frame_{i:06d}.jpg", "frame_number": i, "timestamp": round(i / frame_rate, 3)}
+              for i in range(int(duration * frame_rate))]
+    return segments, frames
+
+
+def nested_loop(video_frames, video_text):
+    """
+        The former matching: every segment scans all frames and frames in pauses are dropped.
+        """
+    for text_segment in video_text:
+        start = math.ceil(text_segment["start"])
+        end = math.floor(text_segment["end"])
+        text_segment["frames"] = []
+        for frame in video_frames:
+            if start <= frame.get("timestamp", frame["frame_number"]) <= end:
+                text_segment["frames"].append(frame)
+    return video_text
+
+
+def best_of(match, segments, frames, repeat: int):
+    """
+        Returns the fastest of repeat runs in seconds and the number of matched frames.
+        """
+    best = math.inf
+    matched = 0
+    for _ in range(repeat):
+        video_text = [dict(segment) for segment in segments]
+        start = time.perf_counter()
+        match(frames, video_text)
+        best = min(best, time.perf_counter() - start)
+        matched = sum(len(segment["frames"]) for segment in video_text)
+    return best, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", nargs="+", type=float, default=[0.5, 1, 4])
+    parser.add_argument("--frame-rate", type=float, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'hours':>6} {'segments':>9} {'frames':>8} {'nested [s]':>11} {'indexed [s]':>12} {'speedup':>8} "
+          f"{'dropped':>8}")
+    for hours in args.hours:
+        segments, frames = synthetic_video(hours, args.frame_rate)
+        nested, nested_matched = best_of(nested_loop, segments, frames, args.repeat)
+        indexed, indexed_matched = best_of(v2t.match_frames_with_audio, segments, frames, args.repeat)
+        assert indexed_matched == len(frames)
+        print(f"{hours:>6} {len(segments):>9} {len(frames):>8} {nested:>11.3f} {indexed:>12.4f} "
+              f"{nested / indexed:>7.0f}x {len(frames) - nested_matched:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmarks the loading modes of the local DeepSeek model on CPU (LLM_PRECISION and LLM_MAX_MEMORY).
+
+A configuration is a precision with an optional memory limit, e.g. "bf16:12GiB". Every configuration runs in a
+fresh Python process, so the reported peak RSS belongs to that configuration only. Configurations that do not fit
+are reported with the reason they were refused.
+
+Usage:
+    poetry run python benchmarks/llm_memory.py [--configs fp32 bf16 int8 bf16:12GiB] [--max-new-tokens 50]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+PROMPT = "Summarize: Today we look at the basics of supervised learning, linear regression and gradient descent."
+
+
+def peak_rss_mb():
+    """
+        Returns the peak resident set size of the current process in MB.
+        """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def run_config(config: str, max_new_tokens: int) -> dict:
+    """
+        Loads the summarizer in the given configuration and generates max_new_tokens tokens.
+
+        Returns:
+        - Load time, tokens per second, offloaded GiB and peak RSS, or the reason the configuration was refused.
+        """
+    precision, _, max_memory = config.partition(":")
+    os.environ["LLM_PRECISION"] = precision
+    if max_memory:
+        os.environ["LLM_MAX_MEMORY"] = max_memory
+
+    import torch
+    from NoKeeA.AI import video2text as v2t
+
+    start = time.perf_counter()
+    try:
+        v2t.load_summarizer_model()
+    except MemoryError as e:
+        return {"config": config, "refused": str(e), "peak_rss_mb": peak_rss_mb()}
+    load_seconds = time.perf_counter() - start
+
+    inputs = v2t.deepseek_tokenizer(PROMPT, return_tensors="pt")
+    start = time.perf_counter()
+    with torch.inference_mode():
+        output = v2t.deepseek_model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+    seconds = time.perf_counter() - start
+
+    return {
+        "config": config,
+        "load_seconds": load_seconds,
+        "tokens_per_second": (output.shape[1] - inputs["input_ids"].shape[1]) / seconds,
+        "offload_gib": v2t.deepseek_memory_plan["offload_bytes"] / 1024 ** 3,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--configs", nargs="+", default=["fp32", "bf16", "int8", "bf16:12GiB"])
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_config(args.single, args.max_new_tokens)))
+        return
+
+    results = []
+    for config in args.configs:
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", config, "--max-new-tokens", str(args.max_new_tokens)],
+            capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{'config':<12} {'load [s]':>9} {'tokens/s':>9} {'offload [GiB]':>14} {'peak RSS [MB]':>14}")
+    for result in results:
+        if "refused" in result:
+            print(f"{result['config']:<12} refused: {result['refused']}")
+            continue
+        print(f"{result['config']:<12} {result['load_seconds']:>9.1f} {result['tokens_per_second']:>9.2f} "
+              f"{result['offload_gib']:>14.1f} {result['peak_rss_mb']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
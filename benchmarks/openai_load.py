@@ -0,0 +1,63 @@
+"""
+Load-tests the OpenAI summarization path offline against the bundled OpenAI stand-in.
+
+Sends concurrent requests through video2text.use_openai and reports throughput and latency percentiles.
+Pass --base-url to test another OpenAI-compatible server instead.
+
+Usage:
+    poetry run python benchmarks/openai_load.py [--requests 200] [--concurrency 16] [--failure-rate 0.05]
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from NoKeeA.AI import video2text as v2t
+from NoKeeA.AI.openai_stub import OpenAIStub
+
+
+def timed_request(index: int):
+    start = time.perf_counter()
+    try:
+        v2t.use_openai(os.environ["OPENAI_API_KEY"], f"Request {index}: " + "word " * 200)
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--base-url")
+    args = parser.parse_args()
+
+    stub = None
+    if args.base_url is None:
+        stub = OpenAIStub(latency=args.latency, failure_rate=args.failure_rate).start()
+        args.base_url = stub.base_url
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(timed_request, range(args.requests)))
+    total = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, error in results if error is None)
+    errors = [error for _, error in results if error is not None]
+    print(f"requests: {args.requests}, concurrency: {args.concurrency}, errors: {len(errors)}")
+    print(f"throughput: {args.requests / total:.1f} requests/s")
+    if latencies:
+        print(f"latency p50: {statistics.median(latencies):.3f} s, "
+              f"p95: {latencies[int(0.95 * (len(latencies) - 1))]:.3f} s, max: {latencies[-1]:.3f} s")
+    if stub is not None:
+        print(f"stand-in received {stub.request_count} HTTP requests (incl. retries)")
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares local summarization with and without the draft model (assisted decoding).
+
+Reports tokens per second, the acceptance rate of the draft model and whether the greedy outputs are identical.
+The draft model is taken from the DRAFT_MODEL environment variable.
+
+Usage:
+    DRAFT_MODEL=<repo id> poetry run python benchmarks/speculative_decoding.py [--max-new-tokens 200]
+"""
+import argparse
+import os
+import time
+
+import torch
+
+from NoKeeA.AI import video2text as v2t
+
+SEGMENTS = [
+    {"start": 0, "end": 20, "text": "Today we look at the basics of supervised learning and linear regression.",
+     "frames": [{"text": "Supervised Learning", "description": "a slide with a title"}]},
+    {"start": 20, "end": 45, "text": "The model minimizes the mean squared error between predictions and labels "
+                                     "using gradient descent with a fixed learning rate.",
+     "frames": [{"text": "MSE = 1/n sum (y - y_hat)^2", "description": "a slide with a formula"}]},
+]
+
+
+def run(inputs: dict, max_new_tokens: int):
+    start = time.perf_counter()
+    with torch.inference_mode():
+        output = v2t.deepseek_generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+    seconds = time.perf_counter() - start
+    new_tokens = output.shape[1] - inputs["input_ids"].shape[1]
+    return output, new_tokens / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-new-tokens", type=int, default=200)
+    args = parser.parse_args()
+    if not os.getenv("DRAFT_MODEL"):
+        parser.error("DRAFT_MODEL is not set")
+
+    v2t.load_summarizer_model()
+    v2t.load_draft_model()
+    prompt = v2t.build_prompt(SEGMENTS)
+    inputs = v2t.deepseek_tokenizer(prompt, return_tensors="pt").to(v2t.deepseek_model.device)
+
+    draft_model = v2t.draft_model
+    v2t.draft_model = None
+    baseline, baseline_speed = run(dict(inputs), args.max_new_tokens)
+
+    v2t.draft_model = draft_model
+    before = dict(v2t.speculative_stats)
+    assisted, assisted_speed = run(dict(inputs), args.max_new_tokens)
+    proposed = v2t.speculative_stats["proposed"] - before["proposed"]
+    accepted = v2t.speculative_stats["accepted"] - before["accepted"]
+
+    print(f"{'mode':<10} {'tokens/s':>9}")
+    print(f"{'baseline':<10} {baseline_speed:>9.2f}")
+    print(f"{'assisted':<10} {assisted_speed:>9.2f}   (speedup {assisted_speed / baseline_speed:.2f}x)")
+    if v2t.draft_same_vocabulary:
+        print(f"acceptance rate: {accepted / max(1, proposed):.1%} ({accepted}/{proposed} proposed tokens)")
+    else:
+        print("acceptance rate: not measured, the draft model uses another vocabulary")
+    print(f"identical output: {torch.equal(baseline, assisted)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+from typing import Optional
+
+import psutil
+from typing_extensions import TypedDict
+
+from NoKeeA.AI import deadline, memory
+from NoKeeA.AI.memory import format_memory_size
+
+# Share of the total memory the admitted jobs may reserve together
+JOB_MEMORY_SHARE = float(os.getenv("JOB_MEMORY_SHARE", "0.9"))
+
+# Parameters of the models, used to estimate their memory before they are loaded
+WHISPER_PARAMETERS = {"tiny": 39e6, "base": 74e6, "small": 244e6, "medium": 769e6, "large": 1550e6, "turbo": 809e6}
+SMALL_CAPTION_PARAMETERS = 247e6
+BLIP2_PARAMETERS = 3.74e9
+DEEPSEEK_PARAMETERS = 15.7e9
+# Bytes per parameter of the BLIP2 precisions after loading
+BLIP2_BYTES_PER_PARAMETER = {"fp32": 4, "bf16": 2, "int8": 1.2}
+# Factor for activations and buffers on top of the weights of a model
+ACTIVATION_FACTOR = 1.3
+# Whisper keeps the decoded 16 kHz float audio, its padded copy and the mel spectrogram in memory
+AUDIO_BYTES_PER_SECOND = 16000 * 4 * 3
+# Interpreter, libraries, OpenCV and Tesseract
+BASE_BYTES = 1024 ** 3
+
+
+class AdmissionDecision(TypedDict):
+    admitted: bool
+    rejected: bool
+    reason: Optional[str]
+    bytes: int
+    components: dict
+
+
+def estimate_job_memory(params: dict, duration: float, loaded: set = frozenset(), budget: int = None) -> dict:
+    """
+        Estimates the peak memory of a video2text job.
+
+        Models stay loaded in the worker once they were used, so the peak is the sum of all models the job
+        needs plus the audio of the video. Models in loaded are already resident and cost nothing extra.
+
+        The local language model is loaded last and offloads the weights that do not fit to disk, see
+        memory.plan_llm_memory. It is estimated with the same plan as the loader, given the memory the other
+        components leave of the budget.
+
+        Arguments:
+        - params: Keyword arguments of the job for video2text.process_video.
+        - duration: Length of the video in seconds.
+        - loaded: Names of the models already loaded by the worker ("whisper-base", "blip", "blip2", "llm").
+        - budget: Memory for jobs in bytes. Defaults to JOB_MEMORY_SHARE of the total memory.
+
+        Returns:
+        - The estimated bytes per component.
+
+        Raises:
+        - MemoryError if the language model could not be loaded even with offloading.
+        """
+    from NoKeeA.AI import model_server
+    from NoKeeA.AI import video2text as v2t
+
+    components = {"base": BASE_BYTES, "audio": int(duration * AUDIO_BYTES_PER_SECOND)}
+    if model_server.get_client() is not None:
+        # The model server holds all models in its own process
+        return components
+
+    # A draft transcribes with the smallest Whisper model and describes no frames
+    draft = params.get("draft", False)
+    whisper = deadline.DEGRADED_WHISPER_MODEL if draft else v2t.WHISPER_MODEL
+    if f"whisper-{whisper}" not in loaded:
+        components[f"whisper-{whisper}"] = int(
+            WHISPER_PARAMETERS.get(whisper, WHISPER_PARAMETERS["large"]) * 4 * ACTIVATION_FACTOR)
+    if not draft and params.get("caption_quality", "fast") == "fast" and "blip" not in loaded:
+        components["blip"] = int(SMALL_CAPTION_PARAMETERS * 4 * ACTIVATION_FACTOR)
+    if not draft and "blip2" not in loaded:
+        components["blip2"] = int(
+            BLIP2_PARAMETERS * BLIP2_BYTES_PER_PARAMETER[v2t.BLIP2_PRECISION] * ACTIVATION_FACTOR)
+    if os.getenv("OPENAI_API_KEY") is None and "llm" not in loaded:
+        budget = int(psutil.virtual_memory().total * JOB_MEMORY_SHARE) if budget is None else budget
+        plan = memory.plan_llm_memory(int(DEEPSEEK_PARAMETERS), v2t.LLM_PRECISION, v2t.LLM_MAX_MEMORY,
+                                      available_memory=max(0, budget - sum(components.values())))
+        components["llm"] = min(plan["weights_bytes"], plan["max_memory"] + memory.LLM_MIN_RESIDENT_BYTES)
+    return components
+
+
+def loaded_models() -> set:
+    """
+        Returns the names of the models loaded in this process, see estimate_job_memory.
+        """
+    from NoKeeA.AI import video2text as v2t
+
+    loaded = {f"whisper-{name}" for name in v2t.whisper_models}
+    if v2t.small_blip_model is not None:
+        loaded.add("blip")
+    if v2t.blip_model is not None:
+        loaded.add("blip2")
+    if v2t.deepseek_model is not None:
+        loaded.add("llm")
+    return loaded
+
+
+def decide(needed: int, reserved: int, available: int = None, total: int = None,
+           components: dict = None) -> AdmissionDecision:
+    """
+        Decides whether a job with the estimated peak memory can start now.
+
+        A job starts if it fits into the live free memory and, together with the reservations of the running
+        jobs, into JOB_MEMORY_SHARE of the total memory. The second check keeps jobs that were started at the
+        same time from overcommitting before they allocated anything. A job that could not even run alone is
+        rejected.
+
+        Arguments:
+        - needed: Estimated peak memory of the job in bytes.
+        - reserved: Bytes reserved by the running jobs.
+        - available, total: Free and total memory in bytes. Measured with psutil if omitted.
+        - components: The estimate per component, reported with the decision.
+
+        Returns:
+        - The decision and, if the job has to wait or is rejected, the reason.
+        """
+    memory = psutil.virtual_memory()
+    available = memory.available if available is None else available
+    total = memory.total if total is None else total
+    budget = int(total * JOB_MEMORY_SHARE)
+    decision = {"admitted": False, "rejected": False, "reason": None, "bytes": needed,
+                "components": components or {}}
+
+    largest = ", ".join(f"{name} {format_memory_size(size)}" for name, size in sorted(
+        decision["components"].items(), key=lambda item: -item[1])[:3])
+    if needed > budget:
+        decision["rejected"] = True
+        decision["reason"] = f"Abgelehnt: Der Job braucht ca. {format_memory_size(needed)} ({largest}), " \
+                             f"der Host hat nur {format_memory_size(budget)} für Jobs. Kleinere Modelle " \
+                             f"(BLIP2_PRECISION=int8, LLM_MAX_MEMORY) oder OpenAI verwenden."
+    elif needed + reserved > budget:
+        decision["reason"] = f"Wartet auf Arbeitsspeicher: Der Job braucht ca. {format_memory_size(needed)}, " \
+                             f"laufende Jobs haben {format_memory_size(reserved)} von " \
+                             f"{format_memory_size(budget)} reserviert."
+    elif needed > available:
+        decision["reason"] = f"Wartet auf Arbeitsspeicher: Der Job braucht ca. {format_memory_size(needed)}, " \
+                             f"frei sind {format_memory_size(available)}."
+    else:
+        decision["admitted"] = True
+    return decision
+
+
+def admit_job(job: dict, reserved: int, loaded: set = None) -> AdmissionDecision:
+    """
+        Estimates the memory of a queued job and decides whether the calling worker may start it.
+        """
+    loaded = loaded_models() if loaded is None else loaded
+    from NoKeeA.AI import planner
+
+    duration = planner.probe_video(job["video_path"])["duration"]
+    try:
+        components = estimate_job_memory(job["params"], duration, loaded)
+    except MemoryError as e:
+        return {"admitted": False, "rejected": True, "reason": f"Abgelehnt: {e}", "bytes": 0, "components": {}}
+    return decide(sum(components.values()), reserved, components=components)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+# Content-addressed outputs of the pipeline stages (audio, transcript, frames, OCR, captions, matching)
+ARTIFACT_CACHE_FOLDER = Path("tmp") / "artifacts"
+
+# Increase the version of a stage whenever its code produces different output, so old artifacts are not reused
+STAGE_VERSIONS = {
+    "probe": 1,
+    "audio": 1,
+    "transcript": 1,
+    "frames": 2,
+    "ocr": 1,
+    "captions": 1,
+    "matching": 3,
+}
+
+# "resumed" counts the units of work (e.g. frames) taken over from checkpoints of interrupted stages
+artifact_cache_stats = {"hits": 0, "misses": 0, "resumed": 0}
+
+
+def stage_key(stage: str, inputs: list[str], params: dict) -> str:
+    """
+        Builds the content address of a stage output.
+
+        Arguments:
+        - stage: One of STAGE_VERSIONS.
+        - inputs: Keys of the inputs of the stage, e.g. the video hash or the keys of upstream stages.
+        - params: Parameters of the stage that change its output.
+
+        Returns:
+        - A hash of the stage, its code version, its inputs and its parameters.
+        """
+    if stage not in STAGE_VERSIONS:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {tuple(STAGE_VERSIONS)}")
+    key = json.dumps({"stage": stage, "version": STAGE_VERSIONS[stage], "inputs": inputs, "params": params},
+                     sort_keys=True)
+    return f"{stage}-{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def artifact_path(key: str, suffix: str = "") -> Path:
+    """
+        Returns the path of a file or folder artifact, e.g. the WAV file of the audio stage.
+        """
+    ARTIFACT_CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+    return ARTIFACT_CACHE_FOLDER / f"{key}{suffix}"
+
+
+def files(key: str) -> list[Path]:
+    """
+        Returns the existing files and folders of a stage output: its JSON, its checkpoint and its file or
+        folder artifact (e.g. a WAV file or the folder of the extracted frames).
+        """
+    if not ARTIFACT_CACHE_FOLDER.is_dir():
+        return []
+    # Files being written by save are still renamed
+    return sorted(path for path in ARTIFACT_CACHE_FOLDER.glob(f"{key}.*") if path.suffix != ".tmp")
+
+
+def load(key: str, valid=None):
+    """
+        Loads the JSON output of a stage and counts the hit or miss in artifact_cache_stats.
+
+        Arguments:
+        - key: Key of the output.
+        - valid: Optional check of the loaded output, e.g. whether the files it refers to still exist.
+
+        Returns:
+        - The output, or None if the stage has not run with these inputs and parameters yet.
+        """
+    path = ARTIFACT_CACHE_FOLDER / f"{key}.json"
+    value = None
+    if path.is_file():
+        with open(path) as f:
+            value = json.load(f)
+        if valid is not None and not valid(value):
+            value = None
+    artifact_cache_stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def exists(key: str) -> bool:
+    """
+        Returns whether the output of a stage is cached, without loading it or counting it in the stats.
+        """
+    return (ARTIFACT_CACHE_FOLDER / f"{key}.json").is_file()
+
+
+def save(key: str, value):
+    """
+        Stores the JSON output of a stage. The file is replaced atomically, so concurrent readers never see
+        a partial output.
+        """
+    path = artifact_path(key, ".json")
+    partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(partial, "w") as f:
+        json.dump(value, f)
+    os.replace(partial, path)
+    checkpoint_path(key).unlink(missing_ok=True)
+
+
+def checkpoint_path(key: str) -> Path:
+    return ARTIFACT_CACHE_FOLDER / f"{key}.partial.jsonl"
+
+
+def load_checkpoint(key: str) -> dict:
+    """
+        Loads the units of work an interrupted stage already completed and counts them in artifact_cache_stats.
+
+        A line that was cut off by a crash is ignored.
+
+        Returns:
+        - The completed units by their index.
+        """
+    done = {}
+    path = checkpoint_path(key)
+    if path.is_file():
+        with open(path) as f:
+            for line in f:
+                try:
+                    unit = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[unit["index"]] = unit["value"]
+    artifact_cache_stats["resumed"] += len(done)
+    return done
+
+
+def append_checkpoint(key: str, index: int, value):
+    """
+        Records a completed unit of work of a stage, so a restarted stage does not repeat it.
+        """
+    with open(artifact_path(key, ".partial.jsonl"), "a") as f:
+        f.write(json.dumps({"index": index, "value": value}) + "\n")
@@ -0,0 +1,116 @@
+import torch
+from transformers.modeling_outputs import BaseModelOutput, BaseModelOutputWithPooling
+
+# Captioning backends: "eager" runs the PyTorch modules as they are, "torchscript" replaces the image encoder
+# (vision model and Q-Former) with traced TorchScript graphs. The autoregressive language model stays eager.
+CAPTION_BACKENDS = ("eager", "torchscript")
+
+
+class _VisionEncoder(torch.nn.Module):
+    """
+        Adapts the BLIP2 vision model to a tensor-only signature that can be traced.
+        """
+
+    def __init__(self, vision_model):
+        super().__init__()
+        self.vision_model = vision_model
+
+    def forward(self, pixel_values):
+        outputs = self.vision_model(pixel_values, return_dict=False)
+        return outputs[0], outputs[1]
+
+
+class _QFormerEncoder(torch.nn.Module):
+    """
+        Adapts the BLIP2 Q-Former to a tensor-only signature that can be traced.
+        """
+
+    def __init__(self, qformer):
+        super().__init__()
+        self.qformer = qformer
+
+    def forward(self, query_embeds, encoder_hidden_states, encoder_attention_mask):
+        return self.qformer(
+            query_embeds=query_embeds,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+            return_dict=False,
+        )[0]
+
+
+class TracedVisionModel(torch.nn.Module):
+    """
+        Drop-in replacement for Blip2VisionModel that runs a traced graph.
+        """
+
+    def __init__(self, traced, config):
+        super().__init__()
+        self.traced = traced
+        self.config = config
+
+    def forward(self, pixel_values, return_dict=True, interpolate_pos_encoding=False, **kwargs):
+        if interpolate_pos_encoding:
+            raise NotImplementedError(
+                "The traced vision model does not support interpolate_pos_encoding")
+        last_hidden_state, pooler_output = self.traced(pixel_values)
+        if not return_dict:
+            return last_hidden_state, pooler_output
+        return BaseModelOutputWithPooling(last_hidden_state=last_hidden_state, pooler_output=pooler_output)
+
+
+class TracedQFormer(torch.nn.Module):
+    """
+        Drop-in replacement for Blip2QFormerModel that runs a traced graph.
+        """
+
+    def __init__(self, traced, config):
+        super().__init__()
+        self.traced = traced
+        self.config = config
+
+    def forward(self, query_embeds, encoder_hidden_states=None, encoder_attention_mask=None, return_dict=True,
+                **kwargs):
+        last_hidden_state = self.traced(
+            query_embeds, encoder_hidden_states, encoder_attention_mask)
+        if not return_dict:
+            return (last_hidden_state,)
+        return BaseModelOutput(last_hidden_state=last_hidden_state)
+
+
+def trace_caption_model(model, pixel_values: torch.Tensor):
+    """
+        Replaces the image encoder of a Blip2ForConditionalGeneration model with traced TorchScript graphs.
+
+        The model keeps its interface, so model.generate(**inputs) works unchanged. If tracing fails for any
+        reason, the model is returned untouched and keeps running in eager mode.
+
+        Arguments:
+        - model: The loaded BLIP2 model.
+        - pixel_values: Example input as produced by the BLIP2 processor.
+
+        Returns:
+        - The model and the name of the backend that is actually in use ("torchscript" or "eager").
+        """
+    try:
+        with torch.no_grad():
+            vision = torch.jit.trace(
+                _VisionEncoder(model.vision_model).eval(), (pixel_values,), check_trace=False)
+            vision = torch.jit.freeze(vision)
+            image_embeds = vision(pixel_values)[0]
+
+            query_tokens = model.query_tokens.expand(
+                image_embeds.shape[0], -1, -1)
+            image_attention_mask = torch.ones(
+                image_embeds.size()[:-1], dtype=torch.long)
+            qformer = torch.jit.trace(
+                _QFormerEncoder(model.qformer).eval(),
+                (query_tokens, image_embeds, image_attention_mask),
+                check_trace=False)
+            qformer = torch.jit.freeze(qformer)
+    except Exception as e:
+        print(f"Tracing the captioning model failed, using eager mode: {e}")
+        return model, "eager"
+
+    model.vision_model = TracedVisionModel(vision, model.vision_model.config)
+    model.qformer = TracedQFormer(qformer, model.qformer.config)
+    return model, "torchscript"
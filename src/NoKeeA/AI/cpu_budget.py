@@ -0,0 +1,117 @@
+import os
+
+import cv2
+import torch
+from typing_extensions import TypedDict
+
+
+def _usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Threads all concurrent jobs of this host may keep busy together
+CPU_THREADS = int(os.getenv("CPU_THREADS", "0")) or _usable_cpus()
+
+# The pool that does the work of a stage and gets its threads. The other pools of the stage get one thread.
+# "subprocess" are the threads of an external program (ffmpeg -threads, OMP_THREAD_LIMIT of Tesseract) and
+# "workers" the size of a pool running one single-threaded unit of work (e.g. a Tesseract call) per thread.
+STAGE_POOLS = {
+    "probe": None,
+    "audio": "subprocess",
+    "transcript": "torch",
+    "frames": "opencv",
+    "ocr": "workers",
+    "captions": "torch",
+    "matching": None,
+    "summary": "torch",
+}
+
+# Jobs running at the same time on this host; set by the worker before it runs a job
+job_slots = 1
+# The thread pools of torch and OpenCV and OMP_THREAD_LIMIT are process-wide, so the budget only applies in worker
+# processes, which run one job at a time; set by jobs.work. In the Streamlit process (VIDEO2TEXT_JOBS=inline) all
+# sessions share one process, so the stages run with UNBUDGETED there and nothing is applied or recorded.
+enabled = False
+
+
+class CpuAllocation(TypedDict):
+    stage: str
+    threads: int
+    torch: int
+    opencv: int
+    workers: int
+    subprocess: int
+
+
+def allocate(stage: str, jobs: int = None) -> CpuAllocation:
+    """
+        Splits the CPU budget of a job among the thread pools of a stage.
+
+        Every job gets an equal share of CPU_THREADS, so concurrent jobs do not oversubscribe the host. Within
+        the job, the pool named in STAGE_POOLS gets the whole share.
+
+        Arguments:
+        - stage: One of STAGE_POOLS.
+        - jobs: Number of jobs running at the same time. Defaults to job_slots.
+
+        Returns:
+        - The threads of the job and of every pool.
+        """
+    if stage not in STAGE_POOLS:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {tuple(STAGE_POOLS)}")
+    jobs = job_slots if jobs is None else jobs
+    threads = max(1, CPU_THREADS // max(1, jobs))
+    allocation = {"stage": stage, "threads": threads, "torch": 1, "opencv": 1, "workers": 1, "subprocess": 1}
+    if STAGE_POOLS[stage] is not None:
+        allocation[STAGE_POOLS[stage]] = threads
+    return allocation
+
+
+def apply(allocation: CpuAllocation):
+    """
+        Sizes the thread pools of torch and OpenCV and limits the OpenMP threads of subprocesses (Tesseract).
+        """
+    torch.set_num_threads(allocation["torch"])
+    cv2.setNumThreads(allocation["opencv"])
+    os.environ["OMP_THREAD_LIMIT"] = str(allocation["subprocess"])
+
+
+# Pool sizes without a budget: the libraries keep their own threads and Tesseract runs one call at a time
+UNBUDGETED: CpuAllocation = {"stage": "", "threads": CPU_THREADS, "torch": CPU_THREADS, "opencv": CPU_THREADS,
+                             "workers": 1, "subprocess": CPU_THREADS}
+
+# Allocation of the running stage, read by the stages for their pool sizes
+current = UNBUDGETED
+# Allocations of the stages of the current job, recorded in the job metrics
+allocations = {}
+
+
+def use(stage: str) -> CpuAllocation:
+    """
+        Allocates and applies the threads of a stage that is about to run and records the allocation.
+
+        Returns UNBUDGETED without changing anything if the budget is not enabled.
+        """
+    global current
+    if not enabled:
+        return current
+    current = allocate(stage)
+    apply(current)
+    allocations[stage] = current
+    return current
+
+
+def reset():
+    """
+        Forgets the allocations of the previous job.
+        """
+    allocations.clear()
+
+
+def report() -> dict:
+    """
+        Returns the budget and the allocations of the current job for the job metrics.
+        """
+    return {"cpu_threads": CPU_THREADS, "jobs": job_slots, "stages": dict(allocations)}
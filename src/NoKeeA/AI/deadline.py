@@ -0,0 +1,130 @@
+import time
+from typing import Optional
+
+from typing_extensions import TypedDict
+
+# Rough processing cost of the stages on a CPU, used to project when the remaining stages finish
+WHISPER_SECONDS_PER_AUDIO_SECOND = {"tiny": 0.03, "base": 0.07, "small": 0.2, "medium": 0.5, "large": 1.0,
+                                    "turbo": 0.3}
+FRAME_SECONDS_PER_VIDEO_SECOND = 0.02
+# Share of the sampled frames that differ enough from their predecessor to be kept
+KEPT_FRAME_SHARE = 0.3
+OCR_SECONDS_PER_FRAME = 0.4
+CAPTION_SECONDS_PER_FRAME = {"fast": 0.5, "high": 3.0}
+SUMMARY_SECONDS = 60
+
+# Degradations applied one after another while the projected finish misses the deadline
+DEGRADATION_LADDER = ("fewer_frames", "smaller_whisper", "skip_captions")
+DEGRADATION_NAMES = {
+    "fewer_frames": "weniger Frames",
+    "smaller_whisper": "kleineres Whisper-Modell",
+    "skip_captions": "ohne Bildbeschreibung",
+}
+DEGRADED_FRAME_RATE = 0.2
+DEGRADED_WHISPER_MODEL = "tiny"
+# The stages a degradation changes; it is pointless once they ran
+DEGRADED_STAGES = {
+    "fewer_frames": "frames",
+    "smaller_whisper": "transcript",
+    "skip_captions": "captions",
+}
+
+# Seconds between two calls of the cancel check, which may query the job database
+CANCEL_POLL_INTERVAL = 1.0
+
+
+class Cancelled(Exception):
+    """
+        Raised at the next unit of work after a job was cancelled.
+        """
+
+
+class PipelineSettings(TypedDict, total=False):
+    frame_rate: float
+    whisper_model: str
+    caption_quality: str
+    captions: bool
+    # Whether the video has an audio and a video stream, see planner.plan_pipeline
+    audio: bool
+    video: bool
+
+
+def project_runtime(settings: PipelineSettings, duration: float, stages: list[str]) -> float:
+    """
+        Projects the seconds the given stages take for a video.
+
+        Arguments:
+        - settings: Settings of the pipeline.
+        - duration: Length of the video in seconds.
+        - stages: Stages that still have to run, see artifact_cache.STAGE_VERSIONS and "summary".
+        """
+    frames = duration * settings["frame_rate"] * KEPT_FRAME_SHARE if settings.get("video", True) else 0
+    costs = {
+        "transcript": duration * WHISPER_SECONDS_PER_AUDIO_SECOND.get(settings["whisper_model"], 1.0)
+        if settings.get("audio", True) else 0,
+        "frames": duration * FRAME_SECONDS_PER_VIDEO_SECOND if settings.get("video", True) else 0,
+        "ocr": frames * OCR_SECONDS_PER_FRAME,
+        "captions": frames * CAPTION_SECONDS_PER_FRAME[settings["caption_quality"]] if settings["captions"] else 0,
+        "summary": SUMMARY_SECONDS,
+    }
+    return sum(costs.get(stage, 0) for stage in stages)
+
+
+class DeadlineToken:
+    """
+        Deadline and cancel flag of a job, checked by the pipeline between units of work.
+
+        Arguments:
+        - deadline: Wall-clock time (time.time()) the job should be finished by, or None.
+        - cancelled: Optional function returning whether the job was cancelled, e.g. JobQueue.cancel_requested.
+        """
+
+    def __init__(self, deadline: float = None, cancelled=None):
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.degradations = []
+        self._last_poll = 0.0
+
+    def check(self):
+        """
+            Raises Cancelled if the job was cancelled. The cancel check runs at most every CANCEL_POLL_INTERVAL.
+            """
+        if self.cancelled is None or time.monotonic() - self._last_poll < CANCEL_POLL_INTERVAL:
+            return
+        self._last_poll = time.monotonic()
+        if self.cancelled():
+            raise Cancelled("Job was cancelled")
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def degrade(self, settings: PipelineSettings, duration: float, pending) -> list[str]:
+        """
+            Applies the degradations of DEGRADATION_LADDER to the settings until the projected runtime of the
+            pending stages fits into the remaining time. Degradations of stages that already ran are skipped.
+
+            Arguments:
+            - settings: Settings of the pipeline, changed in place.
+            - duration: Length of the video in seconds.
+            - pending: Function returning the stages that still have to run with the given settings.
+
+            Returns:
+            - The newly applied degradations. All applied degradations are kept in self.degradations.
+            """
+        applied = []
+        for degradation in DEGRADATION_LADDER:
+            stages = pending(settings)
+            remaining = self.remaining()
+            if remaining is None or project_runtime(settings, duration, stages) <= remaining:
+                break
+            if degradation in self.degradations or DEGRADED_STAGES[degradation] not in stages:
+                continue
+            if degradation == "fewer_frames":
+                settings["frame_rate"] = min(settings["frame_rate"], DEGRADED_FRAME_RATE)
+            elif degradation == "smaller_whisper":
+                settings["whisper_model"] = DEGRADED_WHISPER_MODEL
+            else:
+                settings["captions"] = False
+            self.degradations.append(degradation)
+            applied.append(degradation)
+        return applied
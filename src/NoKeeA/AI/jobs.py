@@ -0,0 +1,474 @@
+import argparse
+import json
+import multiprocessing
+import numbers
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from typing_extensions import TypedDict
+
+# "background" runs video2text in worker processes, "inline" runs it in the Streamlit script thread
+JOB_MODE = os.getenv("VIDEO2TEXT_JOBS", "background")
+JOBS_DATABASE = Path("tmp") / "jobs.sqlite3"
+# Number of worker processes the UI keeps alive
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Seconds without heartbeat after which a worker counts as dead and its running job is queued again
+WORKER_TIMEOUT = 30.0
+HEARTBEAT_INTERVAL = 5.0
+# A job whose worker died this often (e.g. killed for lack of memory) fails instead of being queued again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Progress values and streamed tokens are written at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    video_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress REAL,
+    progress_text TEXT,
+    messages TEXT NOT NULL DEFAULT '[]',
+    sections TEXT NOT NULL DEFAULT '{}',
+    partial TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    metrics TEXT NOT NULL DEFAULT '{}',
+    worker INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    collected INTEGER NOT NULL DEFAULT 0,
+    waiting_reason TEXT,
+    reserved_bytes INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    replaces TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+# Columns added after the first release of the job table, added to existing databases on start
+_ADDED_COLUMNS = {
+    "waiting_reason": "TEXT",
+    "reserved_bytes": "INTEGER NOT NULL DEFAULT 0",
+    "cancel_requested": "INTEGER NOT NULL DEFAULT 0",
+    "replaces": "TEXT",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class Job(TypedDict):
+    id: str
+    status: str
+    video_path: str
+    params: dict
+    progress: Optional[float]
+    progress_text: Optional[str]
+    messages: list[str]
+    sections: dict
+    partial: str
+    result: Optional[str]
+    error: Optional[str]
+    metrics: dict
+    worker: Optional[int]
+    created: float
+    started: Optional[float]
+    finished: Optional[float]
+    collected: bool
+    waiting_reason: Optional[str]
+    reserved_bytes: int
+    cancel_requested: bool
+    replaces: Optional[str]
+    attempts: int
+    position: int
+
+
+class JobQueue:
+    """
+        Persistent queue of video2text jobs in a SQLite database on local disk.
+
+        The UI submits jobs and polls them, worker processes claim and run them. Jobs survive page reloads and
+        restarts. A running job whose worker stopped sending heartbeats is queued again and resumes from the
+        artifact cache and its checkpoints.
+        """
+
+    def __init__(self, path=None):
+        self.path = Path(path or JOBS_DATABASE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        # Readers do not block the writing worker and vice versa
+        connection.execute("PRAGMA journal_mode=WAL")
+        return _Closing(connection)
+
+    def submit(self, video_path: str, params: dict = None, replaces: str = None) -> str:
+        """
+            Queues a job for a video saved by save_video.
+
+            Arguments:
+            - video_path: Path of the saved video.
+            - params: Keyword arguments for video2text.process_video.
+            - replaces: Id of a draft job whose result the result of this job replaces.
+
+            Returns:
+            - The id of the job.
+            """
+        job_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, video_path, params, created, replaces) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, str(video_path), json.dumps(params or {}), time.time(), replaces))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        jobs = self.get_many([job_id])
+        return jobs[0] if jobs else None
+
+    def get_many(self, job_ids: list[str]) -> list[Job]:
+        """
+            Loads several jobs with one query, so polling stays cheap.
+
+            Returns:
+            - The jobs in the order of job_ids. Unknown ids are skipped.
+            """
+        if not job_ids:
+            return []
+        placeholders = ",".join("?" * len(job_ids))
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT *, (SELECT COUNT(*) FROM jobs AS earlier WHERE earlier.status = 'queued' "
+                f"AND earlier.created < jobs.created) AS position FROM jobs WHERE id IN ({placeholders})",
+                job_ids).fetchall()
+        jobs = {row["id"]: _to_job(row) for row in rows}
+        return [jobs[job_id] for job_id in job_ids if job_id in jobs]
+
+    def claim(self, worker: int, admit=None) -> Optional[Job]:
+        """
+            Assigns the oldest queued job to a worker. Jobs of dead workers are queued again first, or fail
+            after JOB_MAX_ATTEMPTS claims, so a job that kills its worker does not crash worker after worker.
+
+            Arguments:
+            - worker: Process id of the worker.
+            - admit: Optional admission check, see admission.admit_job. It receives the job and the bytes
+              reserved by the running jobs. A job that has to wait keeps its place and its reason is stored in
+              waiting_reason, a rejected job fails with the reason. A job the check raises an error for (e.g. a
+              video that cannot be probed) fails with the error, so it does not block the jobs behind it. The
+              check may be slow (it probes the video), so it runs outside the write transaction; if another
+              worker changed the queue in the meantime, nothing is claimed and the next call decides again.
+
+            Returns:
+            - The claimed job, or None if the queue is empty or the oldest job has to wait.
+            """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' "
+                "WHEN attempts >= :attempts THEN 'failed' ELSE 'queued' END, "
+                "error = CASE WHEN NOT cancel_requested AND attempts >= :attempts THEN :error ELSE error END, "
+                "finished = CASE WHEN cancel_requested OR attempts >= :attempts THEN :now ELSE finished END, "
+                "worker = NULL WHERE status = 'running' AND worker NOT IN "
+                "(SELECT pid FROM workers WHERE heartbeat > :alive)",
+                {"attempts": JOB_MAX_ATTEMPTS, "now": now, "alive": now - WORKER_TIMEOUT,
+                 "error": f"Worker ist bei {JOB_MAX_ATTEMPTS} Versuchen abgestürzt, z. B. wegen zu wenig Speicher"})
+            head, reserved = self._head(connection)
+        if head is None:
+            return None
+        try:
+            decision = admit(_to_job(head), reserved) if admit is not None else None
+        except Exception as e:
+            decision = {"admitted": False, "rejected": True, "reason": f"{type(e).__name__}: {e}", "bytes": 0,
+                        "components": {}}
+
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row, current_reserved = self._head(connection)
+                reserved_bytes = 0
+                if row is None or row["id"] != head["id"] or (decision is not None and current_reserved != reserved):
+                    row = None
+                elif decision is not None:
+                    reserved_bytes = decision["bytes"]
+                    if decision["rejected"]:
+                        connection.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                            (decision["reason"], now, row["id"]))
+                        row = None
+                    elif not decision["admitted"]:
+                        connection.execute("UPDATE jobs SET waiting_reason = ? WHERE id = ?",
+                                           (decision["reason"], row["id"]))
+                        row = None
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, started = ?, waiting_reason = NULL, "
+                        "reserved_bytes = ?, attempts = attempts + 1 WHERE id = ?",
+                        (worker, now, reserved_bytes, row["id"]))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    @staticmethod
+    def _head(connection):
+        # The oldest queued job and the bytes reserved by the running jobs
+        row = connection.execute(
+            "SELECT *, 0 AS position FROM jobs WHERE status = 'queued' ORDER BY created, rowid LIMIT 1").fetchone()
+        reserved = connection.execute(
+            "SELECT COALESCE(SUM(reserved_bytes), 0) FROM jobs WHERE status = 'running'").fetchone()[0]
+        return row, reserved
+
+    def update(self, job_id: str, **fields):
+        """
+            Updates fields of a job, e.g. progress or messages. Lists and dicts are stored as JSON.
+            """
+        values = [json.dumps(value) if isinstance(value, (list, dict)) else value for value in fields.values()]
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*values, job_id))
+
+    def finish(self, job_id: str, result: str):
+        self.update(job_id, status="done", result=result, progress=1.0, finished=time.time())
+
+    def fail(self, job_id: str, error: str):
+        self.update(job_id, status="failed", error=error, finished=time.time())
+
+    def cancel(self, job_id: str):
+        """
+            Cancels a job. A queued job is cancelled right away, a running job at its next unit of work.
+            """
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                               (time.time(), job_id))
+            connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as connection:
+            row = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and bool(row["cancel_requested"])
+
+    def collect(self, job_id: str):
+        """
+            Marks the result of a job as inserted into a note, so it is not inserted twice.
+            """
+        self.update(job_id, collected=1)
+
+    def heartbeat(self, worker: int):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO workers (pid, heartbeat) VALUES (?, ?) "
+                "ON CONFLICT (pid) DO UPDATE SET heartbeat = excluded.heartbeat", (worker, time.time()))
+
+    def remove_worker(self, worker: int):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM workers WHERE pid = ?", (worker,))
+
+    def live_workers(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM workers WHERE heartbeat > ?",
+                                      (time.time() - WORKER_TIMEOUT,)).fetchone()[0]
+
+    def running_jobs(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+
+    def ensure_workers(self, count: int = None, command: list[str] = None) -> int:
+        """
+            Starts worker processes until count workers are alive.
+
+            The check and the registration of the new workers happen in one transaction, so concurrent sessions
+            do not start too many workers.
+
+            Arguments:
+            - count: Number of workers to keep alive. Defaults to JOB_WORKERS.
+            - command: Command starting one worker. Defaults to python -m NoKeeA.AI.jobs.
+
+            Returns:
+            - The number of started workers.
+            """
+        count = JOB_WORKERS if count is None else count
+        command = command or [sys.executable, "-m", "NoKeeA.AI.jobs", "--database", str(self.path)]
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                alive = connection.execute("SELECT COUNT(*) FROM workers WHERE heartbeat > ?",
+                                           (now - WORKER_TIMEOUT,)).fetchone()[0]
+                started = 0
+                for _ in range(max(0, count - alive)):
+                    with open(self.path.parent / "worker.log", "a") as log:
+                        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT,
+                                                   start_new_session=True)
+                    connection.execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)",
+                                       (process.pid, now))
+                    started += 1
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return started
+
+
+class _Closing:
+    """
+        Context manager closing a SQLite connection, which sqlite3's own context manager does not do.
+        """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, *args):
+        self.connection.close()
+
+
+def _to_job(row) -> Job:
+    job = dict(row)
+    for name in ("params", "messages", "sections", "metrics"):
+        job[name] = json.loads(job[name])
+    job["collected"] = bool(job["collected"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def get_queue() -> JobQueue:
+    return JobQueue(JOBS_DATABASE)
+
+
+def run_job(queue: JobQueue, job: Job):
+    """
+        Runs a claimed job and records its progress, part summaries, streamed text and result.
+
+        The job parameter "deadline" is the number of seconds after the submission the job should be finished
+        by. The pipeline degrades its quality to meet it and stops at the next unit of work if the job is
+        cancelled. The applied degradations and the CPU allocations are recorded in the job metrics.
+        """
+    import streamlit as st
+    from NoKeeA.AI import cpu_budget, deadline
+    from NoKeeA.AI import video2text as v2t
+
+    params = dict(job["params"])
+    seconds = params.pop("deadline", None)
+    token = deadline.DeadlineToken(job["created"] + seconds if seconds else None,
+                                   cancelled=lambda: queue.cancel_requested(job["id"]))
+
+    def record_metrics():
+        queue.update(job["id"], metrics={**job["metrics"], "cpu": cpu_budget.report(),
+                                         "degradations": token.degradations})
+
+    messages, sections, partial = [], {}, ""
+    last_write = 0.0
+    try:
+        gen = v2t.process_video(job["video_path"], **params, token=token)
+        while True:
+            step = next(gen)
+            if isinstance(step, str):
+                messages.append(step)
+                queue.update(job["id"], messages=messages)
+            elif isinstance(step, numbers.Number):
+                if time.monotonic() - last_write >= PROGRESS_INTERVAL:
+                    queue.update(job["id"], progress=float(step),
+                                 progress_text=st.session_state.get("video2text_progress_bar_text"))
+                    last_write = time.monotonic()
+            elif isinstance(step, dict) and step.get("event") == "section":
+                sections[str(step["index"])] = step
+                queue.update(job["id"], sections=sections)
+            elif isinstance(step, dict) and step.get("event") == "token":
+                partial += step["text"]
+                if time.monotonic() - last_write >= PROGRESS_INTERVAL:
+                    queue.update(job["id"], partial=partial)
+                    last_write = time.monotonic()
+    except StopIteration as e:
+        record_metrics()
+        queue.finish(job["id"], e.value)
+    except deadline.Cancelled:
+        record_metrics()
+        queue.update(job["id"], status="cancelled", finished=time.time())
+    except Exception as e:
+        record_metrics()
+        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+
+
+def work(database=None, poll_interval: float = 1.0, stop: threading.Event = None):
+    """
+        Worker loop: claims queued jobs one after another and runs them. A thread keeps the heartbeat going
+        while a long stage (e.g. the transcription) runs without yielding.
+        """
+    from NoKeeA.AI import admission, cpu_budget
+
+    queue = JobQueue(database)
+    worker = os.getpid()
+    stop = stop or threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            queue.heartbeat(worker)
+
+    queue.heartbeat(worker)
+    threading.Thread(target=beat, daemon=True).start()
+    # The process runs one job at a time, so it may size the process-wide thread pools for it
+    cpu_budget.enabled = True
+    try:
+        while not stop.is_set():
+            try:
+                job = queue.claim(worker, admission.admit_job)
+            except Exception as e:
+                # E.g. a locked database; the worker keeps serving the queue
+                print(f"Worker {worker} could not claim a job: {type(e).__name__}: {e}", flush=True)
+                job = None
+            if job is None:
+                stop.wait(poll_interval)
+                continue
+            print(f"Worker {worker} runs job {job['id']}", flush=True)
+            # The running jobs, this one included, share the CPU budget; idle workers get no share
+            cpu_budget.job_slots = max(1, queue.running_jobs())
+            run_job(queue, job)
+    finally:
+        cpu_budget.enabled = False
+        stop.set()
+        queue.remove_worker(worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs video2text worker processes.")
+    parser.add_argument("--database", default=str(JOBS_DATABASE))
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.workers == 1:
+        work(args.database)
+        return
+    processes = [multiprocessing.Process(target=work, args=(args.database,)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
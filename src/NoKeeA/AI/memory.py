@@ -0,0 +1,148 @@
+import json
+import re
+from pathlib import Path
+
+import psutil
+import torch
+from typing_extensions import TypedDict
+
+# Bytes per parameter of the dtype the weights are loaded in. int8 loads bf16 weights and quantizes them afterwards,
+# so the whole model has to fit into RAM once.
+LOAD_BYTES_PER_PARAMETER = {"fp32": 4, "bf16": 2, "int8": 2}
+# Memory kept free for activations, the key/value cache and the rest of the pipeline
+LLM_MIN_RESIDENT_BYTES = 2 * 1024 ** 3
+# Share of the available memory the model may use at most
+AVAILABLE_MEMORY_SHARE = 0.9
+
+_UNITS = {"": 1, "B": 1, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+          "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "TIB": 1024 ** 4}
+
+
+class LLMMemoryPlan(TypedDict):
+    precision: str
+    weights_bytes: int
+    max_memory: int
+    resident_bytes: int
+    offload_bytes: int
+
+
+def parse_memory_size(value) -> int:
+    """
+        Converts a memory size like "12GiB", "500MB" or 1024 to bytes.
+
+        Raises:
+        - ValueError if the value is not a memory size.
+        """
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", str(value))
+    if match is None or match.group(2).upper() not in _UNITS:
+        raise ValueError(f"Invalid memory size '{value}', expected e.g. '12GiB' or '500MB'")
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def format_memory_size(size: int) -> str:
+    return f"{size / 1024 ** 3:.1f} GiB"
+
+
+def checkpoint_parameters(local_dir) -> int:
+    """
+        Estimates the number of parameters of a downloaded checkpoint from the size of its weight files.
+
+        Returns:
+        - The number of parameters, or 0 if the folder contains no weights.
+        """
+    local_dir = Path(local_dir)
+    files = list(local_dir.glob("*.safetensors")) or list(local_dir.glob("*.bin"))
+    size = sum(file.stat().st_size for file in files)
+
+    bytes_per_parameter = 2
+    config = local_dir / "config.json"
+    if config.exists():
+        dtype = json.loads(config.read_text()).get("torch_dtype")
+        bytes_per_parameter = 4 if dtype in (None, "float32") else 2
+    return size // bytes_per_parameter
+
+
+def plan_llm_memory(parameters: int, precision: str = "fp32", max_memory=None, available_memory: int = None,
+                    free_disk: int = None) -> LLMMemoryPlan:
+    """
+        Decides how much of a language model stays in RAM and how much is offloaded to disk.
+
+        The weights are loaded up to the memory limit, the remaining layers are offloaded to memory-mapped files
+        and only read while they are needed.
+
+        Arguments:
+        - parameters: Number of parameters of the model.
+        - precision: One of LOAD_BYTES_PER_PARAMETER.
+        - max_memory: Upper bound of RAM for the language model, e.g. "12GiB". Defaults to the available memory.
+        - available_memory, free_disk: Free RAM and free space in the offload folder in bytes.
+          Measured with psutil if omitted.
+
+        Returns:
+        - The plan with the limit, the resident and the offloaded bytes.
+
+        Raises:
+        - MemoryError if the model does not fit into RAM and disk together.
+        """
+    if precision not in LOAD_BYTES_PER_PARAMETER:
+        raise ValueError(
+            f"Unknown LLM precision '{precision}', expected one of {tuple(LOAD_BYTES_PER_PARAMETER)}")
+    if available_memory is None:
+        available_memory = psutil.virtual_memory().available
+    weights_bytes = parameters * LOAD_BYTES_PER_PARAMETER[precision]
+
+    limit = int(available_memory * AVAILABLE_MEMORY_SHARE)
+    if max_memory is not None:
+        limit = min(limit, parse_memory_size(max_memory))
+    resident_bytes = max(0, min(weights_bytes, limit - LLM_MIN_RESIDENT_BYTES))
+    offload_bytes = weights_bytes - resident_bytes
+
+    if offload_bytes and resident_bytes <= 0:
+        raise MemoryError(
+            f"The language model needs at least {format_memory_size(LLM_MIN_RESIDENT_BYTES)} RAM besides its "
+            f"weights, but only {format_memory_size(limit)} are available. Free memory, raise LLM_MAX_MEMORY "
+            f"or use OpenAI.")
+    if offload_bytes and precision == "int8":
+        raise MemoryError(
+            f"The language model needs {format_memory_size(weights_bytes)} to be quantized to int8, but only "
+            f"{format_memory_size(resident_bytes)} are available. Offloaded layers cannot be quantized, use "
+            f"LLM_PRECISION=bf16 to offload them to disk.")
+    if offload_bytes and free_disk is not None and offload_bytes > free_disk:
+        raise MemoryError(
+            f"The language model ({precision}) needs {format_memory_size(weights_bytes)}, "
+            f"{format_memory_size(resident_bytes)} fit into RAM, but only {format_memory_size(free_disk)} of the "
+            f"remaining {format_memory_size(offload_bytes)} fit onto the disk. Use LLM_PRECISION=bf16, free "
+            f"disk space or use OpenAI.")
+
+    return {
+        "precision": precision,
+        "weights_bytes": weights_bytes,
+        "max_memory": limit - LLM_MIN_RESIDENT_BYTES,
+        "resident_bytes": resident_bytes,
+        "offload_bytes": offload_bytes,
+    }
+
+
+def quantize_linear_layers(model: torch.nn.Module) -> int:
+    """
+        Replaces the linear layers of a model with dynamically int8 quantized layers, one layer at a time.
+
+        Unlike torch.ao.quantization.quantize_dynamic, only one layer is converted to fp32 at a time, so the peak
+        memory stays close to the size of the bf16 model. The quantized layers compute in fp32, so the remaining
+        parameters (embeddings, norms) are converted to fp32 afterwards.
+
+        Returns:
+        - The number of quantized layers.
+        """
+    quantized = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child) is not torch.nn.Linear:
+                continue
+            child.float()
+            child.qconfig = torch.ao.quantization.default_dynamic_qconfig
+            setattr(parent, name, torch.ao.nn.quantized.dynamic.Linear.from_float(child))
+            quantized += 1
+    model.float()
+    return quantized
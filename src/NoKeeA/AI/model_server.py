@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+# Path of the Unix socket the pipeline uses to reach a running model server. Unset means in-process models.
+MODEL_SERVER_SOCKET = "MODEL_SERVER_SOCKET"
+
+
+class ModelServerError(Exception):
+    """
+        Raised by the client if the model server could not process a request.
+        """
+
+
+class DynamicBatcher:
+    """
+        Collects requests of one kind from concurrent callers and passes them to the handler in batches.
+
+        A batch is closed when it reaches max_batch_size or when max_wait seconds passed since its first request.
+        """
+
+    def __init__(self, handler: Callable[[list], list], max_batch_size: int = 8, max_wait: float = 0.05):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_sizes = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload) -> Future:
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.handler([payload for payload, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+        Reads newline-delimited JSON requests of one connection and answers each of them in order.
+        """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                batcher = self.server.batchers.get(request["kind"])
+                if batcher is None:
+                    raise ValueError(f"Unknown request kind '{request['kind']}'")
+                response = {"result": batcher.submit(request["payload"]).result()}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ModelServer:
+    """
+        Local model-serving daemon on a Unix socket.
+
+        The server owns the models and batches transcription, caption, OCR and generation requests of all
+        connected pipelines. It runs either as its own process (python -m NoKeeA.AI.model_server) or in-process
+        via start(), e.g. for tests.
+        """
+
+    def __init__(self, socket_path: str, handlers: Optional[dict] = None, max_batch_size: int = 8,
+                 max_wait: float = 0.05):
+        self.socket_path = str(socket_path)
+        handlers = handlers if handlers is not None else default_handlers()
+        self.batchers = {kind: DynamicBatcher(handler, max_batch_size, max_wait)
+                         for kind, handler in handlers.items()}
+        self._server = None
+        self._thread = None
+
+    def _bind(self):
+        Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.batchers = self.batchers
+
+    def serve_forever(self):
+        self._bind()
+        print(f"Model server listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def start(self):
+        self._bind()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            if self._thread is not None:
+                self._server.shutdown()
+                self._thread.join()
+            self._server.server_close()
+            self._server = None
+        for batcher in self.batchers.values():
+            batcher.close()
+        self.batchers = {}
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class ModelClient:
+    """
+        Thin client for the model server. Every thread uses its own connection.
+        """
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "file", None) is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.socket = sock
+            self._local.file = sock.makefile("rwb")
+        return self._local.file
+
+    def request(self, kind: str, payload: dict):
+        """
+            Sends one request and waits for its result.
+
+            Raises:
+            - ModelServerError if the server reported an error.
+            """
+        connection = self._connection()
+        connection.write(json.dumps(
+            {"kind": kind, "payload": payload}).encode() + b"\n")
+        connection.flush()
+        line = connection.readline()
+        if not line:
+            self.close()
+            raise ModelServerError("Model server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise ModelServerError(response["error"])
+        return response["result"]
+
+    def map(self, kind: str, payloads: list, concurrency: int = 8):
+        """
+            Sends requests concurrently, so the server can batch them.
+
+            Yields:
+            - The results in the order of the payloads.
+            """
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            yield from executor.map(lambda payload: self.request(kind, payload), payloads)
+
+    def close(self):
+        if getattr(self._local, "file", None) is not None:
+            self._local.file.close()
+            self._local.socket.close()
+            self._local.file = None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client() -> Optional[ModelClient]:
+    """
+        Returns a client for the model server configured in MODEL_SERVER_SOCKET, or None.
+
+        One client is kept per socket path, so its connections are reused between calls.
+        """
+    socket_path = os.getenv(MODEL_SERVER_SOCKET)
+    if not socket_path:
+        return None
+    with _clients_lock:
+        if socket_path not in _clients:
+            _clients[socket_path] = ModelClient(socket_path)
+        return _clients[socket_path]
+
+
+def _caption_batch(payloads: list) -> list:
+    from PIL import Image
+    import torch
+    from NoKeeA.AI import video2text as v2t
+
+    results = [None] * len(payloads)
+    for tier in ("small", "large"):
+        indices = [i for i, payload in enumerate(payloads)
+                   if payload.get("tier", "large") == tier]
+        if not indices:
+            continue
+        if tier == "small":
+            v2t.load_small_image_description_model()
+            processor, model = v2t.small_blip_processor, v2t.small_blip_model
+        else:
+            v2t.load_image_description_model()
+            processor, model = v2t.blip_processor, v2t.blip_model
+
+        images = [Image.open(payloads[i]["path"]).convert("RGB")
+                  for i in indices]
+        inputs = processor(images, return_tensors="pt")
+        if tier == "large" and v2t.blip_precision == "bf16":
+            inputs["pixel_values"] = inputs["pixel_values"].to(torch.bfloat16)
+        with torch.inference_mode():
+            output = model.generate(**inputs, max_length=50)
+        for i, text in zip(indices, processor.batch_decode(output, skip_special_tokens=True)):
+            results[i] = text.strip()
+    return results
+
+
+def _ocr_batch(payloads: list) -> list:
+    import pytesseract
+    from PIL import Image
+    from NoKeeA.AI import video2text as v2t
+
+    results = []
+    for payload in payloads:
+        data = pytesseract.image_to_data(Image.open(
+            payload["path"]), output_type=pytesseract.Output.DICT)
+        text, words = v2t.rebuild_ocr_text(
+            data, payload.get("min_confidence", v2t.OCR_MIN_CONFIDENCE))
+        results.append({"text": text, "words": words})
+    return results
+
+
+def _transcribe_batch(payloads: list) -> list:
+    from NoKeeA.AI import video2text as v2t
+
+    # Whisper transcribes one file at a time, the server only shares the loaded model
+    return [v2t.load_transcription_model(payload.get("model", "base")).transcribe(payload["path"])
+            for payload in payloads]
+
+
+def _generate_batch(payloads: list) -> list:
+    import torch
+    from NoKeeA.AI import video2text as v2t
+
+    v2t.load_summarizer_model()
+    tokenizer, model = v2t.deepseek_tokenizer, v2t.deepseek_model
+    if len(payloads) == 1:
+        # A single prompt can reuse the key/value cache of its static preamble and the draft model
+        inputs = v2t.deepseek_inputs(payloads[0]["prompt"])
+        with torch.inference_mode():
+            output = v2t.deepseek_generate(**inputs, temperature=v2t.DEEPSEEK_TEMPERATURE,
+                                           max_new_tokens=payloads[0].get("max_new_tokens", 500))
+        return [tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)]
+
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    inputs = tokenizer([payload["prompt"] for payload in payloads],
+                       return_tensors="pt", padding=True).to(model.device)
+    with torch.inference_mode():
+        output = model.generate(**inputs, temperature=v2t.DEEPSEEK_TEMPERATURE,
+                                max_new_tokens=max(payload.get("max_new_tokens", 500) for payload in payloads))
+    return tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+def default_handlers() -> dict:
+    """
+        Returns the batch handlers backed by the models of video2text.
+        """
+    return {
+        "transcribe": _transcribe_batch,
+        "caption": _caption_batch,
+        "ocr": _ocr_batch,
+        "generate": _generate_batch,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs the NoKeeA model server on a Unix socket.")
+    parser.add_argument("--socket", default=os.getenv(MODEL_SERVER_SOCKET, "tmp/models.sock"))
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=0.05,
+                        help="Seconds a batch waits for more requests")
+    args = parser.parse_args()
+
+    ModelServer(args.socket, max_batch_size=args.max_batch_size,
+                max_wait=args.max_wait).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
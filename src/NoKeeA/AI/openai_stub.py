@@ -0,0 +1,170 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+        Answers the OpenAI chat completion endpoint with a deterministic summary of the prompt.
+        """
+
+    def log_message(self, format, *args):
+        if self.server.stub.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": self.server.stub.model, "object": "model", "owned_by": "nokeea"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        if stub.should_fail():
+            self._send_json(503, {"error": {"message": "Simulated overload", "type": "server_error"}})
+            return
+
+        time.sleep(stub.latency)
+        words = stub.answer(body.get("messages", [])).split(" ")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", stub.model),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for index, word in enumerate(words):
+            time.sleep(stub.token_latency)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", stub.model),
+                "choices": [{"index": 0, "finish_reason": None,
+                             "delta": {"content": word if index == 0 else f" {word}"}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class OpenAIStub:
+    """
+        Local stand-in for the OpenAI chat completion API, used to test and load-test the OpenAI path offline.
+
+        Point the pipeline at it with OPENAI_BASE_URL=<stub.base_url> and any OPENAI_API_KEY.
+
+        Arguments:
+        - host, port: Address to listen on. Port 0 picks a free port.
+        - latency: Seconds before the answer starts.
+        - token_latency: Seconds between streamed words.
+        - failure_rate: Share of requests answered with HTTP 503.
+        - fail_first: Number of first requests answered with HTTP 503.
+        """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, token_latency: float = 0.0,
+                 failure_rate: float = 0.0, fail_first: int = 0, model: str = "gpt-3.5-turbo",
+                 verbose: bool = False):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.model = model
+        self.verbose = verbose
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.request_count += 1
+            if self.request_count <= self.fail_first:
+                return True
+        return random.random() < self.failure_rate
+
+    def answer(self, messages: list) -> str:
+        """
+            Builds a deterministic answer from the last user message.
+            """
+        prompt = messages[-1]["content"] if messages else ""
+        words = prompt.split()
+        return "Zusammenfassung: " + " ".join(words[-50:]) if words else "Zusammenfassung: -"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        print(f"OpenAI stand-in listening on {self.base_url}")
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs a local OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    OpenAIStub(args.host, args.port, args.latency, args.token_latency, args.failure_rate,
+               verbose=args.verbose).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
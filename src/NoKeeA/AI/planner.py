@@ -0,0 +1,272 @@
+import json
+import subprocess
+from fractions import Fraction
+from typing import Optional
+
+import cv2
+from typing_extensions import TypedDict
+
+from NoKeeA.AI import deadline
+
+# Frames compared to decide whether a video shows a still image (e.g. a podcast with a cover)
+STATIC_SAMPLES = 5
+# Seconds of audio extraction per second of video, added to the runtime estimate
+AUDIO_SECONDS_PER_VIDEO_SECOND = 0.005
+
+
+class MediaInfo(TypedDict):
+    duration: float
+    has_video: bool
+    # None if unknown, OpenCV cannot see audio streams
+    has_audio: Optional[bool]
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    width: int
+    height: int
+    fps: float
+    frame_count: int
+    source: str
+
+
+class ExecutionPlan(TypedDict):
+    audio: bool
+    video: bool
+    static: bool
+    frame_rate: float
+    estimated_seconds: float
+    skipped: list[str]
+
+
+def _rate(value: str) -> float:
+    try:
+        return float(Fraction(value))
+    except (ValueError, ZeroDivisionError, TypeError):
+        return 0.0
+
+
+def parse_ffprobe(data: dict) -> MediaInfo:
+    """
+        Reads the media info from the JSON output of ffprobe -show_format -show_streams.
+        """
+    streams = data.get("streams", [])
+    # Cover images of audio files are reported as video streams
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"
+                  and not stream.get("disposition", {}).get("attached_pic")), None)
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+
+    duration = float(data.get("format", {}).get("duration") or (video or audio or {}).get("duration") or 0)
+    fps = 0.0
+    frame_count = 0
+    if video is not None:
+        fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+        frame_count = int(video.get("nb_frames") or round(duration * fps))
+    return {
+        "duration": duration,
+        "has_video": video is not None,
+        "has_audio": audio is not None,
+        "video_codec": video and video.get("codec_name"),
+        "audio_codec": audio and audio.get("codec_name"),
+        "width": int(video.get("width", 0)) if video else 0,
+        "height": int(video.get("height", 0)) if video else 0,
+        "fps": fps,
+        "frame_count": frame_count,
+        "source": "ffprobe",
+    }
+
+
+def probe_with_opencv(path: str) -> MediaInfo:
+    """
+        Reads the media info from the container metadata OpenCV exposes. Used if ffprobe is not installed.
+        """
+    cap = cv2.VideoCapture(path)
+    try:
+        opened = cap.isOpened()
+        fps = cap.get(cv2.CAP_PROP_FPS) if opened else 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if opened else 0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) if opened else 0
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) if opened else 0
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)) if opened else 0
+    finally:
+        cap.release()
+    codec = "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\0 ") or None
+    return {
+        "duration": frame_count / fps if fps > 0 and frame_count > 0 else 0.0,
+        "has_video": opened and frame_count > 0,
+        "has_audio": None,
+        "video_codec": codec,
+        "audio_codec": None,
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "frame_count": frame_count,
+        "source": "opencv",
+    }
+
+
+def probe_video(path: str) -> MediaInfo:
+    """
+        Reads duration, streams, codecs and resolution of a video with ffprobe, or with OpenCV if ffprobe is
+        not installed or cannot read the file.
+        """
+    command = ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        return probe_with_opencv(path)
+    if result.returncode != 0:
+        return probe_with_opencv(path)
+    return parse_ffprobe(json.loads(result.stdout))
+
+
+def is_static_video(path: str, info: MediaInfo, threshold: float) -> bool:
+    """
+        Checks whether a video shows the same image all the time by comparing STATIC_SAMPLES frames spread over
+        the video with the first one.
+
+        Arguments:
+        - path: Path to the video.
+        - info: Media info of the video.
+        - threshold: Minimum difference percentage of two different frames, see video2text.image_difference.
+        """
+    from NoKeeA.AI.video2text import image_difference
+
+    if not info["has_video"] or info["frame_count"] < STATIC_SAMPLES:
+        return False
+    cap = cv2.VideoCapture(path)
+    try:
+        first = None
+        for sample in range(STATIC_SAMPLES):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, sample * (info["frame_count"] - 1) // (STATIC_SAMPLES - 1))
+            success, frame = cap.read()
+            if not success:
+                return False
+            if first is None:
+                first = frame
+            elif image_difference(first, frame) > threshold:
+                return False
+    finally:
+        cap.release()
+    return True
+
+
+def parse_time(text: str) -> float:
+    """
+        Parses a time like "90", "1:30" or "1:02:30" into seconds.
+        """
+    seconds = 0.0
+    for part in text.strip().split(":"):
+        if not part.strip():
+            raise ValueError(f"Invalid time '{text}', expected e.g. 90, 1:30 or 1:02:30")
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_ranges(text: str) -> list[list[float]]:
+    """
+        Parses time ranges like "1:00-5:30, 10:00-12:00" into [start, end] pairs in seconds.
+        """
+    ranges = []
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        start, separator, end = item.partition("-")
+        if not separator:
+            raise ValueError(f"Invalid time range '{item.strip()}', expected start-end")
+        ranges.append([parse_time(start), parse_time(end)])
+    return ranges
+
+
+def normalize_ranges(ranges, duration: float) -> Optional[list[list[float]]]:
+    """
+        Sorts time ranges, merges overlapping ones and clips them to the video.
+
+        Arguments:
+        - ranges: [start, end] pairs in seconds, or None for the whole video.
+        - duration: Length of the video in seconds, 0 if unknown.
+
+        Returns:
+        - The normalized ranges, or None if they cover the whole video.
+        """
+    if not ranges:
+        return None
+    merged = []
+    for start, end in sorted((float(start), float(end)) for start, end in ranges):
+        start = max(0.0, start)
+        end = min(end, duration) if duration > 0 else end
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    if not merged:
+        raise ValueError(f"The time ranges {ranges} do not overlap the video of {duration:.0f} seconds")
+    if duration > 0 and merged == [[0.0, duration]]:
+        return None
+    return merged
+
+
+def ranges_duration(ranges, duration: float) -> float:
+    """
+        Returns the seconds of the video covered by normalized time ranges.
+        """
+    return duration if ranges is None else sum(end - start for start, end in ranges)
+
+
+def in_ranges(timestamp: float, ranges) -> bool:
+    return ranges is None or any(start <= timestamp <= end for start, end in ranges)
+
+
+def plan_pipeline(info: MediaInfo, settings: deadline.PipelineSettings, static: bool = False) -> ExecutionPlan:
+    """
+        Decides which branches of the pipeline run for a video and estimates their runtime before any work
+        starts.
+
+        Videos without an audio stream skip the transcription, files without a video stream skip the frames.
+        A still image is sampled once instead of every 1 / frame_rate seconds, and no more frames are sampled
+        than the video has.
+
+        Arguments:
+        - info: Media info of the video, see probe_video.
+        - settings: Settings of the pipeline.
+        - static: Whether the video shows a still image, see is_static_video.
+
+        Returns:
+        - The plan. Its frame rate, audio and video flags are meant to be applied to the settings.
+        """
+    skipped = []
+    audio = info["has_audio"] is not False
+    if not audio:
+        skipped.append("keine Tonspur")
+    video = info["has_video"]
+    if not video:
+        skipped.append("keine Videospur")
+
+    frame_rate = settings["frame_rate"]
+    if video and static:
+        frame_rate = 1 / max(1.0, info["duration"])
+        skipped.append("Standbild, nur ein Frame")
+    elif video and info["fps"] > 0:
+        frame_rate = min(frame_rate, info["fps"])
+
+    planned = {**settings, "frame_rate": frame_rate, "audio": audio, "video": video}
+    stages = [stage for stage, runs in (("transcript", audio), ("frames", video), ("ocr", video),
+                                        ("captions", video), ("summary", True)) if runs]
+    estimated = deadline.project_runtime(planned, info["duration"], stages)
+    if audio:
+        estimated += info["duration"] * AUDIO_SECONDS_PER_VIDEO_SECOND
+    return {"audio": audio, "video": video, "static": static, "frame_rate": frame_rate,
+            "estimated_seconds": estimated, "skipped": skipped}
+
+
+def describe_plan(info: MediaInfo, plan: ExecutionPlan) -> str:
+    """
+        Returns a status message with the media info and the plan.
+        """
+    minutes, seconds = divmod(int(info["duration"]), 60)
+    codecs = "/".join(codec for codec in (info["video_codec"], info["audio_codec"]) if codec) or "unbekannt"
+    message = f"🧭 {minutes}:{seconds:02d} min, {info['width']}x{info['height']}, {codecs}, " \
+              f"geschätzte Verarbeitung ca. {max(1, round(plan['estimated_seconds'] / 60))} min"
+    if plan["skipped"]:
+        message += f" ({', '.join(plan['skipped'])})"
+    return message
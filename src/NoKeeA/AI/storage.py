@@ -0,0 +1,198 @@
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from typing_extensions import TypedDict
+
+from NoKeeA.AI import jobs
+from NoKeeA.AI.memory import parse_memory_size
+
+# Total size of the uploads, artifacts and summaries in tmp/. Least recently used videos are deleted beyond it.
+TMP_BUDGET = parse_memory_size(os.getenv("TMP_BUDGET", "20GiB"))
+STORAGE_DATABASE = Path("tmp") / "storage.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    video TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_video ON files (video);
+CREATE TABLE IF NOT EXISTS videos (
+    video TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pins (
+    id INTEGER PRIMARY KEY,
+    video TEXT NOT NULL,
+    pid INTEGER NOT NULL
+);
+"""
+
+
+class StorageUsage(TypedDict):
+    bytes: int
+    budget: int
+    videos: int
+    pinned: int
+
+
+def _connect():
+    STORAGE_DATABASE.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(STORAGE_DATABASE, timeout=30, isolation_level=None)
+    # Workers and the UI track files at the same time
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(_SCHEMA)
+    return closing(connection)
+
+
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    return path.stat().st_size if path.is_file() else 0
+
+
+def _delete(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def track(video: str, *paths):
+    """
+        Records files or folders in tmp/ as belonging to a video and marks the video as used.
+
+        Arguments:
+        - video: Key of the video, i.e. the file name of the saved video.
+        - paths: Files or folders created for the video. Paths that do not exist are skipped, tracked paths
+          are updated with their current size.
+        """
+    rows = [(str(path), video, _size(Path(path))) for path in paths if Path(path).exists()]
+    with _connect() as connection:
+        connection.executemany("INSERT OR REPLACE INTO files (path, video, size) VALUES (?, ?, ?)", rows)
+        connection.execute("INSERT OR REPLACE INTO videos (video, last_used) VALUES (?, ?)", (video, time.time()))
+
+
+@contextmanager
+def pinned(video: str):
+    """
+        Keeps the files of a video from being evicted while it is processed. The pin of a crashed process
+        expires with the process.
+        """
+    with _connect() as connection:
+        pin = connection.execute("INSERT INTO pins (video, pid) VALUES (?, ?)", (video, os.getpid())).lastrowid
+    try:
+        yield
+    finally:
+        with _connect() as connection:
+            connection.execute("DELETE FROM pins WHERE id = ?", (pin,))
+
+
+def _pins(connection) -> dict:
+    counts = {}
+    for pin, video, pid in connection.execute("SELECT id, video, pid FROM pins").fetchall():
+        if _alive(pid):
+            counts[video] = counts.get(video, 0) + 1
+        else:
+            connection.execute("DELETE FROM pins WHERE id = ?", (pin,))
+    return counts
+
+
+def _job_videos(statuses: tuple[str, ...]) -> set[str]:
+    if not Path(jobs.JOBS_DATABASE).is_file():
+        return set()
+    placeholders = ",".join("?" * len(statuses))
+    with closing(sqlite3.connect(jobs.JOBS_DATABASE, timeout=30)) as connection:
+        return {Path(row[0]).name for row in connection.execute(
+            f"SELECT video_path FROM jobs WHERE status IN ({placeholders})", statuses)}
+
+
+def pinned_videos() -> set[str]:
+    """
+        Returns the videos being processed, and the videos of queued or running jobs.
+        """
+    with _connect() as connection:
+        videos = set(_pins(connection))
+    return videos | _job_videos(("queued", "running"))
+
+
+def release(video: str, path):
+    """
+        Deletes an intermediate file (e.g. the WAV file of the audio stage) once its consumers finished.
+
+        The file is kept while another process works on the same video or a job of the video is queued, e.g.
+        the full job after a draft, since they may still read it.
+
+        Returns:
+        - Whether the file was deleted.
+        """
+    if video in _job_videos(("queued",)):
+        return False
+    with _connect() as connection:
+        if _pins(connection).get(video, 0) > 1:
+            return False
+        connection.execute("DELETE FROM files WHERE path = ?", (str(path),))
+    _delete(Path(path))
+    return True
+
+
+def enforce(budget: int = None) -> list[str]:
+    """
+        Deletes the files of the least recently used videos until the tracked files fit into the budget.
+        Pinned videos are never evicted, so the budget may be exceeded while they are processed.
+
+        Arguments:
+        - budget: Maximum total size in bytes. Defaults to TMP_BUDGET.
+
+        Returns:
+        - The evicted videos.
+        """
+    budget = TMP_BUDGET if budget is None else budget
+    pinned = pinned_videos()
+    evicted = []
+    with _connect() as connection:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= budget:
+            return evicted
+        for video, size in connection.execute(
+                "SELECT videos.video, COALESCE(SUM(files.size), 0) FROM videos "
+                "LEFT JOIN files ON files.video = videos.video "
+                "GROUP BY videos.video ORDER BY videos.last_used").fetchall():
+            if total <= budget:
+                break
+            if video in pinned:
+                continue
+            for path, in connection.execute("SELECT path FROM files WHERE video = ?", (video,)).fetchall():
+                _delete(Path(path))
+            connection.execute("DELETE FROM files WHERE video = ?", (video,))
+            connection.execute("DELETE FROM videos WHERE video = ?", (video,))
+            total -= size
+            evicted.append(video)
+    return evicted
+
+
+def usage() -> StorageUsage:
+    """
+        Returns the size of the tracked files, the budget and the number of tracked and pinned videos.
+        """
+    if not STORAGE_DATABASE.is_file():
+        return {"bytes": 0, "budget": TMP_BUDGET, "videos": 0, "pinned": 0}
+    pinned = pinned_videos()
+    with _connect() as connection:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        videos = {video for video, in connection.execute("SELECT video FROM videos")}
+    return {"bytes": total, "budget": TMP_BUDGET, "videos": len(videos), "pinned": len(videos & pinned)}
@@ -1,30 +1,59 @@
+import bisect
+import copy
 import hashlib
+import inspect
 import json
 import math
 import numbers
 import os.path
+import random
+import shutil
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import whisper
 import cv2
 import pytesseract
-from transformers import Blip2Processor, Blip2ForConditionalGeneration, TextStreamer
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import Blip2Processor, Blip2ForConditionalGeneration, TextStreamer, TextIteratorStreamer
+from transformers import BlipProcessor, BlipForConditionalGeneration
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache
 from PIL import Image
 import numpy as np
 import torch
+import openai
 from openai import OpenAI
 from huggingface_hub import snapshot_download
 
+from NoKeeA.AI import artifact_cache, cpu_budget, deadline, memory, model_server, planner, storage
+from NoKeeA.AI.caption_export import CAPTION_BACKENDS, trace_caption_model
+
 import streamlit as st
 from typing_extensions import TypedDict
 
 
+class Word(TypedDict):
+    text: str
+    conf: float
+    left: int
+    top: int
+    width: int
+    height: int
+    block: int
+    par: int
+    line: int
+
+
 class Description(TypedDict):
     path: str
     frame_number: int
+    timestamp: float
     text: str
+    words: list[Word]
     description: str
+    complexity: float
+    caption_tier: str
 
 
 class ExtractedText(TypedDict):
@@ -34,53 +63,364 @@ class ExtractedText(TypedDict):
     frames: list[Description]
 
 
+class SummarySection(TypedDict):
+    event: str
+    index: int
+    count: int
+    start: numbers.Number
+    end: numbers.Number
+    text: str
+
+
+class SummaryToken(TypedDict):
+    event: str
+    text: str
+
+
+class PromptStats(TypedDict):
+    tokens_before: int
+    tokens_after: int
+    token_budget: int
+    dropped_spoken: int
+    dropped_screen_texts: int
+    dropped_descriptions: int
+
+
+# Frames extracted per second and the share of changed pixels (%) a frame needs to count as new
+FRAME_RATE = 1
+FRAME_DIFFERENCE_THRESHOLD = 20
+WHISPER_MODEL = "base"
+# Inputs of every stage in pipeline order; "video" is the content hash of the saved video
+STAGE_INPUTS = {
+    "probe": ["video"],
+    "audio": ["video"],
+    "transcript": ["audio"],
+    "frames": ["video"],
+    "ocr": ["frames"],
+    "captions": ["frames"],
+    "matching": ["probe", "transcript", "ocr", "captions"],
+}
+
+# Words recognized by Tesseract with a lower confidence (0-100) are dropped
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "60"))
+
+# Precision of the BLIP2 captioner: "fp32", "bf16" or "int8" (dynamic int8 quantization of the linear layers on CPU)
+BLIP2_PRECISIONS = ("fp32", "bf16", "int8")
+BLIP2_PRECISION = os.getenv("BLIP2_PRECISION", "fp32")
+# Captioning backend, see caption_export.CAPTION_BACKENDS
+BLIP2_BACKEND = os.getenv("BLIP2_BACKEND", "eager")
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+DEEPSEEK_MODEL = "deepseek-ai/DeepSeek-V2-Lite"
+CONTEXT_WINDOWS = {OPENAI_MODEL: 16385, DEEPSEEK_MODEL: 32768}
+MAX_NEW_TOKENS = 500
+OPENAI_TEMPERATURE = 0.5
+DEEPSEEK_TEMPERATURE = 0.7
+# Retries of transient OpenAI errors and the deadline of a request including all retries (seconds)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "300"))
+OPENAI_BACKOFF = 1.0
+OPENAI_RETRYABLE_ERRORS = (openai.APIConnectionError,
+                           openai.RateLimitError, openai.InternalServerError)
+SUMMARY_MODES = ("auto", "single", "hierarchical")
+# Length of the parts summarized independently in the hierarchical mode
+SUMMARY_CHUNK_SECONDS = float(os.getenv("SUMMARY_CHUNK_SECONDS", "600"))
+# Hash of the saved videos, whose hex digest is their file name: "sha3_256", or the faster "blake2b"
+VIDEO_HASH = os.getenv("VIDEO_HASH", "sha3_256")
+VIDEO_HASHES = ("sha3_256", "blake2b")
+# Uploads are hashed and written in chunks of this many bytes, so no full copy of a video is held in memory
+SAVE_CHUNK_BYTES = 8 * 1024 * 1024
+# Generated summaries, keyed by the hash of their input, backend, model and generation parameters
+SUMMARY_CACHE_FOLDER = Path("tmp") / "summaries"
+summary_cache_stats = {"hits": 0, "misses": 0}
+
 blip_processor = None
 blip_model = None
+blip_precision = None
+# Backend the captioner was requested with and the one it actually runs on after a tracing fallback
+blip_requested_backend = None
+blip_backend = None
+
+# Small captioner that describes every frame, BLIP2 only describes visually complex frames
+SMALL_CAPTION_MODEL = "Salesforce/blip-image-captioning-base"
+# Share of edge pixels (0-1) above which a frame counts as visually complex
+CAPTION_COMPLEXITY_THRESHOLD = float(
+    os.getenv("CAPTION_COMPLEXITY_THRESHOLD", "0.08"))
+CAPTION_QUALITIES = ("fast", "high")
+
+small_blip_processor = None
+small_blip_model = None
+
+whisper_models = {}
+
+openai_client = None
+openai_client_config = None
+
+# Weights of the local LLM on CPU: "fp32", "bf16" or "int8" (dynamic int8 quantization of the linear layers)
+LLM_PRECISIONS = tuple(memory.LOAD_BYTES_PER_PARAMETER)
+LLM_PRECISION = os.getenv("LLM_PRECISION", "fp32")
+# RAM the local LLM may use, e.g. "12GiB". Layers beyond it are offloaded to memory-mapped files on disk
+LLM_MAX_MEMORY = os.getenv("LLM_MAX_MEMORY")
 
 deepseek_tokenizer = None
 deepseek_model = None
+deepseek_memory_plan = None
+# Key/value caches of the static prompt preambles, see deepseek_inputs
+deepseek_prefix_caches = {}
+deepseek_prefix_lock = threading.Lock()
+prefix_cache_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+# Optional small model (Hugging Face repo id) proposing tokens that DeepSeek verifies (assisted decoding)
+DRAFT_MODEL = os.getenv("DRAFT_MODEL")
+draft_tokenizer = None
+draft_model = None
+draft_same_vocabulary = False
+# Guards the counting wrapper around draft_model.generate and speculative_stats, not the generation itself
+draft_lock = threading.Lock()
+# Proposals of the draft model in the generation running in the current thread
+draft_steps = threading.local()
+speculative_stats = {"proposed": 0, "accepted": 0, "new_tokens": 0, "seconds": 0.0}
 
 base_folder = Path(__file__).resolve().parent.parent.parent.parent
 
 
-def load_image_description_model():
+def load_image_description_model(precision: str = None, backend: str = None):
     """
         Loads the BLIP image captioning model and processor for describing video frames.
 
+        The weights are loaded with low_cpu_mem_usage, so safetensors checkpoints are memory-mapped
+        instead of being copied into a fully initialized fp32 model first.
+
+        Arguments:
+        - precision: One of BLIP2_PRECISIONS. Defaults to the BLIP2_PRECISION environment variable.
+        - backend: One of CAPTION_BACKENDS. Defaults to the BLIP2_BACKEND environment variable.
+          If the model cannot be traced, it falls back to eager mode.
+
         Returns:
         - A status message indicating whether the model was newly loaded or already available.
         """
-    global blip_model, blip_processor
-    if blip_processor is None or blip_model is None:
+    global blip_model, blip_processor, blip_precision, blip_requested_backend, blip_backend
+    precision = precision or BLIP2_PRECISION
+    backend = backend or BLIP2_BACKEND
+    if precision not in BLIP2_PRECISIONS:
+        raise ValueError(
+            f"Unknown BLIP2 precision '{precision}', expected one of {BLIP2_PRECISIONS}")
+    if backend not in CAPTION_BACKENDS:
+        raise ValueError(
+            f"Unknown captioning backend '{backend}', expected one of {CAPTION_BACKENDS}")
+
+    if blip_processor is None or blip_model is None or (blip_precision, blip_requested_backend) != (precision, backend):
         model_folder = base_folder / "blip2_model"
-        print(f"Loading BLIP model from {model_folder}")
+        print(f"Loading BLIP model ({precision}, {backend}) from {model_folder}")
         blip_processor = Blip2Processor.from_pretrained(model_folder)
         blip_model = Blip2ForConditionalGeneration.from_pretrained(
-            model_folder)
+            model_folder,
+            torch_dtype=torch.bfloat16 if precision == "bf16" else torch.float32,
+            low_cpu_mem_usage=True)
+        if precision == "int8":
+            blip_model = torch.ao.quantization.quantize_dynamic(
+                blip_model, {torch.nn.Linear}, dtype=torch.qint8)
+        blip_model.eval()
+        used_backend = backend
+        if backend == "torchscript":
+            example = blip_processor(Image.new("RGB", (224, 224)), return_tensors="pt")[
+                "pixel_values"]
+            if precision == "bf16":
+                example = example.to(torch.bfloat16)
+            # Falls back to eager mode if tracing fails
+            blip_model, used_backend = trace_caption_model(blip_model, example)
+        blip_precision = precision
+        blip_requested_backend = backend
+        blip_backend = used_backend
         return "✅ Bilderkennung geladen"
     return "⏭️ Bilderkennung geladen"
 
 
+def load_draft_model():
+    """
+        Downloads and loads the draft model configured in DRAFT_MODEL for assisted decoding.
+
+        Returns:
+        - A status message indicating whether the model was newly loaded or already available,
+          or None if no draft model is configured.
+        """
+    global draft_tokenizer, draft_model, draft_same_vocabulary
+    if not DRAFT_MODEL:
+        return None
+    if draft_tokenizer is None or draft_model is None:
+        local_dir = str(base_folder / "draft_model")
+        snapshot_download(repo_id=DRAFT_MODEL, local_dir=local_dir)
+        draft_tokenizer = AutoTokenizer.from_pretrained(local_dir)
+        draft_model = AutoModelForCausalLM.from_pretrained(
+            local_dir, torch_dtype=deepseek_model.dtype, low_cpu_mem_usage=True).to(deepseek_model.device)
+        draft_model.eval()
+        draft_same_vocabulary = draft_tokenizer.get_vocab() == deepseek_tokenizer.get_vocab()
+        return "✅ Entwurfsmodell geladen"
+    return "⏭️ Entwurfsmodell geladen"
+
+
+def deepseek_generate(**kwargs):
+    """
+        Runs deepseek_model.generate, with the draft model proposing tokens if one is loaded.
+
+        The draft model's proposals are counted to track the acceptance rate in speculative_stats. Every
+        verification step accepts some proposed tokens and adds one token of the main model, so the accepted
+        proposals are the new tokens minus the verification steps. This only holds if both models share the
+        vocabulary; otherwise only the speed is tracked. The proposals are counted per thread, so concurrent
+        generations (e.g. the parts of a hierarchical summary) do not wait for each other.
+
+        Arguments:
+        - kwargs: Arguments for deepseek_model.generate.
+
+        Returns:
+        - The output of generate.
+        """
+    if draft_model is None:
+        return deepseek_model.generate(**kwargs)
+
+    kwargs["assistant_model"] = draft_model
+    if not draft_same_vocabulary:
+        kwargs["tokenizer"] = deepseek_tokenizer
+        kwargs["assistant_tokenizer"] = draft_tokenizer
+
+    with draft_lock:
+        if "generate" not in vars(draft_model):
+            draft_model.generate = _counting_generate(draft_model.generate)
+    steps = draft_steps.counts = {"calls": 0, "proposed": 0}
+    start = time.perf_counter()
+    try:
+        output = deepseek_model.generate(**kwargs)
+    finally:
+        draft_steps.counts = None
+
+    new_tokens = output.shape[1] - kwargs["input_ids"].shape[1]
+    with draft_lock:
+        if draft_same_vocabulary:
+            # Proposals of a draft with another vocabulary are counted in its own tokens
+            speculative_stats["proposed"] += steps["proposed"]
+            speculative_stats["accepted"] += max(0, new_tokens - steps["calls"])
+        speculative_stats["new_tokens"] += new_tokens
+        speculative_stats["seconds"] += time.perf_counter() - start
+    return output
+
+
+def _counting_generate(generate):
+    def counting_generate(*args, **kwargs):
+        output = generate(*args, **kwargs)
+        steps = getattr(draft_steps, "counts", None)
+        if steps is not None:
+            steps["calls"] += 1
+            steps["proposed"] += len(output.scores)
+        return output
+    return counting_generate
+
+
+def speculative_report(before: dict) -> str:
+    """
+        Describes acceptance rate and speed of assisted decoding since the snapshot before.
+
+        Returns:
+        - A status message, or None if the draft model was not used. The acceptance rate is only reported if
+          the draft model shares the vocabulary of DeepSeek.
+        """
+    new_tokens = speculative_stats["new_tokens"] - before["new_tokens"]
+    if new_tokens <= 0:
+        return None
+    proposed = speculative_stats["proposed"] - before["proposed"]
+    accepted = speculative_stats["accepted"] - before["accepted"]
+    tokens_per_second = new_tokens / max(1e-9, speculative_stats["seconds"] - before["seconds"])
+    if proposed <= 0:
+        return f"✅ Entwurfsmodell: {tokens_per_second:.1f} Tokens/s"
+    return f"✅ Entwurfsmodell: {accepted / proposed:.0%} der Vorschläge akzeptiert, {tokens_per_second:.1f} Tokens/s"
+
+
+def load_small_image_description_model():
+    """
+        Downloads and loads the small BLIP captioning model used for frames that are not visually complex.
+
+        Returns:
+        - A status message indicating whether the model was newly loaded or already available.
+        """
+    global small_blip_processor, small_blip_model
+    if small_blip_processor is None or small_blip_model is None:
+        local_dir = str(base_folder / "blip_model")
+        snapshot_download(repo_id=SMALL_CAPTION_MODEL, local_dir=local_dir)
+        small_blip_processor = BlipProcessor.from_pretrained(local_dir)
+        small_blip_model = BlipForConditionalGeneration.from_pretrained(
+            local_dir, low_cpu_mem_usage=True)
+        small_blip_model.eval()
+        return "✅ Schnelle Bilderkennung geladen"
+    return "⏭️ Schnelle Bilderkennung geladen"
+
+
+def load_transcription_model(name: str = "base"):
+    """
+        Loads a Whisper model once and keeps it for later transcriptions.
+
+        Arguments:
+        - name: Name of the Whisper model, e.g. "tiny", "base" or "medium".
+
+        Returns:
+        - The Whisper model.
+        """
+    if name not in whisper_models:
+        whisper_models[name] = whisper.load_model(name)
+    return whisper_models[name]
+
+
 def load_summarizer_model():
     """
         Downloads and loads the DeepSeek language model and tokenizer for generating text summaries.
 
+        On CPU hosts the model is loaded in LLM_PRECISION and may use at most LLM_MAX_MEMORY (or the available
+        memory). Layers that do not fit are offloaded to memory-mapped files in deepseek_offload.
+
         Returns:
         - A status message indicating whether the model was newly loaded or already available.
+
+        Raises:
+        - MemoryError if the model fits neither into RAM nor, with offloading, onto the disk.
         """
     local_dir = str(base_folder / "deepseek_model")
-    snapshot_download(repo_id="deepseek-ai/DeepSeek-V2-Lite",
+    snapshot_download(repo_id=DEEPSEEK_MODEL,
                       local_dir=local_dir, )
 
-    global deepseek_tokenizer, deepseek_model
+    global deepseek_tokenizer, deepseek_model, deepseek_memory_plan
     if deepseek_tokenizer is None or deepseek_model is None:
+        if torch.cuda.is_available():
+            deepseek_tokenizer = AutoTokenizer.from_pretrained(
+                local_dir, trust_remote_code=False)
+            deepseek_model = AutoModelForCausalLM.from_pretrained(local_dir, torch_dtype=torch.float16,
+                                                                  trust_remote_code=True, device_map="auto",
+                                                                  low_cpu_mem_usage=True)
+            return "✅ LLM geladen"
+
+        offload_folder = base_folder / "deepseek_offload"
+        offload_folder.mkdir(parents=True, exist_ok=True)
+        # Refuses before anything is loaded if the model cannot fit
+        plan = memory.plan_llm_memory(memory.checkpoint_parameters(local_dir), LLM_PRECISION, LLM_MAX_MEMORY,
+                                      free_disk=shutil.disk_usage(offload_folder).free)
+
         deepseek_tokenizer = AutoTokenizer.from_pretrained(
             local_dir, trust_remote_code=False)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        torch_dtype = torch.float16 if device == "cuda" else torch.float32
-        deepseek_model = AutoModelForCausalLM.from_pretrained(local_dir, torch_dtype=torch_dtype,
-                                                              trust_remote_code=True, device_map="auto")
-        return "✅ LLM geladen"
+        model = AutoModelForCausalLM.from_pretrained(
+            local_dir,
+            torch_dtype=torch.float32 if plan["precision"] == "fp32" else torch.bfloat16,
+            trust_remote_code=True,
+            device_map="auto",
+            max_memory={"cpu": plan["max_memory"]},
+            offload_folder=str(offload_folder),
+            offload_state_dict=True,
+            low_cpu_mem_usage=True)
+        if plan["precision"] == "int8":
+            memory.quantize_linear_layers(model)
+        deepseek_model = model.eval()
+        deepseek_memory_plan = plan
+
+        if plan["offload_bytes"]:
+            return f"✅ LLM geladen ({plan['precision']}, " \
+                   f"{memory.format_memory_size(plan['offload_bytes'])} auf die Festplatte ausgelagert)"
+        return f"✅ LLM geladen ({plan['precision']})"
     return "⏭️ LLM geladen"
 
 
@@ -91,25 +431,170 @@ def match_frames_with_audio(
     """
         Matches extracted video frames with their corresponding audio segments.
 
+        Every frame belongs to exactly one segment, found by binary search over the segments sorted by start,
+        so matching takes O((n + m) log n) for n segments and m frames:
+        - The segment with the latest start at or before the frame, if it still runs. A frame on the border of
+          two segments belongs to the one starting there.
+        - Otherwise a segment that started earlier and still runs (overlapping segments), the one ending last.
+        - Otherwise (a pause, or before the first or after the last segment) the nearer of the preceding and
+          the following segment, the preceding one on a tie.
+
         Arguments:
         - video_frames: List of frames with metadata and timestamps.
         - video_text: List of transcribed audio segments with start and end times.
 
         Returns:
-        - Updated list of audio segments, each containing a list of matched frames.
+        - Updated list of audio segments, each containing a list of matched frames in the order of video_frames.
         """
     for text_segment in video_text:
-        start = math.ceil(text_segment["start"])
-        end = math.floor(text_segment["end"])
-
         text_segment["frames"] = []
-        for frame in video_frames:
-            if start <= frame["frame_number"] <= end:
-                text_segment["frames"].append(frame)
+    if not video_text:
+        return video_text
+
+    order = sorted(range(len(video_text)), key=lambda index: (video_text[index]["start"], index))
+    starts = [video_text[index]["start"] for index in order]
+    # The segment ending last among the first i + 1 segments by start
+    running = []
+    for index in order:
+        if not running or video_text[index]["end"] > video_text[running[-1]]["end"]:
+            running.append(index)
+        else:
+            running.append(running[-1])
+
+    for frame in video_frames:
+        timestamp = frame.get("timestamp", frame["frame_number"])
+        position = bisect.bisect_right(starts, timestamp) - 1
+        if position < 0:
+            segment = order[0]
+        elif timestamp <= video_text[order[position]]["end"]:
+            segment = order[position]
+        elif timestamp <= video_text[running[position]]["end"]:
+            segment = running[position]
+        elif position + 1 < len(order) and \
+                starts[position + 1] - timestamp < timestamp - video_text[running[position]]["end"]:
+            segment = order[position + 1]
+        else:
+            segment = running[position]
+        video_text[segment]["frames"].append(frame)
     return video_text
 
 
-def video2text(video):
+def stage_params(settings: deadline.PipelineSettings) -> dict:
+    """
+        Returns the parameters of every stage that change its output, see run_stage.
+        """
+    # Ranges are only part of the parameters if set, so the keys of whole videos stay the same
+    ranges = {"ranges": settings["ranges"]} if settings.get("ranges") else {}
+    return {
+        "probe": {"threshold": FRAME_DIFFERENCE_THRESHOLD},
+        "audio": {**ranges},
+        "transcript": {"model": settings["whisper_model"]},
+        "frames": {"frame_rate": settings["frame_rate"], "threshold": FRAME_DIFFERENCE_THRESHOLD, **ranges},
+        "ocr": {"min_confidence": OCR_MIN_CONFIDENCE},
+        "captions": {"quality": settings["caption_quality"], "threshold": CAPTION_COMPLEXITY_THRESHOLD,
+                     "small_model": SMALL_CAPTION_MODEL, "precision": BLIP2_PRECISION},
+        "matching": {},
+    }
+
+
+def skipped_stages(settings: deadline.PipelineSettings) -> set:
+    """
+        Returns the stages the settings leave out: the audio stages for videos without audio, the frame stages
+        for files without video and the captions if they are turned off.
+        """
+    skipped = set()
+    if not settings.get("audio", True):
+        skipped |= {"audio", "transcript"}
+    if not settings.get("video", True):
+        skipped |= {"frames", "ocr", "captions"}
+    if not settings["captions"]:
+        skipped.add("captions")
+    return skipped
+
+
+def pipeline_keys(video_key: str, settings: deadline.PipelineSettings) -> dict:
+    """
+        Returns the artifact keys of all stages before any of them ran, since a key only depends on the keys of
+        the inputs and the parameters of a stage.
+
+        Arguments:
+        - video_key: Content hash of the saved video.
+        - settings: Settings of the pipeline. Stages left out by the settings have no key, see skipped_stages.
+
+        Returns:
+        - The key of every stage that runs, by stage.
+        """
+    params = stage_params(settings)
+    skipped = skipped_stages(settings)
+    keys = {"video": video_key}
+    for stage, inputs in STAGE_INPUTS.items():
+        if stage in skipped:
+            continue
+        keys[stage] = artifact_cache.stage_key(stage, [keys[name] for name in inputs if name in keys], params[stage])
+    del keys["video"]
+    return keys
+
+
+def checked(gen, token: deadline.DeadlineToken = None):
+    """
+        Forwards the steps of a generator and checks the token between them, i.e. between units of work.
+
+        Returns:
+        - The return value of the generator.
+        """
+    if token is None:
+        return (yield from gen)
+    try:
+        while True:
+            step = next(gen)
+            token.check()
+            yield step
+    except StopIteration as e:
+        return e.value
+    finally:
+        gen.close()
+
+
+def run_stage(stage: str, inputs: list[str], params: dict, name: str, run, valid=None,
+              token: deadline.DeadlineToken = None):
+    """
+        Runs a pipeline stage, or loads its output from the artifact cache if it already ran with the same
+        inputs and parameters.
+
+        Arguments:
+        - stage: Name of the stage, see artifact_cache.STAGE_VERSIONS.
+        - inputs: Keys of the inputs of the stage.
+        - params: Parameters of the stage that change its output.
+        - name: Name of the stage in progress messages.
+        - run: Function receiving the key of the output and returning the output or a generator producing it.
+        - valid: Optional check of a cached output, see artifact_cache.load.
+        - token: Optional cancel token, checked before the stage and between its units of work.
+
+        Yields:
+        - Progress updates of the stage.
+
+        Returns:
+        - The key and the output of the stage.
+        """
+    if token is not None:
+        token.check()
+    key = artifact_cache.stage_key(stage, inputs, params)
+    value = artifact_cache.load(key, valid)
+    if value is not None:
+        yield f"⏭️ {name} aus dem Cache geladen"
+        return key, value
+
+    cpu_budget.use(stage)
+    value = run(key)
+    if inspect.isgenerator(value):
+        value = yield from checked(value, token)
+    artifact_cache.save(key, value)
+    return key, value
+
+
+def video2text(video, caption_quality: str = "fast", summary_mode: str = "auto", stream: bool = False,
+               regenerate: bool = False, token: deadline.DeadlineToken = None, draft: bool = False,
+               ranges: list = None):
     """
         Orchestrates the entire video-to-text pipeline.
 
@@ -121,8 +606,24 @@ def video2text(video):
         - Matches frame descriptions to audio segments.
         - Summarizes all extracted data using an LLM.
 
+        Arguments:
+        - video: Uploaded video file.
+        - caption_quality: "fast" (tiered captioning) or "high" (BLIP2 for every frame).
+        - summary_mode: "single" sends one prompt, "hierarchical" summarizes parts of the video concurrently and
+          merges them. "auto" uses the hierarchical mode for long videos and prompts exceeding the token budget.
+        - stream: Yield the (merged) summary as SummaryToken events while it is generated.
+        - regenerate: Generate the summary again even if an identical request is in the summary cache.
+        - token: Optional deadline and cancel token. If the pipeline would miss the deadline, it uses fewer
+          frames, a smaller Whisper model and no captions, in this order; the applied degradations are kept
+          in token.degradations. A cancelled token stops the pipeline at the next unit of work with Cancelled.
+        - draft: Summarize quickly with the cheapest settings (few frames, the smallest Whisper model, OCR
+          without captions, one prompt). A later full run reuses the audio and the summary cache.
+        - ranges: Optional [start, end] pairs in seconds. Only these parts of the video are decoded and
+          summarized. If the whole video was processed before, its cached artifacts are sliced instead.
+
         Returns:
-        - A generator yielding progress updates and eventually the final summary string.
+        - A generator yielding progress updates, a SummarySection for every part summarized in the hierarchical
+          mode, SummaryToken events when streaming and eventually the final summary string.
         """
     path = None
     try:
@@ -132,62 +633,235 @@ def video2text(video):
     except StopIteration as e:
         path = e.value
 
-    if not os.path.isfile(f"{path}.txt"):
-        video_text = None
-        try:
-            gen = extract_audio_convert2text(path)
-            while True:
-                yield next(gen)
-        except StopIteration as e:
-            video_text = e.value["segments"]
+    return (yield from process_video(path, caption_quality, summary_mode, stream, regenerate, token, draft,
+                                     ranges))
 
-        video_frames = []
-        try:
-            gen = extract_frames_convert2text(path)
-            while True:
-                yield next(gen)
-        except StopIteration as e:
-            video_frames = e.value
 
-        try:
-            gen = text_recognition(video_frames)
-            while True:
-                yield next(gen)
-        except StopIteration as e:
-            video_frames = e.value
+def process_video(path: str, caption_quality: str = "fast", summary_mode: str = "auto", stream: bool = False,
+                  regenerate: bool = False, token: deadline.DeadlineToken = None, draft: bool = False,
+                  ranges: list = None):
+    """
+        Runs the video-to-text pipeline on a saved video, see video2text.
 
-        try:
-            gen = describe_image(video_frames)
-            while True:
-                yield next(gen)
-        except StopIteration as e:
-            video_frames = e.value
+        Arguments:
+        - path: Path of the video as returned by save_video.
+        - caption_quality, summary_mode, stream, regenerate, token, draft, ranges: See video2text.
 
-        video_text = match_frames_with_audio(video_frames, video_text)
+        Returns:
+        - A generator yielding the same steps as video2text and eventually the final summary string.
+        """
+    # The files of the video in tmp/ are not evicted while it is processed
+    video_key = Path(path).name
+    with storage.pinned(video_key):
+        storage.track(video_key, path)
+        summary = yield from _process_video(path, caption_quality, summary_mode, stream, regenerate, token, draft,
+                                            ranges)
+    storage.enforce()
+    return summary
+
+
+def _process_video(path: str, caption_quality: str, summary_mode: str, stream: bool, regenerate: bool,
+                   token: deadline.DeadlineToken, draft: bool, ranges: list):
+    # Every stage is cached under its inputs and parameters, so a changed parameter only reruns the stages
+    # that depend on it. The file name of the saved video is its content hash.
+    cpu_budget.reset()
+    video_key = Path(path).name
+    settings = {"frame_rate": FRAME_RATE, "whisper_model": WHISPER_MODEL, "caption_quality": caption_quality,
+                "captions": True}
+    if draft:
+        # The draft uses the settings of the fully degraded pipeline, so both share their artifacts
+        settings.update(frame_rate=deadline.DEGRADED_FRAME_RATE, whisper_model=deadline.DEGRADED_WHISPER_MODEL,
+                        captions=False)
+        summary_mode = "single"
+
+    def tracked_stage(stage: str, inputs: list[str], params: dict, name: str, run, valid=None):
+        # Runs a stage and tracks its files in tmp/ under the video
+        key, value = yield from run_stage(stage, inputs, params, name, run, valid=valid, token=token)
+        storage.track(video_key, *artifact_cache.files(key))
+        storage.enforce()
+        return key, value
+
+    # Probe the video and plan which branches run before any work starts
+    probe_key, probe = yield from tracked_stage(
+        "probe", [video_key], stage_params(settings)["probe"], "Analyse",
+        lambda key: probe_video(path))
+    info = probe["info"]
+    settings["ranges"] = planner.normalize_ranges(ranges, info["duration"])
+    duration = planner.ranges_duration(settings["ranges"], info["duration"])
+    plan = planner.plan_pipeline({**info, "duration": duration}, settings, probe["static"])
+    settings.update(frame_rate=plan["frame_rate"], audio=plan["audio"], video=plan["video"])
+    yield planner.describe_plan(info, plan)
+    skipped = skipped_stages(settings)
+    stages = list(STAGE_INPUTS)
+
+    def degrade(stage: str):
+        # Before every stage: degrade the settings if the stages still to run would miss the deadline
+        if token is None:
+            return
+        remaining = stages[stages.index(stage):]
+        applied = token.degrade(settings, duration, lambda settings: [
+            name for name, key in pipeline_keys(video_key, settings).items()
+            if name in remaining and not artifact_cache.exists(key)] + ["summary"])
+        skipped.update(skipped_stages(settings))
+        if applied:
+            yield "⚠️ Wegen der Frist reduziert: " + ", ".join(
+                deadline.DEGRADATION_NAMES[degradation] for degradation in applied)
+
+    def whole_video(stage: str, valid=None):
+        # The cached output of a stage for the whole video, which a run on time ranges slices
+        if not settings["ranges"]:
+            return None
+        key = pipeline_keys(video_key, {**settings, "ranges": None}).get(stage)
+        return artifact_cache.load(key, valid) if key and artifact_cache.exists(key) else None
+
+    matching_inputs = [probe_key]
+    # Without audio, all frames of a range belong to one segment spanning it
+    transcript = {"segments": [{"start": start, "end": end, "text": ""}
+                               for start, end in settings["ranges"] or [[0, info["duration"]]]]}
+    if "audio" not in skipped:
+        yield from degrade("audio")
+        whole_transcript = whole_video("transcript")
+        audio_path = None
+        if artifact_cache.exists(pipeline_keys(video_key, settings)["transcript"]):
+            # The WAV file is deleted after the transcription, so it is only extracted for a new transcript
+            audio_key = artifact_cache.stage_key("audio", [video_key], stage_params(settings)["audio"])
+
+            def transcribe(key):
+                raise RuntimeError(f"Transcript {key} was deleted while the video was processed")
+        elif whole_transcript is None:
+            audio_key, audio_path = yield from tracked_stage(
+                "audio", [video_key], stage_params(settings)["audio"], "Audio",
+                lambda key: extract_audio(path, str(artifact_cache.artifact_path(key, ".wav")),
+                                          settings["ranges"]),
+                valid=os.path.isfile)
+            yield from degrade("transcript")
+
+            def transcribe(key):
+                return transcribe_audio(audio_path, settings["whisper_model"], settings["ranges"])
+        else:
+            audio_key = artifact_cache.stage_key("audio", [video_key], stage_params(settings)["audio"])
+
+            def transcribe(key):
+                return slice_transcript(whole_transcript, settings["ranges"])
+        transcript_key, transcript = yield from tracked_stage(
+            "transcript", [audio_key], stage_params(settings)["transcript"], "Transkript", transcribe)
+        matching_inputs.append(transcript_key)
+        if audio_path is not None:
+            storage.release(video_key, audio_path)
+
+    ocr_frames = caption_frames = []
+    if "frames" not in skipped:
+        def frames_exist(frames):
+            return all(os.path.isfile(frame["path"]) for frame in frames)
+
+        yield from degrade("frames")
+        whole_frames = whole_video("frames", frames_exist)
+        frames_key, video_frames = yield from tracked_stage(
+            "frames", [video_key], stage_params(settings)["frames"], "Frames",
+            lambda key: extract_frames_convert2text(path, settings["frame_rate"], FRAME_DIFFERENCE_THRESHOLD,
+                                                    str(artifact_cache.artifact_path(key, ".frames")),
+                                                    info["fps"], info["frame_count"], settings["ranges"])
+            if whole_frames is None else slice_frames(whole_frames, settings["ranges"]),
+            valid=frames_exist)
+        yield from degrade("ocr")
+        # The OCR and captions of the whole video fit sliced frames, which are the same files
+        whole_ocr = whole_video("ocr") if whole_frames is not None else None
+        ocr_key, ocr_frames = yield from tracked_stage(
+            "ocr", [frames_key], stage_params(settings)["ocr"], "Texterkennung",
+            lambda key: text_recognition(copy.deepcopy(video_frames), OCR_MIN_CONFIDENCE, checkpoint=key)
+            if whole_ocr is None else select_frames(whole_ocr, video_frames))
+        matching_inputs.append(ocr_key)
+        yield from degrade("captions")
+        caption_frames = video_frames
+        if "captions" not in skipped:
+            whole_captions = whole_video("captions") if whole_frames is not None else None
+            captions_key, caption_frames = yield from tracked_stage(
+                "captions", [frames_key], stage_params(settings)["captions"], "Bildbeschreibung",
+                lambda key: describe_image(copy.deepcopy(video_frames), caption_quality, checkpoint=key)
+                if whole_captions is None else select_frames(whole_captions, video_frames))
+            matching_inputs.append(captions_key)
+
+    _, video_text = yield from tracked_stage(
+        "matching", matching_inputs, stage_params(settings)["matching"], "Zuordnung",
+        lambda key: match_frames_with_audio(
+            [{**ocr, **caption} for ocr, caption in zip(ocr_frames, caption_frames)],
+            copy.deepcopy(transcript["segments"])))
+
+    save_video_description(video_text, f"{path}.txt")
+    storage.track(video_key, f"{path}.txt")
+
+    if summary_mode not in SUMMARY_MODES:
+        raise ValueError(
+            f"Unknown summary mode '{summary_mode}', expected one of {SUMMARY_MODES}")
+    prompt, prompt_stats = build_prompt_with_stats(
+        video_text, get_token_budget())
+    yield f"✅ Prompt erstellt ({prompt_stats['tokens_before']} → {prompt_stats['tokens_after']} Tokens)"
+
+    # Decided by the processed length, since the segments of time ranges keep their times in the video
+    hierarchical = summary_mode == "hierarchical" or (summary_mode == "auto" and video_text and (
+        prompt_stats["tokens_before"] > prompt_stats["token_budget"] or duration > 2 * SUMMARY_CHUNK_SECONDS))
+
+    # The hierarchical mode summarizes the full video text, the single mode only the (shortened) prompt
+    if hierarchical:
+        cache_key = summary_cache_key(json.dumps(video_text, sort_keys=True),
+                                      {"mode": "hierarchical", "chunk_seconds": SUMMARY_CHUNK_SECONDS})
+    else:
+        cache_key = summary_cache_key(prompt, {"mode": "single"})
+    if not regenerate:
+        summary = load_cached_summary(cache_key)
+        if summary is not None:
+            storage.track(video_key, SUMMARY_CACHE_FOLDER / f"{cache_key}.json")
+            yield f"⏭️ Zusammenfassung aus dem Cache geladen ({summary_cache_stats['hits']} Treffer, " \
+                  f"{summary_cache_stats['misses']} Fehlschläge)"
+            return summary
+
+    cpu_budget.use("summary")
+    if hierarchical:
+        gen = summarize_hierarchical(video_text, stream=stream)
+    elif stream:
+        gen = summarize_streaming(prompt)
+    else:
+        gen = summarize_with_deepseek(prompt)
+    summary = yield from checked(gen, token)
 
-        save_video_description(video_text, f"{path}.txt")
+    if summary and summary != "Failed":
+        save_cached_summary(cache_key, summary)
+        storage.track(video_key, SUMMARY_CACHE_FOLDER / f"{cache_key}.json")
+    return summary
 
-    else:
-        with open(f"{path}.txt") as f:
-            video_text = json.load(f)
-        yield "⏭️ Informationen geladen"
 
-    prompt = build_prompt(video_text)
+def video_hash():
+    """
+        Returns a new hash object of the algorithm VIDEO_HASH.
+        """
+    if VIDEO_HASH not in VIDEO_HASHES:
+        raise ValueError(f"Unknown video hash '{VIDEO_HASH}', expected one of {VIDEO_HASHES}")
+    if VIDEO_HASH == "blake2b":
+        # As long as a SHA3-256 digest, so the file names keep their length
+        return hashlib.blake2b(digest_size=32)
+    return hashlib.sha3_256()
 
-    try:
-        gen = summarize_with_deepseek(prompt)
-        while True:
-            yield next(gen)
-    except StopIteration as e:
-        return e.value
 
-    return "Failed"
+def spool_video(video, partial: str, digest=None):
+    """
+        Copies a video in chunks of SAVE_CHUNK_BYTES into a file and optionally hashes it on the way.
+        """
+    with open(partial, "wb") as f:
+        for chunk in iter(lambda: video.read(SAVE_CHUNK_BYTES), b""):
+            if digest is not None:
+                digest.update(chunk)
+            f.write(chunk)
 
 
 def save_video(video):
     """
         Saves the uploaded video to a temporary directory with a hash-based filename.
 
+        The video is hashed in chunks. A seekable upload (e.g. a Streamlit UploadedFile) is hashed first and
+        not written at all if a video with the same content is already saved. Other file objects are hashed
+        while they are written to a temporary file. The file is moved to its final name atomically, so
+        concurrent sessions never see a partial video.
+
         Arguments:
         - video: Uploaded video file.
 
@@ -199,15 +873,62 @@ def save_video(video):
         """
     Path("tmp").mkdir(parents=True, exist_ok=True)
     extinction = video.type.replace("/", ".")
-    path = f"tmp/{hashlib.sha3_256(video.read()).hexdigest()}.{extinction}"
-
-    with open(path, "wb") as f:
-        f.write(video.getbuffer())
-    yield "✅ Datei gespeichert"
+    partial = f"tmp/upload.{os.getpid()}.{threading.get_ident()}.tmp"
+    digest = video_hash()
+    try:
+        if video.seekable():
+            video.seek(0)
+            for chunk in iter(lambda: video.read(SAVE_CHUNK_BYTES), b""):
+                digest.update(chunk)
+            path = f"tmp/{digest.hexdigest()}.{extinction}"
+            exists = os.path.isfile(path)
+            if not exists:
+                video.seek(0)
+                spool_video(video, partial)
+        else:
+            spool_video(video, partial, digest)
+            path = f"tmp/{digest.hexdigest()}.{extinction}"
+            exists = os.path.isfile(path)
+            if exists:
+                os.remove(partial)
+
+        if not exists:
+            os.replace(partial, path)
+    except BaseException:
+        # A failed upload (e.g. a full disk or an aborted read) must not leave its temporary file in tmp/
+        Path(partial).unlink(missing_ok=True)
+        raise
+    # Evicted from tmp/ with the artifacts of the video, see storage.enforce
+    storage.track(Path(path).name, path)
+    yield "⏭️ Datei bereits gespeichert" if exists else "✅ Datei gespeichert"
 
     return path
 
 
+def slice_transcript(transcript: dict, ranges: list) -> dict:
+    """
+        Keeps the segments of a transcript of the whole video that overlap one of the time ranges.
+        """
+    segments = [segment for segment in transcript["segments"]
+                if any(segment["start"] < end and segment["end"] > start for start, end in ranges)]
+    return {**transcript, "text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def slice_frames(frames: list[Description], ranges: list) -> list[Description]:
+    """
+        Keeps the frames of the whole video that lie in one of the time ranges.
+        """
+    return [frame for frame in frames if planner.in_ranges(frame.get("timestamp", frame["frame_number"]), ranges)]
+
+
+def select_frames(frames: list[Description], selected: list[Description]) -> list[Description]:
+    """
+        Keeps the frames (e.g. with OCR text) whose image is one of the selected frames.
+        """
+    paths = {frame["path"] for frame in selected}
+    return [frame for frame in frames if frame["path"] in paths]
+
+
 def save_video_description(video_text, path):
     """
        Saves the processed video description as a JSON file.
@@ -237,122 +958,369 @@ def image_difference(img1, img2):
     return (non_zero_count / total_pixels) * 100
 
 
-def extract_frames_convert2text(path: str, frame_rate=1, threshold=20):
+def extract_frames_convert2text(path: str, frame_rate=FRAME_RATE, threshold=FRAME_DIFFERENCE_THRESHOLD,
+                                frames_folder: str = None, fps: float = None, frame_count: int = None,
+                                ranges: list = None):
     """
         Extracts frames from the video at a specified rate, saving only significantly different ones.
 
+        Frames are sampled by their timestamp, so fractional frame rates (e.g. 29.97) and sampling rates below
+        one frame per second work. Frames between the samples are only grabbed, not decoded into images.
+
         Arguments:
         - path: Path to the video file.
         - frame_rate: Number of frames to extract per second.
         - threshold: Minimum difference percentage to consider a frame unique.
+        - frames_folder: Folder the frames are saved to. Defaults to {path}.frames.
+        - fps, frame_count: Frame rate and number of frames of the video, e.g. from planner.probe_video.
+          Read from the container metadata if omitted.
+        - ranges: Optional [start, end] pairs in seconds. The decoder seeks to every range and stops at its end.
 
         Yields:
         - Progress values and final status message.
 
         Returns:
-        - List of saved frame metadata.
+        - List of saved frame metadata, each with the timestamp of the frame in seconds.
         """
-    frames_folder = f"{path}.frames"
+    frames_folder = frames_folder or f"{path}.frames"
     Path(frames_folder).mkdir(parents=True, exist_ok=True)
 
     st.session_state["video2text_progress_bar_text"] = "Frames werden extrahiert."
 
     cap = cv2.VideoCapture(path)
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = math.floor(frame_count / fps)
-    frame_interval = max(1, fps // frame_rate)
-    count = 0
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_count = frame_count or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    spans = ranges or [[0.0, math.inf]]
+    total = max(1, sum(min(end * fps, frame_count) - start * fps for start, end in spans))
+    decoded = 0
     frame_number = 0
     saved_frames = 0
     frames = []
-    prev_frame = None
-
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
-        if count % frame_interval == 0:
-            if prev_frame is None or image_difference(prev_frame, frame) > threshold:
-                frame_path = f"{frames_folder}/frame_{frame_number:04d}.jpg"
-                cv2.imwrite(frame_path, frame)
-                frames.append({
-                    "path": frame_path,
-                    "frame_number": frame_number,
-                })
-                saved_frames += 1
-                prev_frame = frame
-            frame_number += 1
-            yield min(1, frame_number / duration)
-        count += 1
+
+    for start, end in spans:
+        count = math.ceil(start * fps - 1e-6)
+        if count > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, count)
+        samples = 0
+        prev_frame = None
+        while cap.grab():
+            # Seeking may land on the keyframe before the range, so the frames are numbered by the decoder.
+            # POS_FRAMES is the number of the next frame; backends without it report 0.
+            position = cap.get(cv2.CAP_PROP_POS_FRAMES)
+            if position > 0:
+                count = int(position) - 1
+            timestamp = count / fps
+            if timestamp > end:
+                break
+            # Sample the first frame at or after every 1 / frame_rate seconds
+            if timestamp + 0.5 / fps >= start + samples / frame_rate:
+                success, frame = cap.retrieve()
+                if not success:
+                    break
+                if prev_frame is None or image_difference(prev_frame, frame) > threshold:
+                    frame_path = f"{frames_folder}/frame_{frame_number:04d}.jpg"
+                    cv2.imwrite(frame_path, frame)
+                    frames.append({
+                        "path": frame_path,
+                        "frame_number": frame_number,
+                        "timestamp": round(timestamp, 3),
+                    })
+                    saved_frames += 1
+                    prev_frame = frame
+                samples += 1
+                frame_number += 1
+                yield min(1, (decoded + 1) / total)
+            count += 1
+            decoded += 1
     yield f"✅ {saved_frames}/{frame_number} Frames extrahiert"
 
     cap.release()
     return frames
 
 
-def extract_audio_convert2text(path: str):
+def probe_video(path: str) -> dict:
     """
-        Extracts the audio from a video file and transcribes it using Whisper.
+        Reads the media info of a video and checks whether it shows a still image, see planner.
+
+        Returns:
+        - The media info under "info" and the result of the check under "static".
+        """
+    info = planner.probe_video(path)
+    return {"info": info, "static": planner.is_static_video(path, info, FRAME_DIFFERENCE_THRESHOLD)}
+
+
+def extract_audio(path: str, wav_path: str, ranges: list = None):
+    """
+        Extracts the audio track of a video file with ffmpeg.
 
         Arguments:
         - path: Path to the video file.
+        - wav_path: Path of the audio file to create.
+        - ranges: Optional [start, end] pairs in seconds. ffmpeg seeks to every range, so the rest of the video
+          is not decoded, and the ranges are concatenated.
 
         Yields:
-        - Progress messages during audio extraction and transcription.
+        - A status message after the extraction.
 
         Returns:
-        - Transcription result object from Whisper.
+        - The path of the audio file.
         """
-    command = ["ffmpeg", "-i", path, "-q:a",
-               "0", "-map", "a", f"{path}.wav", "-y"]
+    command = ["ffmpeg", "-threads", str(cpu_budget.current["subprocess"])]
+    if not ranges:
+        command += ["-i", path, "-map", "a"]
+    else:
+        for start, end in ranges:
+            command += ["-ss", str(start), "-t", str(end - start), "-i", path]
+        command += ["-filter_complex", "".join(f"[{i}:a]" for i in range(len(ranges))) +
+                    f"concat=n={len(ranges)}:v=0:a=1[a]", "-map", "[a]"]
+    command += ["-q:a", "0", wav_path, "-y"]
     ffmpeg_result = subprocess.run(
         command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     if ffmpeg_result.returncode != 0:
         raise Exception("ffmpeg failed")
     yield "✅ Audio extrahiert"
 
-    # Oder "medium", "large" für bessere Ergebnisse
-    model = whisper.load_model("base")
-    result = model.transcribe(f"{path}.wav")
+    return wav_path
+
+
+def video_time(seconds: float, ranges: list, end: bool = False) -> float:
+    """
+        Maps a time in the concatenated audio of time ranges back to the time in the video.
+
+        Arguments:
+        - seconds: Time in the concatenated audio.
+        - ranges: The [start, end] pairs the audio was extracted from.
+        - end: Map a time on the border of two ranges to the end of the first instead of the start of the next.
+        """
+    offset = 0.0
+    for start, stop in ranges:
+        length = stop - start
+        if seconds < offset + length or (end and seconds <= offset + length):
+            return start + seconds - offset
+        offset += length
+    return ranges[-1][1]
+
+
+def transcribe_audio(wav_path: str, model: str = WHISPER_MODEL, ranges: list = None):
+    """
+        Transcribes an audio file with Whisper, locally or on the model server.
+
+        Arguments:
+        - wav_path: Path to the audio file.
+        - model: Name of the Whisper model, e.g. "tiny", "base" or "medium".
+        - ranges: The time ranges the audio was extracted from, see extract_audio. The times of the segments
+          are mapped back to the video.
+
+        Yields:
+        - A status message after the transcription.
+
+        Returns:
+        - Transcription result object from Whisper.
+        """
+    client = model_server.get_client()
+    if client is None:
+        result = load_transcription_model(model).transcribe(wav_path)
+    else:
+        result = client.request(
+            "transcribe", {"path": wav_path, "model": model})
+    if ranges:
+        for segment in result["segments"]:
+            segment["start"] = video_time(segment["start"], ranges)
+            segment["end"] = video_time(segment["end"], ranges, end=True)
 
     yield "✅ Audio zu Text konvertiert"
 
     return result
 
 
-def text_recognition(images: list[Description]) -> list[Description]:
+def extract_audio_convert2text(path: str):
+    """
+        Extracts the audio from a video file and transcribes it using Whisper.
+
+        Arguments:
+        - path: Path to the video file.
+
+        Yields:
+        - Progress messages during audio extraction and transcription.
+
+        Returns:
+        - Transcription result object from Whisper.
+        """
+    wav_path = yield from extract_audio(path, f"{path}.wav")
+    return (yield from transcribe_audio(wav_path))
+
+
+def rebuild_ocr_text(data: dict, min_confidence: float = OCR_MIN_CONFIDENCE) -> tuple[str, list[Word]]:
+    """
+        Filters Tesseract word-level data by confidence and rebuilds the text in reading order.
+
+        Arguments:
+        - data: Output of pytesseract.image_to_data with output_type=Output.DICT.
+        - min_confidence: Words with a lower confidence are dropped.
+
+        Returns:
+        - The rebuilt text (lines separated by newlines, paragraphs by blank lines)
+          and the list of kept words.
+        """
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = str(text).strip()
+        conf = float(data["conf"][i])
+        if not text or conf < min_confidence:
+            continue
+        words.append({
+            "text": text,
+            "conf": conf,
+            "left": int(data["left"][i]),
+            "top": int(data["top"][i]),
+            "width": int(data["width"][i]),
+            "height": int(data["height"][i]),
+            "block": int(data["block_num"][i]),
+            "par": int(data["par_num"][i]),
+            "line": int(data["line_num"][i]),
+        })
+
+    # Tesseract emits blocks, paragraphs and lines in reading order. Words of a line are sorted from left to right.
+    lines = {}
+    for word in words:
+        lines.setdefault((word["block"], word["par"], word["line"]), []).append(word)
+
+    text = ""
+    previous_paragraph = None
+    for (block, par, _), line_words in lines.items():
+        if previous_paragraph is not None:
+            text += "\n" if previous_paragraph == (block, par) else "\n\n"
+        line_words.sort(key=lambda w: w["left"])
+        text += " ".join(w["text"] for w in line_words)
+        previous_paragraph = (block, par)
+
+    return text, words
+
+
+def recognize_text(path: str, min_confidence: float = OCR_MIN_CONFIDENCE) -> tuple[str, list[Word]]:
+    """
+        Runs Tesseract on a single image and keeps the words above the confidence threshold.
+
+        Arguments:
+        - path: Path to the image.
+        - min_confidence: Words recognized with a lower confidence are dropped.
+
+        Returns:
+        - The rebuilt text and the kept words.
+        """
+    data = pytesseract.image_to_data(
+        Image.open(path), output_type=pytesseract.Output.DICT)
+    return rebuild_ocr_text(data, min_confidence)
+
+
+def text_recognition(images: list[Description], min_confidence: float = OCR_MIN_CONFIDENCE,
+                     checkpoint: str = None) -> list[Description]:
     """
         Applies OCR to a list of images to extract visible text from each frame.
 
         Arguments:
         - images: List of frame metadata including file paths.
+        - min_confidence: Words recognized with a lower confidence are dropped.
+        - checkpoint: Optional artifact key. Every recognized frame is recorded under it, and frames recorded by
+          an interrupted run are taken over instead of being recognized again.
 
         Yields:
         - Progress updates.
 
         Returns:
-        - Updated list with recognized text for each image.
+        - Updated list with recognized text and the structured words for each image.
         """
     st.session_state["video2text_progress_bar_text"] = "Texte werden extrahiert."
 
-    i = 0
-    for image_path in images:
-        image = Image.open(image_path["path"])
-        text = pytesseract.image_to_string(image)
-        image_path["text"] = text
-        i += 1
-        yield i / len(images)
+    done = artifact_cache.load_checkpoint(checkpoint) if checkpoint else {}
+    for index, result in done.items():
+        images[index].update(result)
+    pending = [index for index in range(len(images)) if index not in done]
+    if done:
+        yield f"⏭️ Texterkennung von {len(done)}/{len(images)} Frames fortgesetzt"
+
+    client = model_server.get_client()
+    executor = None
+    if client is None:
+        # Tesseract runs single-threaded (OMP_THREAD_LIMIT), one call per thread of the CPU budget
+        executor = ThreadPoolExecutor(max_workers=cpu_budget.current["workers"])
+        results = executor.map(lambda index: recognize_text(images[index]["path"], min_confidence), pending)
+    else:
+        results = ((result["text"], result["words"]) for result in client.map(
+            "ocr", [{"path": images[index]["path"], "min_confidence": min_confidence} for index in pending]))
+
+    i = len(done)
+    try:
+        for index, (text, words) in zip(pending, results):
+            images[index]["text"], images[index]["words"] = text, words
+            if checkpoint:
+                artifact_cache.append_checkpoint(checkpoint, index, {"text": text, "words": words})
+            i += 1
+            yield i / len(images)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
     yield "✅ Text aus Frames extrahiert"
     return images
 
 
-def describe_image(images: list[Description]) -> list[Description]:
+def visual_complexity(path: str) -> float:
+    """
+        Estimates how visually complex a frame is by its share of edge pixels.
+
+        Arguments:
+        - path: Path to the frame.
+
+        Returns:
+        - Share of edge pixels between 0 and 1.
+        """
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return 0.0
+    # Downscale, so the measure does not depend on the resolution
+    scale = 320 / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA)
+    edges = cv2.Canny(gray, 100, 200)
+    return np.count_nonzero(edges) / edges.size
+
+
+def caption_frame(processor, model, path: str, dtype=None) -> str:
+    """
+        Describes a single frame with a BLIP or BLIP2 model.
+
+        Arguments:
+        - processor, model: The captioning processor and model.
+        - path: Path to the frame.
+        - dtype: Optional dtype the pixel values are cast to (e.g. bfloat16).
+
+        Returns:
+        - The generated description.
+        """
+    image = Image.open(path).convert("RGB")
+    inputs = processor(image, return_tensors="pt")
+    if dtype is not None:
+        inputs["pixel_values"] = inputs["pixel_values"].to(dtype)
+
+    with torch.inference_mode():
+        output = model.generate(**inputs, max_length=50)
+    return processor.decode(output[0], skip_special_tokens=True).strip()
+
+
+def describe_image(images: list[Description], quality: str = "fast", checkpoint: str = None) -> list[Description]:
     """
-        Generates a description for each frame using the BLIP model.
+        Generates a description for each frame.
+
+        With quality "fast", a small BLIP model describes every frame and the large BLIP2 model only describes
+        frames that are visually complex. With quality "high", BLIP2 describes every frame.
+        The tier that was used is stored in "caption_tier" ("small" or "large").
 
         Arguments:
         - images: List of frame metadata including file paths.
+        - quality: One of CAPTION_QUALITIES.
+        - checkpoint: Optional artifact key. Every described frame is recorded under it, and frames recorded by
+          an interrupted run are taken over instead of being described again.
 
         Yields:
         - Progress updates and model load status.
@@ -360,32 +1328,67 @@ def describe_image(images: list[Description]) -> list[Description]:
         Returns:
         - Updated list with descriptions for each frame.
         """
+    if quality not in CAPTION_QUALITIES:
+        raise ValueError(
+            f"Unknown caption quality '{quality}', expected one of {CAPTION_QUALITIES}")
+
     if os.getenv("SKIPP_LARGE_AI_TESTS", "NO") == "YES":
         yield "✅ Bilderkennung geladen"
         i = 0
         for image_date in images:
             image_date["description"] = "test"
+            image_date["caption_tier"] = "large" if quality == "high" else "small"
             i += 1
             yield i / len(images)
         return images
 
-    yield load_image_description_model()
+    done = artifact_cache.load_checkpoint(checkpoint) if checkpoint else {}
+    for index, result in done.items():
+        images[index].update(result)
+    pending = [index for index in range(len(images)) if index not in done]
+    if done:
+        yield f"⏭️ Bildbeschreibung von {len(done)}/{len(images)} Frames fortgesetzt"
+
+    for image_date in (images[index] for index in pending):
+        if quality == "high":
+            image_date["caption_tier"] = "large"
+        else:
+            image_date["complexity"] = visual_complexity(image_date["path"])
+            image_date["caption_tier"] = "large" \
+                if image_date["complexity"] > CAPTION_COMPLEXITY_THRESHOLD else "small"
+
+    client = model_server.get_client()
+    if client is None:
+        if any(images[index]["caption_tier"] == "small" for index in pending):
+            yield load_small_image_description_model()
+        if any(images[index]["caption_tier"] == "large" for index in pending):
+            yield load_image_description_model()
+        descriptions = (
+            caption_frame(blip_processor, blip_model, image_date["path"],
+                          torch.bfloat16 if blip_precision == "bf16" else None)
+            if image_date["caption_tier"] == "large" else
+            caption_frame(small_blip_processor,
+                          small_blip_model, image_date["path"])
+            for image_date in (images[index] for index in pending))
+    else:
+        yield "⏭️ Bilderkennung über Modell-Server"
+        descriptions = client.map("caption", [
+            {"path": images[index]["path"], "tier": images[index]["caption_tier"]} for index in pending])
 
     st.session_state["video2text_progress_bar_text"] = "Frames werden beschreiben. Das kann einige Zeit dauern."
 
-    i = 0
-    for image_date in images:
-        image = Image.open(image_date["path"]).convert("RGB")
-        inputs = blip_processor(image, return_tensors="pt")
-
-        output = blip_model.generate(**inputs, max_length=50)
-        description = blip_processor.decode(
-            output[0], skip_special_tokens=True)
-        image_date["description"] = description.strip()
+    i = len(done)
+    for index, description in zip(pending, descriptions):
+        image_date = images[index]
+        image_date["description"] = description
+        if checkpoint:
+            artifact_cache.append_checkpoint(checkpoint, index, {
+                key: image_date[key] for key in ("description", "caption_tier", "complexity") if key in image_date})
         i += 1
         yield i / len(images)
 
-    yield "✅ Frames beschrieben"
+    large = sum(1 for image_date in images if image_date["caption_tier"] == "large")
+    yield f"✅ Frames beschrieben ({large}/{len(images)} mit BLIP2)"
 
     return images
 
@@ -400,6 +1403,36 @@ def summarize_with_deepseek(prompt: str) -> str:
         Yields:
         - Progress updates if using DeepSeek.
 
+        Returns:
+        - Generated summary text.
+        """
+    if os.getenv("OPENAI_API_KEY") is None:
+        if model_server.get_client() is not None:
+            yield "⏭️ LLM über Modell-Server"
+        else:
+            yield load_summarizer_model()
+            if DRAFT_MODEL:
+                yield load_draft_model()
+
+    saved_seconds = prefix_cache_stats["saved_seconds"]
+    speculative_before = dict(speculative_stats)
+    summary = generate_summary(prompt)
+    if prefix_cache_stats["saved_seconds"] > saved_seconds:
+        yield f"✅ Präfix-Cache genutzt (~{prefix_cache_stats['saved_seconds'] - saved_seconds:.1f} s Prefill gespart)"
+    if speculative_report(speculative_before):
+        yield speculative_report(speculative_before)
+    return summary
+
+
+def generate_summary(prompt: str) -> str:
+    """
+        Generates a summary with the configured backend without yielding progress.
+
+        The local DeepSeek model must already be loaded if neither OpenAI nor a model server is used.
+
+        Arguments:
+        - prompt: The constructed input string to be summarized.
+
         Returns:
         - Generated summary text.
         """
@@ -407,16 +1440,413 @@ def summarize_with_deepseek(prompt: str) -> str:
     if api_key is not None:
         return use_openai(api_key, prompt)
 
-    yield load_summarizer_model()
+    client = model_server.get_client()
+    if client is not None:
+        return client.request("generate", {"prompt": prompt, "max_new_tokens": MAX_NEW_TOKENS})
 
-    inputs = deepseek_tokenizer(prompt, return_tensors="pt", padding=True)
+    inputs = deepseek_inputs(prompt)
     streamer = TextStreamer(deepseek_tokenizer)
-    output = deepseek_model.generate(
-        **inputs, streamer=streamer, temperature=0.7, max_new_tokens=500)
+    output = deepseek_generate(
+        **inputs, streamer=streamer, temperature=DEEPSEEK_TEMPERATURE, max_new_tokens=MAX_NEW_TOKENS)
 
     print(output)
 
-    return deepseek_tokenizer.decode(output[0], skip_special_tokens=True)
+    return deepseek_tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+def get_prefix_cache(prefix: str) -> dict:
+    """
+        Prefills the local model with a static prompt prefix once and keeps its key/value cache.
+
+        Arguments:
+        - prefix: The static beginning of prompts, e.g. PROMPT_PREAMBLE.
+
+        Returns:
+        - The token ids of the prefix, its key/value cache and the seconds the prefill took.
+        """
+    with deepseek_prefix_lock:
+        if prefix not in deepseek_prefix_caches:
+            input_ids = deepseek_tokenizer(prefix, return_tensors="pt")[
+                "input_ids"].to(deepseek_model.device)
+            start = time.perf_counter()
+            with torch.inference_mode():
+                past_key_values = deepseek_model(
+                    input_ids, use_cache=True).past_key_values
+            if isinstance(past_key_values, tuple):
+                past_key_values = DynamicCache.from_legacy_cache(
+                    past_key_values)
+            deepseek_prefix_caches[prefix] = {
+                "input_ids": input_ids,
+                "past_key_values": past_key_values,
+                "prefill_seconds": time.perf_counter() - start,
+            }
+        return deepseek_prefix_caches[prefix]
+
+
+def deepseek_inputs(prompt: str) -> dict:
+    """
+        Tokenizes a prompt for the local model and reuses the key/value cache of its static preamble.
+
+        If the prompt starts with PROMPT_PREAMBLE or REDUCE_PREAMBLE, a copy of the cached prefix is passed as
+        past_key_values, so only the video-specific rest of the prompt is prefilled. The estimated prefill time
+        saved is added to prefix_cache_stats.
+
+        Arguments:
+        - prompt: The prompt to be summarized.
+
+        Returns:
+        - Keyword arguments for deepseek_model.generate.
+        """
+    inputs = deepseek_tokenizer(prompt, return_tensors="pt", padding=True).to(
+        deepseek_model.device)
+    prefix = next((prefix for prefix in (PROMPT_PREAMBLE, REDUCE_PREAMBLE)
+                  if prompt.startswith(prefix)), None)
+    if prefix is None:
+        prefix_cache_stats["misses"] += 1
+        return dict(inputs)
+
+    cache = get_prefix_cache(prefix)
+    input_ids = inputs["input_ids"][0]
+    cached_ids = cache["input_ids"][0]
+    # The last token of the prefix may merge with the following text, so only the common tokens are reused.
+    # At least one token has to be left for generate to prefill.
+    length = min(len(cached_ids), len(input_ids) - 1)
+    mismatch = (input_ids[:length] != cached_ids[:length]).nonzero()
+    length = int(mismatch[0]) if len(mismatch) else length
+    if length <= 0:
+        prefix_cache_stats["misses"] += 1
+        return dict(inputs)
+
+    past_key_values = copy.deepcopy(cache["past_key_values"])
+    past_key_values.crop(length)
+    prefix_cache_stats["hits"] += 1
+    prefix_cache_stats["saved_seconds"] += cache["prefill_seconds"] * \
+        length / len(cached_ids)
+    return dict(inputs, past_key_values=past_key_values)
+
+
+def stream_summary(prompt: str):
+    """
+        Generates a summary with the configured backend and yields the text while it is generated.
+
+        The model server does not stream, its answer is yielded as one piece. The local DeepSeek model must
+        already be loaded if neither OpenAI nor a model server is used.
+
+        Arguments:
+        - prompt: The constructed input string to be summarized.
+
+        Yields:
+        - Pieces of the generated text.
+
+        Returns:
+        - The complete summary text.
+        """
+    api_key = os.getenv("OPENAI_API_KEY")
+    errors = []
+    if api_key is not None:
+        pieces = stream_openai(api_key, prompt)
+    elif model_server.get_client() is not None:
+        pieces = iter([generate_summary(prompt)])
+    else:
+        inputs = deepseek_inputs(prompt)
+        pieces = TextIteratorStreamer(
+            deepseek_tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        def generate():
+            # Ends the streamer even if generation fails, so the consumer below does not wait forever
+            try:
+                deepseek_generate(**inputs, streamer=pieces, temperature=DEEPSEEK_TEMPERATURE,
+                                  max_new_tokens=MAX_NEW_TOKENS)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                pieces.end()
+
+        threading.Thread(target=generate, daemon=True).start()
+
+    text = ""
+    for piece in pieces:
+        if piece:
+            text += piece
+            yield piece
+    if errors:
+        raise errors[0]
+    return text
+
+
+def summarize_streaming(prompt: str):
+    """
+        Summarizes the prompt like summarize_with_deepseek, but yields the generated text while it is generated.
+
+        Arguments:
+        - prompt: The constructed input string to be summarized.
+
+        Yields:
+        - Model load status, a SummaryToken for every generated piece and the time to the first token.
+
+        Returns:
+        - Generated summary text.
+        """
+    if os.getenv("OPENAI_API_KEY") is None:
+        if model_server.get_client() is not None:
+            yield "⏭️ LLM über Modell-Server"
+        else:
+            yield load_summarizer_model()
+            if DRAFT_MODEL:
+                yield load_draft_model()
+
+    saved_seconds = prefix_cache_stats["saved_seconds"]
+    speculative_before = dict(speculative_stats)
+    start = time.perf_counter()
+    time_to_first_token = None
+    try:
+        gen = stream_summary(prompt)
+        while True:
+            piece = next(gen)
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            yield {"event": "token", "text": piece}
+    except StopIteration as e:
+        text = e.value
+
+    total = time.perf_counter() - start
+    if time_to_first_token is not None:
+        yield f"✅ Zusammenfassung in {total:.1f} s erstellt (erste Ausgabe nach {time_to_first_token:.1f} s)"
+    if prefix_cache_stats["saved_seconds"] > saved_seconds:
+        yield f"✅ Präfix-Cache genutzt (~{prefix_cache_stats['saved_seconds'] - saved_seconds:.1f} s Prefill gespart)"
+    if speculative_report(speculative_before):
+        yield speculative_report(speculative_before)
+    return text
+
+
+def split_into_chunks(video_text: list[ExtractedText], chunk_seconds: float = SUMMARY_CHUNK_SECONDS) \
+        -> list[list[ExtractedText]]:
+    """
+        Splits the matched segments into consecutive parts of about chunk_seconds.
+
+        Arguments:
+        - video_text: Matched segments ordered by time.
+        - chunk_seconds: Length of a part in seconds.
+
+        Returns:
+        - List of non-empty parts.
+        """
+    chunks = []
+    for segment in video_text:
+        index = int(segment["start"] // chunk_seconds)
+        if not chunks or chunks[-1][0] != index:
+            chunks.append((index, []))
+        chunks[-1][1].append(segment)
+    return [segments for _, segments in chunks]
+
+
+def _format_time(seconds: numbers.Number) -> str:
+    return f"{int(seconds) // 60:02d}:{int(seconds) % 60:02d}"
+
+
+def summarize_hierarchical(video_text: list[ExtractedText], chunk_seconds: float = SUMMARY_CHUNK_SECONDS,
+                           max_workers: int = None, stream: bool = False):
+    """
+        Summarizes long videos in a map-reduce fashion.
+
+        The segments are split into time-based parts, which are summarized concurrently. Every part summary is
+        yielded as soon as it is ready. A final pass merges the part summaries into one note.
+
+        Arguments:
+        - video_text: Matched segments ordered by time.
+        - chunk_seconds: Length of a part in seconds.
+        - max_workers: Number of parts summarized at the same time. Defaults to the SUMMARY_WORKERS environment
+          variable, or 4 for OpenAI and the model server and 1 for the in-process model.
+        - stream: Yield the merged summary as SummaryToken events while it is generated.
+
+        Yields:
+        - Model load status, progress values, a SummarySection for every finished part and, if streamed,
+          SummaryToken events of the merged summary.
+
+        Returns:
+        - The merged summary text.
+        """
+    remote = os.getenv("OPENAI_API_KEY") is not None or model_server.get_client() is not None
+    if not remote:
+        yield load_summarizer_model()
+        if DRAFT_MODEL:
+            yield load_draft_model()
+    if max_workers is None:
+        max_workers = int(os.getenv("SUMMARY_WORKERS", "4" if remote else "1"))
+
+    chunks = split_into_chunks(video_text, chunk_seconds)
+    token_budget = get_token_budget()
+    count_tokens = get_token_counter()
+    prompts = []
+    for index, chunk in enumerate(chunks):
+        prompt = build_prompt(chunk, token_budget - 100, count_tokens)
+        prompts.append(prompt + f"""
+
+------------------
+This is part {index + 1} of {len(chunks)} of the video ({_format_time(chunk[0]["start"])} - \
+{_format_time(chunk[-1]["end"])}). Only summarize this part.""")
+
+    st.session_state["video2text_progress_bar_text"] = "Abschnitte werden zusammengefasst."
+
+    saved_seconds = prefix_cache_stats["saved_seconds"]
+    speculative_before = dict(speculative_stats)
+    summaries = [None] * len(chunks)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(generate_summary, prompt): index
+                   for index, prompt in enumerate(prompts)}
+        for future in as_completed(futures):
+            index = futures[future]
+            summaries[index] = future.result()
+            yield {
+                "event": "section",
+                "index": index,
+                "count": len(chunks),
+                "start": chunks[index][0]["start"],
+                "end": chunks[index][-1]["end"],
+                "text": summaries[index],
+            }
+            yield sum(summary is not None for summary in summaries) / len(chunks)
+    finally:
+        # A cancelled job (GeneratorExit) only waits for the parts being summarized, not for the queued ones
+        executor.shutdown(cancel_futures=True)
+    yield f"✅ {len(chunks)} Abschnitte zusammengefasst"
+    if prefix_cache_stats["saved_seconds"] > saved_seconds:
+        yield f"✅ Präfix-Cache genutzt (~{prefix_cache_stats['saved_seconds'] - saved_seconds:.1f} s Prefill gespart)"
+    if speculative_report(speculative_before):
+        yield speculative_report(speculative_before)
+
+    if len(chunks) == 1:
+        return summaries[0]
+
+    reduce_prompt = REDUCE_PREAMBLE + "".join(
+        f"\n\nPart {index + 1} ({_format_time(chunk[0]['start'])} - {_format_time(chunk[-1]['end'])}):\n{summary}"
+        for index, (chunk, summary) in enumerate(zip(chunks, summaries)))
+    if not stream:
+        return generate_summary(reduce_prompt)
+
+    try:
+        gen = stream_summary(reduce_prompt)
+        while True:
+            yield {"event": "token", "text": next(gen)}
+    except StopIteration as e:
+        return e.value
+
+
+def summary_backend() -> dict:
+    """
+        Describes the backend, model and generation parameters generate_summary currently uses.
+        """
+    if os.getenv("OPENAI_API_KEY") is not None:
+        return {"backend": "openai", "base_url": os.getenv("OPENAI_BASE_URL"), "model": OPENAI_MODEL,
+                "temperature": OPENAI_TEMPERATURE}
+    return {"backend": "server" if model_server.get_client() is not None else "local", "model": DEEPSEEK_MODEL,
+            "precision": LLM_PRECISION, "temperature": DEEPSEEK_TEMPERATURE, "max_new_tokens": MAX_NEW_TOKENS}
+
+
+def summary_cache_key(content: str, params: dict) -> str:
+    """
+        Builds the key of a summary in the summary cache.
+
+        Arguments:
+        - content: The text that is summarized, usually the prompt.
+        - params: Further parameters that change the summary, e.g. the summary mode.
+
+        Returns:
+        - A hash of the content, the parameters and the current backend.
+        """
+    key = json.dumps({"content": content, "params": params, **summary_backend()}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def load_cached_summary(key: str):
+    """
+        Looks up a summary in the summary cache and counts the hit or miss in summary_cache_stats.
+
+        Returns:
+        - The cached summary, or None.
+        """
+    path = SUMMARY_CACHE_FOLDER / f"{key}.json"
+    if not path.is_file():
+        summary_cache_stats["misses"] += 1
+        return None
+    with open(path) as f:
+        summary = json.load(f)["summary"]
+    summary_cache_stats["hits"] += 1
+    return summary
+
+
+def save_cached_summary(key: str, summary: str):
+    """
+        Stores a summary in the summary cache. The file is replaced atomically, so concurrent readers never see
+        a partial summary.
+        """
+    SUMMARY_CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = SUMMARY_CACHE_FOLDER / f"{key}.json"
+    partial = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(partial, "w") as f:
+        json.dump({"summary": summary, "created": time.time(), **summary_backend()}, f)
+    os.replace(partial, path)
+
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """
+        Returns a long-lived OpenAI client, so connections are reused between requests.
+
+        The client is created again if the API key or the OPENAI_BASE_URL environment variable changes.
+        Retries are handled by call_with_retries, not by the client.
+
+        Arguments:
+        - api_key: API key for OpenAI.
+
+        Returns:
+        - The OpenAI client.
+        """
+    global openai_client, openai_client_config
+    config = (api_key, os.getenv("OPENAI_BASE_URL"))
+    if openai_client is None or openai_client_config != config:
+        openai_client = OpenAI(
+            api_key=api_key,
+            base_url=config[1],
+            max_retries=0,
+            timeout=OPENAI_TIMEOUT,
+        )
+        openai_client_config = config
+    return openai_client
+
+
+def call_with_retries(request, retries: int = None, deadline: float = None, backoff: float = None):
+    """
+        Calls request(timeout=...) and retries transient OpenAI errors with exponential backoff.
+
+        Arguments:
+        - request: Function sending the request. It receives the remaining time as timeout.
+        - retries: Maximum number of retries. Defaults to OPENAI_MAX_RETRIES.
+        - deadline: Seconds all attempts together may take. Defaults to OPENAI_TIMEOUT.
+        - backoff: Delay before the first retry in seconds, doubled for every retry. Defaults to OPENAI_BACKOFF.
+
+        Returns:
+        - The result of request.
+
+        Raises:
+        - The last error if all retries failed or the deadline would be missed.
+        """
+    retries = OPENAI_MAX_RETRIES if retries is None else retries
+    deadline = OPENAI_TIMEOUT if deadline is None else deadline
+    backoff = OPENAI_BACKOFF if backoff is None else backoff
+
+    end = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            return request(timeout=max(0.1, end - time.monotonic()))
+        except OPENAI_RETRYABLE_ERRORS as e:
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1)
+            if attempt >= retries or time.monotonic() + delay >= end:
+                raise
+            print(f"OpenAI request failed ({e}), retrying in {delay:.1f} s")
+            time.sleep(delay)
+            attempt += 1
 
 
 def use_openai(api_key: str, prompt: str) -> str:
@@ -430,32 +1860,51 @@ def use_openai(api_key: str, prompt: str) -> str:
         Returns:
         - Summary text generated by OpenAI.
         """
-    client = OpenAI(
-        api_key=api_key,
-    )
+    client = get_openai_client(api_key)
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        temperature=0.5,
+    completion = call_with_retries(lambda timeout: client.chat.completions.create(
+        model=OPENAI_MODEL,
+        temperature=OPENAI_TEMPERATURE,
         messages=[
             {"role": "user", "content": prompt}
-        ]
-    )
+        ],
+        timeout=timeout,
+    ))
 
     return completion.choices[0].message.content
 
 
-def build_prompt(video_description: list[ExtractedText]):
+def stream_openai(api_key: str, prompt: str):
     """
-        Constructs a prompt from extracted video segments to be used for summarization.
+        Uses the OpenAI API to generate a summary and yields it while it is generated.
+
+        Only opening the stream is retried, an error after the first piece is raised.
 
         Arguments:
-        - video_description: List of transcribed and described video segments.
+        - api_key: API key for OpenAI.
+        - prompt: Prompt to be summarized.
 
-        Returns:
-        - A string prompt with detailed context and structure for the LLM.
+        Yields:
+        - Pieces of the summary text.
         """
-    prompt = """I want a summary of a video for my notes. All information from the video should be summarized.
+    client = get_openai_client(api_key)
+
+    stream = call_with_retries(lambda timeout: client.chat.completions.create(
+        model=OPENAI_MODEL,
+        temperature=OPENAI_TEMPERATURE,
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        stream=True,
+        timeout=timeout,
+    ))
+
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+PROMPT_PREAMBLE = """I want a summary of a video for my notes. All information from the video should be summarized.
 The goal is to help me study for an exam using the notes.
 You must include all the information that might be asked in an exam or quiz in the summary!
 The information should be divided into sections and described in detail using bullet points.
@@ -472,13 +1921,165 @@ The video follows
 ------------------
 """
 
-    for segment in video_description:
-        if len(segment["frames"]) > 0:
-            prompt += "\n\nThe video shows:\n"
-            for frame in segment["frames"]:
-                prompt += f"* Text on screen: {frame['text']}\n"
-                prompt += f"* Description of szene: {frame['description']}\n"
-            prompt += "Spoken text: "
-        prompt += segment["text"]
 
-    return prompt
+REDUCE_PREAMBLE = """The following texts are summaries of consecutive parts of a video. Merge them into one summary for my
+notes. The goal is to help me study for an exam using the notes. Keep all the information that might be asked in an exam
+or quiz, remove repetitions and keep the chronological order.
+The information should be divided into sections and described in detail using bullet points.
+"""
+
+
+def get_token_counter():
+    """
+        Returns a function that counts tokens with the tokenizer of the summarization backend.
+
+        Uses tiktoken for OpenAI and the DeepSeek tokenizer for the local model. If the tokenizer is not
+        available, tokens are estimated with four characters per token.
+
+        Returns:
+        - A function mapping a string to its number of tokens.
+        """
+    try:
+        if os.getenv("OPENAI_API_KEY") is not None:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+        tokenizer = deepseek_tokenizer
+        if tokenizer is None and (base_folder / "deepseek_model" / "tokenizer.json").is_file():
+            tokenizer = AutoTokenizer.from_pretrained(
+                str(base_folder / "deepseek_model"))
+        if tokenizer is not None:
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception as e:
+        print(f"Tokenizer not available, estimating tokens: {e}")
+    return lambda text: math.ceil(len(text) / 4)
+
+
+def get_token_budget() -> int:
+    """
+        Returns the maximum number of prompt tokens for the summarization backend.
+
+        The PROMPT_TOKEN_BUDGET environment variable overrides the default, which is the context window of the
+        model minus the tokens reserved for the answer.
+        """
+    if os.getenv("PROMPT_TOKEN_BUDGET"):
+        return int(os.getenv("PROMPT_TOKEN_BUDGET"))
+    model = OPENAI_MODEL if os.getenv(
+        "OPENAI_API_KEY") is not None else DEEPSEEK_MODEL
+    return CONTEXT_WINDOWS[model] - MAX_NEW_TOKENS
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def build_prompt_with_stats(video_description: list[ExtractedText], token_budget: int = None,
+                            count_tokens=None) -> tuple[str, PromptStats]:
+    """
+        Constructs a compact prompt from extracted video segments and reports its size.
+
+        Repeated screen texts and frame descriptions are only included the first time they appear. If the prompt
+        exceeds the token budget, content is dropped by priority: frame descriptions first, then screen texts and
+        only then spoken text, starting from the end of the video. The build is linear in the size of the input.
+
+        Arguments:
+        - video_description: List of transcribed and described video segments.
+        - token_budget: Maximum number of tokens of the prompt. None disables compaction.
+        - count_tokens: Function counting the tokens of a string. Defaults to get_token_counter().
+
+        Returns:
+        - The prompt and its statistics.
+        """
+    count_tokens = count_tokens or get_token_counter()
+    token_cache = {}
+
+    def tokens(text):
+        if text not in token_cache:
+            token_cache[text] = count_tokens(text)
+        return token_cache[text]
+
+    # Every piece is [priority, segment, text, tokens, kept]. Priority 0 is spoken text, 1 screen text, 2 description.
+    pieces = []
+    seen = set()
+    # Segments with frames get a header, which is dropped together with their last frame piece
+    header_tokens = tokens("\n\nThe video shows:\n") + tokens("Spoken text: ")
+    tokens_before = tokens(PROMPT_PREAMBLE)
+    for index, segment in enumerate(video_description):
+        if segment["frames"]:
+            tokens_before += header_tokens
+        for frame in segment["frames"]:
+            for priority, label, value in ((1, "Text on screen", frame.get("text", "")),
+                                           (2, "Description of szene", frame.get("description", ""))):
+                line = f"* {label}: {value}\n"
+                tokens_before += tokens(line)
+                key = (priority, _normalize(value))
+                if not key[1] or key in seen:
+                    continue
+                seen.add(key)
+                pieces.append([priority, index, line, tokens(line), True])
+        tokens_before += tokens(segment["text"])
+        pieces.append([0, index, segment["text"], tokens(segment["text"]), True])
+
+    frame_pieces = {}
+    for piece in pieces:
+        if piece[0] > 0:
+            frame_pieces[piece[1]] = frame_pieces.get(piece[1], 0) + 1
+    total = tokens(PROMPT_PREAMBLE) + sum(piece[3]
+                                          for piece in pieces) + header_tokens * len(frame_pieces)
+
+    dropped = {0: 0, 1: 0, 2: 0}
+    if token_budget is not None and total > token_budget:
+        by_priority = {0: [], 1: [], 2: []}
+        for piece in pieces:
+            by_priority[piece[0]].append(piece)
+        for priority in (2, 1, 0):
+            for piece in reversed(by_priority[priority]):
+                if total <= token_budget:
+                    break
+                piece[4] = False
+                total -= piece[3]
+                dropped[priority] += 1
+                if priority > 0:
+                    frame_pieces[piece[1]] -= 1
+                    if frame_pieces[piece[1]] == 0:
+                        total -= header_tokens
+
+    parts = [PROMPT_PREAMBLE]
+    segment_pieces = {}
+    for piece in pieces:
+        if piece[4]:
+            segment_pieces.setdefault(piece[1], []).append(piece)
+    for index in sorted(segment_pieces):
+        frame_lines = [piece[2] for piece in segment_pieces[index] if piece[0] > 0]
+        spoken = [piece[2] for piece in segment_pieces[index] if piece[0] == 0]
+        if frame_lines:
+            parts.append("\n\nThe video shows:\n")
+            parts.extend(frame_lines)
+            parts.append("Spoken text: ")
+        parts.extend(spoken)
+    prompt = "".join(parts)
+
+    return prompt, {
+        "tokens_before": tokens_before,
+        "tokens_after": count_tokens(prompt),
+        "token_budget": token_budget,
+        "dropped_spoken": dropped[0],
+        "dropped_screen_texts": dropped[1],
+        "dropped_descriptions": dropped[2],
+    }
+
+
+def build_prompt(video_description: list[ExtractedText], token_budget: int = None, count_tokens=None):
+    """
+        Constructs a prompt from extracted video segments to be used for summarization.
+
+        Arguments:
+        - video_description: List of transcribed and described video segments.
+        - token_budget: Maximum number of tokens of the prompt. None disables compaction.
+        - count_tokens: Function counting the tokens of a string.
+
+        Returns:
+        - A string prompt with detailed context and structure for the LLM.
+        """
+    return build_prompt_with_stats(video_description, token_budget, count_tokens)[0]
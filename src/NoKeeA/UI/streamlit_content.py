@@ -1,11 +1,25 @@
 import numbers
+import re
 
 import streamlit as st
 from streamlit_quill import st_quill
 from NoKeeA.utils.session_state import initialize_session_state
 from NoKeeA.utils.wikipedia_api import get_wikipedia_summary
 import time
+from NoKeeA.AI import jobs, planner, storage
+from NoKeeA.AI.memory import format_memory_size
 from NoKeeA.AI import video2text as v2t
+from NoKeeA.AI.deadline import DEGRADATION_NAMES, DeadlineToken
+
+
+def degradation_note(degradations) -> str:
+    """
+    Returns a note for the summary naming the quality reductions applied to meet the deadline.
+    """
+    if not degradations:
+        return ""
+    names = ", ".join(DEGRADATION_NAMES[degradation] for degradation in degradations)
+    return f"<p><em>Wegen der Frist mit reduzierter Qualität erstellt: {names}</em></p>"
 
 
 def update_quill_editor():
@@ -119,7 +133,11 @@ def video2text():
     Workflow:
     - Toggles a file uploader UI on button click.
     - Accepts MP4 video files from the user.
+    - Queues the video for a background worker and polls the job (VIDEO2TEXT_JOBS=background),
+      or runs the pipeline in the script thread (VIDEO2TEXT_JOBS=inline).
     - Displays a progress bar and status messages during AI processing.
+    - Inserts part summaries of long videos as soon as they are ready.
+    - Renders the summary live while it is generated.
     - Appends the generated text summary to the user's current note content.
     """
     if "show_video2text_uploader" not in st.session_state:
@@ -135,42 +153,337 @@ def video2text():
                 "Die Informationen werden direkt in die Notiz eingefügt.")
             st.session_state["video2text_file_content"] = st.file_uploader(
                 "Wähle ein Video aus:", type="mp4")
+            usage = storage.usage()
+            st.caption(f"Zwischenspeicher: {format_memory_size(usage['bytes'])} von "
+                       f"{format_memory_size(usage['budget'])} ({usage['videos']} Videos)")
             if st.session_state["video2text_file_content"] is not None:
                 st.write("Die Beschreibung wird ans Ende der Notiz eingefügt.")
+                high_quality = st.checkbox(
+                    "Alle Frames mit dem großen Modell beschreiben (langsam)",
+                    key="video2text_high_quality")
+                regenerate = st.checkbox(
+                    "Zusammenfassung neu erzeugen (Cache ignorieren)",
+                    key="video2text_regenerate")
+                deadline_minutes = st.number_input(
+                    "Spätestens fertig nach (Minuten, 0 = ohne Frist)", min_value=0, value=0, step=1,
+                    help="Reicht die Zeit nicht, werden weniger Frames, ein kleineres Whisper-Modell "
+                         "und keine Bildbeschreibungen verwendet.",
+                    key="video2text_deadline")
+                draft = jobs.JOB_MODE != "inline" and st.checkbox(
+                    "Zuerst einen schnellen Entwurf einfügen, der später ersetzt wird",
+                    key="video2text_draft")
+                ranges_text = st.text_input(
+                    "Nur diese Abschnitte verarbeiten (leer = ganzes Video)",
+                    placeholder="1:00-5:30, 10:00-12:00",
+                    key="video2text_ranges")
                 if st.button("📝 Convert"):
-                    with st.status("Auf KI warten...", expanded=True) as status:
-                        try:
-                            gen = v2t.video2text(
-                                st.session_state["video2text_file_content"])
-                            while True:
-                                step = next(gen)
-                                if isinstance(step, str):
-                                    if "video2text_progress_bar" in st.session_state:
-                                        del st.session_state["video2text_progress_bar"]
-                                    st.success(step)
-                                elif isinstance(step, numbers.Number):
-                                    if "video2text_progress_bar_text" not in st.session_state:
-                                        st.session_state["video2text_progress_bar_text"] = "Bitte warten..."
-                                    if "video2text_progress_bar" not in st.session_state:
-                                        st.session_state["video2text_progress_bar"] = st.progress(
-                                            0, st.session_state["video2text_progress_bar_text"])
-
-                                    st.session_state["video2text_progress_bar"].progress(
-                                        step,
-                                        f"{st.session_state['video2text_progress_bar_text']} ~ {(step * 100):.2f}%")
-                        except StopIteration as e:
-                            st.write(e.value)
-                            status.update(
-                                label="Video zusammengefasst!",
-                                state="complete",
-                                expanded=False,
-                            )
-                            current_content = st.session_state.get(
-                                "editor_content", "")
-                            new_content = current_content + f"<p>{e.value}</p>"
-                            st.session_state["editor_content"] = new_content
-                            update_quill_editor()
-                        st.success(
-                            "✅ Video zusammengefasst und Text eingefügt")
+                    try:
+                        ranges = planner.parse_ranges(ranges_text or "") or None
+                    except ValueError:
+                        st.error("Ungültige Abschnitte, erwartet z. B. 1:00-5:30, 10:00-12:00")
+                        return
+                    if jobs.JOB_MODE == "inline":
+                        run_video2text_inline(high_quality, regenerate, deadline_minutes * 60, ranges)
+                    else:
+                        submit_video2text_job(high_quality, regenerate, deadline_minutes * 60, draft, ranges)
                     st.session_state["video2text_file_content"] = None
                     st.rerun()
+
+    if jobs.JOB_MODE != "inline":
+        video2text_jobs()
+
+
+def run_video2text_inline(high_quality: bool, regenerate: bool, deadline_seconds: float = 0, ranges=None):
+    """
+    Runs the video-to-text pipeline in the script thread and shows its progress live.
+
+    Args:
+        high_quality (bool): Describe all frames with the large captioning model.
+        regenerate (bool): Ignore cached summaries.
+        deadline_seconds (float): Seconds the summary should be ready in, 0 for no deadline.
+        ranges (list): Optional [start, end] pairs in seconds; only these parts of the video are processed.
+    """
+    with st.status("Auf KI warten...", expanded=True) as status:
+        current_content = st.session_state.get(
+            "editor_content", "")
+        sections = {}
+        live_summary = None
+        live_text = ""
+        token = DeadlineToken(time.time() + deadline_seconds if deadline_seconds else None)
+        try:
+            gen = v2t.video2text(
+                st.session_state["video2text_file_content"],
+                caption_quality="high" if high_quality else "fast",
+                stream=True,
+                regenerate=regenerate,
+                token=token,
+                ranges=ranges)
+            while True:
+                step = next(gen)
+                if isinstance(step, str):
+                    if "video2text_progress_bar" in st.session_state:
+                        del st.session_state["video2text_progress_bar"]
+                    st.success(step)
+                elif isinstance(step, numbers.Number):
+                    if "video2text_progress_bar_text" not in st.session_state:
+                        st.session_state["video2text_progress_bar_text"] = "Bitte warten..."
+                    if "video2text_progress_bar" not in st.session_state:
+                        st.session_state["video2text_progress_bar"] = st.progress(
+                            0, st.session_state["video2text_progress_bar_text"])
+
+                    st.session_state["video2text_progress_bar"].progress(
+                        step,
+                        f"{st.session_state['video2text_progress_bar_text']} ~ {(step * 100):.2f}%")
+                elif isinstance(step, dict) and step.get("event") == "section":
+                    # Insert part summaries progressively, the merged summary replaces them at the end
+                    sections[step["index"]] = step["text"]
+                    st.markdown(
+                        f"**Abschnitt {step['index'] + 1}/{step['count']}**\n\n{step['text']}")
+                    st.session_state["editor_content"] = current_content + "".join(
+                        f"<p>{sections[index]}</p>" for index in sorted(sections))
+                elif isinstance(step, dict) and step.get("event") == "token":
+                    # Render the summary live while it is generated
+                    if live_summary is None:
+                        live_summary = st.empty()
+                    live_text += step["text"]
+                    live_summary.markdown(live_text)
+        except StopIteration as e:
+            st.write(e.value)
+            status.update(
+                label="Video zusammengefasst!",
+                state="complete",
+                expanded=False,
+            )
+            new_content = current_content + f"<p>{e.value}</p>" + degradation_note(token.degradations)
+            st.session_state["editor_content"] = new_content
+            update_quill_editor()
+        st.success(
+            "✅ Video zusammengefasst und Text eingefügt")
+
+
+def remembered_jobs():
+    """
+    Returns the ids of the video2text jobs of this session.
+
+    The ids are also kept in the URL, so the jobs are found again after a page reload.
+    """
+    if "video2text_jobs" not in st.session_state:
+        ids = st.query_params.get("video2text_jobs", "")
+        st.session_state["video2text_jobs"] = [job_id for job_id in ids.split(",") if job_id]
+    return st.session_state["video2text_jobs"]
+
+
+def remember_jobs(job_ids):
+    st.session_state["video2text_jobs"] = job_ids
+    if job_ids:
+        st.query_params["video2text_jobs"] = ",".join(job_ids)
+    else:
+        st.query_params.pop("video2text_jobs", None)
+
+
+def submit_video2text_job(high_quality: bool, regenerate: bool, deadline_seconds: float = 0,
+                          draft: bool = False, ranges=None):
+    """
+    Saves the uploaded video and queues it for a background worker.
+
+    Args:
+        high_quality (bool): Describe all frames with the large captioning model.
+        regenerate (bool): Ignore cached summaries.
+        deadline_seconds (float): Seconds after the submission the summary should be ready, 0 for no deadline.
+        draft (bool): Queue a quick draft first, which the full summary replaces in the note.
+        ranges (list): Optional [start, end] pairs in seconds; only these parts of the video are processed.
+    """
+    path = None
+    try:
+        gen = v2t.save_video(st.session_state["video2text_file_content"])
+        while True:
+            next(gen)
+    except StopIteration as e:
+        path = e.value
+
+    queue = jobs.get_queue()
+    params = {
+        "caption_quality": "high" if high_quality else "fast",
+        "stream": True,
+        "regenerate": regenerate,
+    }
+    if ranges:
+        params["ranges"] = ranges
+    job_ids = []
+    if draft:
+        job_ids.append(queue.submit(path, {**params, "draft": True}))
+    if deadline_seconds:
+        params["deadline"] = deadline_seconds
+    job_ids.append(queue.submit(path, params, replaces=job_ids[0] if draft else None))
+    queue.ensure_workers()
+    remember_jobs(remembered_jobs() + job_ids)
+
+
+def summary_html(job) -> str:
+    """
+    Returns the HTML a finished job inserts into the note.
+    """
+    html = f"<p>{job['result']}</p>" + degradation_note(job["metrics"].get("degradations"))
+    if job["params"].get("draft"):
+        # Marked, so the full summary finds the draft again after Quill re-serialized the note
+        return marked_block(job["id"], "Video2Text-Entwurf", html,
+                            "Entwurf: Wird durch die vollständige Zusammenfassung ersetzt, sobald sie fertig ist.")
+    return html
+
+
+def marked_block(job_id: str, label: str, body: str, note: str) -> str:
+    """
+    Returns HTML for the note that a later result of the job replaces, see replace_block.
+
+    The block starts and ends with a paragraph linking to an anchor of the job. Quill keeps the href of
+    links when it re-serializes the note, so the block is found again after the user edited the note.
+    """
+    return (f'<p><strong><a href="#video2text-{job_id}">{label}</a></strong></p>{body}'
+            f'<p><em><a href="#video2text-{job_id}-end">{note}</a></em></p>')
+
+
+def replace_block(content: str, job_id: str, html: str = None) -> tuple[str, bool]:
+    """
+    Replaces the block of a job in the note, see marked_block.
+
+    Args:
+        content (str): HTML of the note.
+        job_id (str): Id of the job the block belongs to.
+        html (str): Replacement of the block. None keeps the body of the block without its marker paragraphs.
+
+    Returns:
+        tuple: The new content and whether the block was found.
+    """
+    paragraph = r'<p[^>]*>(?:(?!</p>).)*?href="#video2text-{}".*?</p>'
+    pattern = re.compile(f"({paragraph.format(job_id)})(.*?)({paragraph.format(job_id + '-end')})", re.S)
+    match = pattern.search(content)
+    if match is None:
+        return content, False
+    replacement = match.group(2) if html is None else html
+    return content[:match.start()] + replacement + content[match.end():], True
+
+
+def sections_html(job) -> str:
+    """
+    Returns the part summaries of a running job as a block the final result replaces.
+    """
+    body = "".join(f"<p>{job['sections'][index]['text']}</p>" for index in sorted(job["sections"], key=int))
+    return marked_block(job["id"], "Video2Text", body,
+                        "Abschnitte: Werden durch die Zusammenfassung ersetzt, sobald sie fertig ist.")
+
+
+def insert_sections(job) -> bool:
+    """
+    Inserts the part summaries of a running job into the note, or updates the ones already inserted.
+
+    Returns:
+        bool: Whether the note changed.
+    """
+    shown = st.session_state.setdefault("video2text_sections", {})
+    if not job["sections"] or shown.get(job["id"]) == len(job["sections"]):
+        return False
+    shown[job["id"]] = len(job["sections"])
+    content, found = replace_block(st.session_state.get("editor_content", ""), job["id"], sections_html(job))
+    st.session_state["editor_content"] = content if found else content + sections_html(job)
+    return True
+
+
+def insert_job_result(queue, job):
+    """
+    Appends the result of a finished job to the note, or replaces the draft it refines.
+
+    Part summaries inserted while the job ran are replaced by the result. The draft is found by its marker
+    paragraphs, see marked_block. A draft that is still queued or running when the full summary is ready is
+    cancelled.
+    """
+    content = st.session_state.get("editor_content", "")
+    draft = queue.get(job["replaces"]) if job["replaces"] else None
+    html = summary_html(job)
+    if job["id"] in st.session_state.get("video2text_orphaned_drafts", ()):
+        html, _ = replace_block(html, job["id"])
+    content, found = replace_block(content, job["id"], html)
+    if draft is not None:
+        content, draft_found = replace_block(content, draft["id"], "" if found else html)
+        found = found or draft_found
+    if not found:
+        content += html
+    st.session_state["editor_content"] = content
+    st.session_state.get("video2text_sections", {}).pop(job["id"], None)
+    queue.collect(job["id"])
+    if draft is not None:
+        queue.cancel(draft["id"])
+        queue.collect(draft["id"])
+
+
+@st.fragment(run_every=2)
+def video2text_jobs():
+    """
+    Polls the video2text jobs of this session and shows their status.
+
+    Finished summaries are appended to the note once. Only this fragment reruns while polling,
+    the rest of the page stays untouched until a result is inserted.
+    """
+    job_ids = remembered_jobs()
+    if not job_ids:
+        return
+
+    queue = jobs.get_queue()
+    remaining = []
+    inserted = False
+    changed = False
+    polled = queue.get_many(job_ids)
+    if any(job["status"] in ("queued", "running") for job in polled):
+        # Replaces crashed workers, whose running jobs are queued again by the next claim
+        queue.ensure_workers()
+    for job in polled:
+        if job["status"] in ("queued", "running") and not job["cancel_requested"]:
+            if st.button("Abbrechen", key=f"video2text_cancel_{job['id']}"):
+                queue.cancel(job["id"])
+                job = queue.get(job["id"])
+        if job["status"] in ("failed", "cancelled"):
+            # Part summaries and the draft stay in the note, without the hint that they will be replaced
+            for block in filter(None, (job["id"], job["replaces"])):
+                content, found = replace_block(st.session_state.get("editor_content", ""), block)
+                st.session_state["editor_content"] = content
+                changed = found or changed
+            if job["replaces"]:
+                # A draft finishing later is inserted without the hint as well
+                st.session_state.setdefault("video2text_orphaned_drafts", set()).add(job["replaces"])
+        if job["status"] == "queued" and job["waiting_reason"]:
+            st.warning(f"⏳ {job['waiting_reason']}")
+        elif job["status"] == "queued":
+            st.info(f"⏳ Video wartet in der Warteschlange (Position {job['position'] + 1})")
+        elif job["status"] == "running":
+            st.progress(min(1.0, job["progress"] or 0.0),
+                        ("Entwurf: " if job["params"].get("draft") else "") + (
+                            job["progress_text"] or "Bitte warten..."))
+            if job["cancel_requested"]:
+                st.caption("Wird abgebrochen...")
+            elif job["messages"]:
+                st.caption(job["messages"][-1])
+            for index in sorted(job["sections"], key=int):
+                section = job["sections"][index]
+                st.markdown(f"**Abschnitt {section['index'] + 1}/{section['count']}**\n\n{section['text']}")
+            # Part summaries go into the note right away, the result replaces them
+            changed = insert_sections(job) or changed
+            if job["partial"]:
+                st.markdown(job["partial"])
+        elif job["status"] == "done":
+            if not job["collected"]:
+                insert_job_result(queue, job)
+                inserted = True
+            continue
+        elif job["status"] == "failed":
+            st.error(f"❌ Video2Text fehlgeschlagen: {job['error']}")
+            if st.button("Ausblenden", key=f"video2text_dismiss_{job['id']}"):
+                continue
+        elif job["status"] == "cancelled":
+            continue
+        remaining.append(job["id"])
+
+    remember_jobs(remaining)
+    if inserted:
+        st.success("✅ Video zusammengefasst und Text eingefügt")
+    if inserted or changed:
+        update_quill_editor()
+        st.rerun(scope="app")
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def tiny_llama():
+    """Factory for tiny random Llama models sharing the CharTokenizer vocabulary."""
+    # Imported here, so only the tests using the models load torch and transformers
+    from tests.AI.language_models import tiny_llama
+    return tiny_llama
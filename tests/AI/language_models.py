@@ -0,0 +1,21 @@
+import torch
+from transformers import BatchEncoding, LlamaConfig, LlamaForCausalLM
+
+
+class CharTokenizer:
+    """Tokenizer mapping every character to one token, good enough for tiny random language models."""
+
+    def __call__(self, text, return_tensors=None, padding=None):
+        ids = torch.tensor([[1] + [ord(c) % 250 + 2 for c in text]])
+        return BatchEncoding({"input_ids": ids, "attention_mask": torch.ones_like(ids)})
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(chr(int(i)) for i in ids)
+
+
+def tiny_llama(seed=0, layers=2):
+    """Returns a tiny random Llama model sharing the CharTokenizer vocabulary."""
+    torch.manual_seed(seed)
+    return LlamaForCausalLM(LlamaConfig(
+        vocab_size=256, hidden_size=32, intermediate_size=64, num_hidden_layers=layers,
+        num_attention_heads=4, max_position_embeddings=4096)).eval()
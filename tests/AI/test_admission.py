@@ -0,0 +1,103 @@
+import pytest
+
+from NoKeeA.AI import admission, jobs
+from NoKeeA.AI import video2text as v2t
+
+GIB = 1024 ** 3
+
+
+@pytest.fixture
+def local_models(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("MODEL_SERVER_SOCKET", raising=False)
+    monkeypatch.setattr(v2t, "BLIP2_PRECISION", "bf16")
+    monkeypatch.setattr(v2t, "LLM_PRECISION", "bf16")
+    monkeypatch.setattr(v2t, "LLM_MAX_MEMORY", "8GiB")
+
+
+def test_estimate_depends_on_models_and_duration(local_models, monkeypatch):
+    short = admission.estimate_job_memory({"caption_quality": "fast"}, 60, budget=64 * GIB)
+    long = admission.estimate_job_memory({"caption_quality": "fast"}, 3600, budget=64 * GIB)
+    assert long["audio"] > short["audio"]
+    assert set(short) == {"base", "audio", "whisper-base", "blip", "blip2", "llm"}
+    assert short["llm"] == 8 * GIB
+
+    high = admission.estimate_job_memory({"caption_quality": "high"}, 60, loaded={"blip2", "llm"})
+    assert set(high) == {"base", "audio", "whisper-base"}
+
+    draft = admission.estimate_job_memory({"caption_quality": "fast", "draft": True}, 60, budget=64 * GIB)
+    assert set(draft) == {"base", "audio", "whisper-tiny", "llm"}
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    assert "llm" not in admission.estimate_job_memory({}, 60)
+
+
+def test_decide():
+    admitted = admission.decide(4 * GIB, 0, available=8 * GIB, total=16 * GIB)
+    assert admitted["admitted"] and admitted["reason"] is None
+
+    busy = admission.decide(4 * GIB, 12 * GIB, available=8 * GIB, total=16 * GIB)
+    assert not busy["admitted"] and not busy["rejected"]
+    assert "reserviert" in busy["reason"]
+
+    swapping = admission.decide(4 * GIB, 0, available=2 * GIB, total=16 * GIB)
+    assert not swapping["admitted"] and "frei sind 2.0 GiB" in swapping["reason"]
+
+    too_large = admission.decide(20 * GIB, 0, available=16 * GIB, total=16 * GIB,
+                                 components={"blip2": 18 * GIB, "base": 2 * GIB})
+    assert too_large["rejected"] and "blip2 18.0 GiB" in too_large["reason"]
+
+
+def test_queue_waits_and_rejects_by_admission(tmp_path):
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    queue.heartbeat(1)
+    queue.heartbeat(2)
+    first = queue.submit("tmp/a.video.mp4")
+    second = queue.submit("tmp/b.video.mp4")
+    third = queue.submit("tmp/c.video.mp4")
+
+    def admit(job, reserved):
+        return admission.decide(6 * GIB, reserved, available=16 * GIB, total=16 * GIB)
+
+    assert queue.claim(1, admit)["id"] == first
+    assert queue.get(first)["reserved_bytes"] == 6 * GIB
+    assert queue.claim(2, admit)["id"] == second
+
+    assert queue.claim(2, admit) is None
+    waiting = queue.get(third)
+    assert waiting["status"] == "queued"
+    assert "Wartet auf Arbeitsspeicher" in waiting["waiting_reason"]
+
+    queue.finish(first, "Zusammenfassung")
+    assert queue.claim(1, admit)["id"] == third
+    assert queue.get(third)["waiting_reason"] is None
+
+    rejected = queue.submit("tmp/d.video.mp4")
+    assert queue.claim(1, lambda job, reserved: admission.decide(
+        64 * GIB, reserved, available=16 * GIB, total=16 * GIB)) is None
+    assert queue.get(rejected)["status"] == "failed"
+    assert queue.get(rejected)["error"].startswith("Abgelehnt")
+
+
+def test_default_config_is_not_rejected_on_small_hosts(monkeypatch):
+    from NoKeeA.AI import planner
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("MODEL_SERVER_SOCKET", raising=False)
+    monkeypatch.setattr(v2t, "BLIP2_PRECISION", "fp32")
+    monkeypatch.setattr(v2t, "LLM_PRECISION", "fp32")
+    monkeypatch.setattr(v2t, "LLM_MAX_MEMORY", None)
+    monkeypatch.setattr(planner, "probe_video", lambda path: {"duration": 600.0})
+    memory = type("Memory", (), {"total": 32 * GIB, "available": 30 * GIB})
+    monkeypatch.setattr(admission.psutil, "virtual_memory", lambda: memory)
+
+    # The language model offloads what does not fit next to the other models, as its loader does
+    decision = admission.admit_job({"video_path": "tmp/a.video.mp4", "params": {}}, 0, loaded=set())
+    assert not decision["rejected"]
+    assert decision["bytes"] <= 32 * GIB * admission.JOB_MEMORY_SHARE
+    assert decision["components"]["llm"] < admission.DEEPSEEK_PARAMETERS * 4
+
+    # Without room for the resident part of the language model the loader would refuse, and so does admission
+    memory.total = memory.available = 16 * GIB
+    decision = admission.admit_job({"video_path": "tmp/a.video.mp4", "params": {}}, 0, loaded=set())
+    assert decision["rejected"] and decision["reason"].startswith("Abgelehnt")
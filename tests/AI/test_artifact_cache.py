@@ -0,0 +1,299 @@
+import hashlib
+import io
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from NoKeeA.AI import artifact_cache, deadline, jobs
+from NoKeeA.AI import video2text as v2t
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE_FOLDER", tmp_path / "artifacts")
+    monkeypatch.setattr(artifact_cache, "artifact_cache_stats", {"hits": 0, "misses": 0, "resumed": 0})
+    return tmp_path
+
+
+def test_stage_key_depends_on_inputs_params_and_version(cache, monkeypatch):
+    key = artifact_cache.stage_key("ocr", ["frames-1"], {"min_confidence": 60})
+    assert key.startswith("ocr-")
+    assert key == artifact_cache.stage_key("ocr", ["frames-1"], {"min_confidence": 60})
+    assert key != artifact_cache.stage_key("ocr", ["frames-2"], {"min_confidence": 60})
+    assert key != artifact_cache.stage_key("ocr", ["frames-1"], {"min_confidence": 70})
+    monkeypatch.setitem(artifact_cache.STAGE_VERSIONS, "ocr", 2)
+    assert key != artifact_cache.stage_key("ocr", ["frames-1"], {"min_confidence": 60})
+    with pytest.raises(ValueError):
+        artifact_cache.stage_key("unknown", [], {})
+
+
+def test_load_and_save(cache):
+    assert artifact_cache.load("ocr-1") is None
+    artifact_cache.save("ocr-1", [{"text": "Hallo"}])
+    assert artifact_cache.load("ocr-1") == [{"text": "Hallo"}]
+    assert artifact_cache.load("ocr-1", valid=lambda value: False) is None
+    assert artifact_cache.artifact_cache_stats == {"hits": 1, "misses": 2, "resumed": 0}
+
+
+def test_checkpoints_survive_cut_off_lines(cache):
+    artifact_cache.append_checkpoint("ocr-1", 0, {"text": "A"})
+    with open(artifact_cache.checkpoint_path("ocr-1"), "a") as f:
+        f.write('{"index": 1, "val')
+    artifact_cache.append_checkpoint("ocr-1", 2, {"text": "C"})
+
+    assert artifact_cache.load_checkpoint("ocr-1") == {0: {"text": "A"}}
+    assert artifact_cache.artifact_cache_stats["resumed"] == 1
+    artifact_cache.save("ocr-1", [])
+    assert not artifact_cache.checkpoint_path("ocr-1").exists()
+
+
+def test_text_recognition_resumes_after_crash(cache, monkeypatch):
+    images = [{"path": f"frame_{i}.jpg", "frame_number": i} for i in range(4)]
+    recognized = []
+
+    crash_after = [2]
+
+    def recognize(path, min_confidence):
+        if len(recognized) == crash_after[0]:
+            raise RuntimeError("killed")
+        recognized.append(path)
+        return f"Text {path}", []
+
+    monkeypatch.setattr(v2t, "recognize_text", recognize)
+    with pytest.raises(RuntimeError):
+        list(v2t.text_recognition([dict(image) for image in images], checkpoint="ocr-1"))
+
+    recognized.clear()
+    crash_after[0] = None
+    gen = v2t.text_recognition([dict(image) for image in images], checkpoint="ocr-1")
+    steps = []
+    try:
+        while True:
+            steps.append(next(gen))
+    except StopIteration as e:
+        result = e.value
+
+    assert recognized == ["frame_2.jpg", "frame_3.jpg"]
+    assert "⏭️ Texterkennung von 2/4 Frames fortgesetzt" in steps
+    assert [image["text"] for image in result] == [f"Text frame_{i}.jpg" for i in range(4)]
+
+
+def test_describe_image_resumes_after_crash(cache, monkeypatch):
+    monkeypatch.setenv("SKIPP_LARGE_AI_TESTS", "NO")
+    monkeypatch.setattr(v2t, "load_image_description_model", lambda: "✅ Bilderkennung geladen")
+    images = [{"path": f"frame_{i}.jpg", "frame_number": i} for i in range(3)]
+    artifact_cache.append_checkpoint("captions-1", 1, {"description": "alt", "caption_tier": "large"})
+    described = []
+
+    def caption(processor, model, path, dtype=None):
+        described.append(path)
+        return f"Bild {path}"
+
+    monkeypatch.setattr(v2t, "caption_frame", caption)
+    result = None
+    gen = v2t.describe_image(images, "high", checkpoint="captions-1")
+    try:
+        while True:
+            next(gen)
+    except StopIteration as e:
+        result = e.value
+
+    assert described == ["frame_0.jpg", "frame_2.jpg"]
+    assert [image["description"] for image in result] == ["Bild frame_0.jpg", "alt", "Bild frame_2.jpg"]
+    assert len(artifact_cache.load_checkpoint("captions-1")) == 3
+
+
+def media_info(duration=60.0, has_audio=True, has_video=True):
+    return {"duration": duration, "has_video": has_video, "has_audio": has_audio, "video_codec": "h264",
+            "audio_codec": "aac" if has_audio else None, "width": 1280, "height": 720, "fps": 25.0,
+            "frame_count": int(duration * 25), "source": "ffprobe"}
+
+
+@pytest.fixture
+def pipeline(cache, monkeypatch):
+    """Replaces the work of every stage with a stub counting its runs."""
+    runs = []
+
+    def extract_audio(path, wav_path, ranges):
+        runs.append("audio")
+        open(wav_path, "w").close()
+        yield "✅ Audio extrahiert"
+        return wav_path
+
+    def transcribe_audio(wav_path, model, ranges):
+        runs.append("transcript")
+        yield "✅ Audio zu Text konvertiert"
+        return {"segments": [{"start": 0, "end": 3, "text": "Hallo"}]}
+
+    def extract_frames(path, frame_rate, threshold, frames_folder, fps, frame_count, ranges):
+        runs.append("frames")
+        (cache / "frame_0000.jpg").touch()
+        yield "✅ 1/1 Frames extrahiert"
+        return [{"path": str(cache / "frame_0000.jpg"), "frame_number": 1}]
+
+    def text_recognition(images, min_confidence, checkpoint):
+        runs.append("ocr")
+        for image in images:
+            image["text"] = f"OCR {v2t.OCR_MIN_CONFIDENCE}"
+        yield "✅ Text aus Frames extrahiert"
+        return images
+
+    def describe_image(images, quality, checkpoint):
+        runs.append("captions")
+        for image in images:
+            image["description"] = quality
+        yield "✅ Frames beschrieben"
+        return images
+
+    def summarize(prompt):
+        yield "✅ Zusammengefasst"
+        return "Zusammenfassung"
+
+    monkeypatch.chdir(cache)
+    monkeypatch.setattr(v2t, "probe_video", lambda path: {"info": media_info(), "static": False})
+    monkeypatch.setattr(v2t, "extract_audio", extract_audio)
+    monkeypatch.setattr(v2t, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(v2t, "extract_frames_convert2text", extract_frames)
+    monkeypatch.setattr(v2t, "text_recognition", text_recognition)
+    monkeypatch.setattr(v2t, "describe_image", describe_image)
+    monkeypatch.setattr(v2t, "summarize_with_deepseek", summarize)
+    monkeypatch.setattr(v2t, "SUMMARY_CACHE_FOLDER", cache / "summaries")
+
+    def run(**kwargs):
+        video = io.BytesIO(b"video")
+        video.type = "video/mp4"
+        gen = v2t.video2text(video, summary_mode="single", regenerate=True, **kwargs)
+        try:
+            while True:
+                next(gen)
+        except StopIteration as e:
+            return e.value
+    return runs, run
+
+
+def test_pipeline_reruns_only_affected_stages(pipeline, monkeypatch):
+    runs, run = pipeline
+
+    assert run() == "Zusammenfassung"
+    assert runs == ["audio", "transcript", "frames", "ocr", "captions"]
+
+    runs.clear()
+    run()
+    assert runs == []
+
+    monkeypatch.setattr(v2t, "OCR_MIN_CONFIDENCE", 80)
+    run()
+    assert runs == ["ocr"]
+
+    runs.clear()
+    run(caption_quality="high")
+    assert runs == ["captions"]
+
+    with open(next(Path("tmp").glob("*.txt"))) as f:
+        video_text = json.load(f)
+    assert video_text[0]["frames"][0]["text"] == "OCR 80"
+    assert video_text[0]["frames"][0]["description"] == "high"
+
+
+def test_pipeline_recomputes_deleted_files(pipeline):
+    runs, run = pipeline
+    run()
+    # The WAV file is deleted once it is transcribed
+    assert not list(artifact_cache.ARTIFACT_CACHE_FOLDER.glob("*.wav"))
+    for frame in artifact_cache.ARTIFACT_CACHE_FOLDER.glob("*.frames"):
+        frame.rmdir()
+    Path("frame_0000.jpg").unlink()
+
+    runs.clear()
+    run()
+    assert runs == ["frames"]
+
+
+def test_pipeline_degrades_to_meet_deadline(pipeline, monkeypatch):
+    runs, run = pipeline
+    monkeypatch.setattr(v2t, "probe_video", lambda path: {"info": media_info(3600.0), "static": False})
+    token = deadline.DeadlineToken(time.time() + 5)
+    assert run(token=token) == "Zusammenfassung"
+    assert token.degradations == list(deadline.DEGRADATION_LADDER)
+    assert runs == ["audio", "transcript", "frames", "ocr"]
+
+    # Without a deadline the full quality runs; the audio is extracted again since its WAV file was deleted
+    runs.clear()
+    run()
+    assert runs == ["audio", "transcript", "frames", "ocr", "captions"]
+
+
+def test_pipeline_stops_when_cancelled(pipeline, monkeypatch):
+    runs, run = pipeline
+    monkeypatch.setattr(deadline, "CANCEL_POLL_INTERVAL", 0.0)
+    with pytest.raises(deadline.Cancelled):
+        run(token=deadline.DeadlineToken(cancelled=lambda: len(runs) >= 2))
+    assert runs == ["audio", "transcript"]
+
+
+def test_pipeline_keys_match_stage_keys(pipeline):
+    runs, run = pipeline
+    run()
+    video_key = next(Path("tmp").glob("*.txt")).name[:-len(".txt")]
+    settings = {"frame_rate": v2t.FRAME_RATE, "whisper_model": v2t.WHISPER_MODEL, "caption_quality": "fast",
+                "captions": True}
+    assert all(artifact_cache.exists(key) for key in v2t.pipeline_keys(video_key, settings).values())
+
+
+def test_draft_uses_cheapest_settings_and_shares_audio(pipeline, monkeypatch):
+    runs, run = pipeline
+    models = []
+    transcribe = v2t.transcribe_audio
+    monkeypatch.setattr(v2t, "transcribe_audio", lambda wav_path, model, ranges: models.append(model) or transcribe(
+        wav_path, model, ranges))
+    # The full job waits in the queue while the draft runs, so the draft keeps the WAV file for it
+    queue = jobs.JobQueue()
+    full = queue.submit(f"tmp/{hashlib.sha3_256(b'video').hexdigest()}.video.mp4")
+
+    run(draft=True)
+    assert runs == ["audio", "transcript", "frames", "ocr"]
+    queue.claim(1)
+    runs.clear()
+    run()
+    assert runs == ["transcript", "frames", "ocr", "captions"]
+    assert models == [deadline.DEGRADED_WHISPER_MODEL, v2t.WHISPER_MODEL]
+    assert queue.get(full)["status"] == "running"
+    assert not list(artifact_cache.ARTIFACT_CACHE_FOLDER.glob("*.wav"))
+
+
+def test_pipeline_skips_audio_of_silent_video(pipeline, monkeypatch):
+    runs, run = pipeline
+    monkeypatch.setattr(v2t, "probe_video", lambda path: {"info": media_info(has_audio=False), "static": False})
+    run()
+    assert runs == ["frames", "ocr", "captions"]
+
+    with open(next(Path("tmp").glob("*.txt"))) as f:
+        video_text = json.load(f)
+    assert [(segment["start"], segment["end"], len(segment["frames"])) for segment in video_text] == [(0, 60.0, 1)]
+
+
+def test_pipeline_processes_time_ranges(pipeline, monkeypatch):
+    runs, run = pipeline
+    extracted = []
+    extract_audio = v2t.extract_audio
+    monkeypatch.setattr(v2t, "extract_audio", lambda path, wav_path, ranges: extracted.append(ranges) or
+                        extract_audio(path, wav_path, ranges))
+
+    run(ranges=[[10, 20], [0, 5]])
+    assert runs == ["audio", "transcript", "frames", "ocr", "captions"]
+    assert extracted == [[[0, 5], [10, 20]]]
+
+    runs.clear()
+    run()
+    assert runs == ["audio", "transcript", "frames", "ocr", "captions"]
+
+    # With the whole video processed, time ranges slice its artifacts
+    runs.clear()
+    run(ranges=[[0, 2]])
+    run(ranges=[[0, 60]])
+    assert runs == []
+    with open(next(Path("tmp").glob("*.txt"))) as f:
+        video_text = json.load(f)
+    assert [(segment["start"], segment["end"], len(segment["frames"])) for segment in video_text] == [(0, 3, 1)]
@@ -0,0 +1,41 @@
+import torch
+from transformers import Blip2Config, Blip2ForConditionalGeneration
+
+from NoKeeA.AI.caption_export import trace_caption_model, TracedVisionModel
+
+
+def tiny_blip2():
+    config = Blip2Config(
+        vision_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2,
+                       "num_attention_heads": 4, "image_size": 32, "patch_size": 8},
+        qformer_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2,
+                        "num_attention_heads": 4, "encoder_hidden_size": 32, "vocab_size": 100},
+        text_config={"model_type": "opt", "hidden_size": 32, "ffn_dim": 64, "num_hidden_layers": 2,
+                     "num_attention_heads": 4, "vocab_size": 100, "word_embed_proj_dim": 32,
+                     "max_position_embeddings": 64},
+        num_query_tokens=4,
+    )
+    torch.manual_seed(0)
+    return Blip2ForConditionalGeneration(config).eval()
+
+
+def test_traced_model_generates_same_caption():
+    model = tiny_blip2()
+    pixel_values = torch.rand(1, 3, 32, 32)
+    with torch.inference_mode():
+        expected = model.generate(pixel_values=pixel_values, max_length=10)
+
+    model, backend = trace_caption_model(model, pixel_values)
+    assert backend == "torchscript"
+    assert isinstance(model.vision_model, TracedVisionModel)
+    with torch.inference_mode():
+        actual = model.generate(pixel_values=torch.clone(pixel_values), max_length=10)
+    assert torch.equal(expected, actual)
+
+
+def test_trace_falls_back_to_eager():
+    model = tiny_blip2()
+    vision_model = model.vision_model
+    model, backend = trace_caption_model(model, torch.rand(1, 3, 7, 7))
+    assert backend == "eager"
+    assert model.vision_model is vision_model
@@ -0,0 +1,68 @@
+import os
+
+import cv2
+import pytest
+import torch
+
+from NoKeeA.AI import cpu_budget
+from NoKeeA.AI import video2text as v2t
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(cpu_budget, "CPU_THREADS", 8)
+    monkeypatch.setattr(cpu_budget, "job_slots", 1)
+    monkeypatch.setattr(cpu_budget, "enabled", True)
+    monkeypatch.setattr(cpu_budget, "allocations", {})
+    monkeypatch.setattr(cpu_budget, "current", cpu_budget.current)
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "")
+    threads, cv2_threads = torch.get_num_threads(), cv2.getNumThreads()
+    yield
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(cv2_threads)
+
+
+def test_allocate_shares_threads_between_jobs(budget):
+    assert cpu_budget.allocate("transcript") == {
+        "stage": "transcript", "threads": 8, "torch": 8, "opencv": 1, "workers": 1, "subprocess": 1}
+    assert cpu_budget.allocate("ocr", jobs=3)["workers"] == 2
+    assert cpu_budget.allocate("audio", jobs=16)["subprocess"] == 1
+    assert cpu_budget.allocate("matching")["threads"] == 8
+    with pytest.raises(ValueError):
+        cpu_budget.allocate("unknown")
+
+
+def test_use_applies_and_records_allocation(budget, monkeypatch):
+    monkeypatch.setattr(cpu_budget, "job_slots", 2)
+    cpu_budget.use("captions")
+    assert torch.get_num_threads() == 4
+    cpu_budget.use("ocr")
+    assert torch.get_num_threads() == 1
+    assert os.environ["OMP_THREAD_LIMIT"] == "1"
+    assert cpu_budget.current["workers"] == 4
+
+    report = cpu_budget.report()
+    assert (report["cpu_threads"], report["jobs"]) == (8, 2)
+    assert set(report["stages"]) == {"captions", "ocr"}
+
+
+def test_budget_is_not_applied_outside_workers(budget, monkeypatch):
+    monkeypatch.setattr(cpu_budget, "enabled", False)
+    threads = torch.get_num_threads()
+    assert cpu_budget.use("ocr") is cpu_budget.UNBUDGETED
+    assert torch.get_num_threads() == threads
+    assert os.environ["OMP_THREAD_LIMIT"] == ""
+    assert cpu_budget.report()["stages"] == {}
+
+
+def test_text_recognition_keeps_order_with_worker_pool(budget, monkeypatch):
+    monkeypatch.setattr(v2t, "recognize_text", lambda path, min_confidence: (f"Text {path}", []))
+    cpu_budget.use("ocr")
+    images = [{"path": f"frame_{i}.jpg", "frame_number": i} for i in range(20)]
+    gen = v2t.text_recognition(images)
+    try:
+        while True:
+            next(gen)
+    except StopIteration as e:
+        result = e.value
+    assert [image["text"] for image in result] == [f"Text frame_{i}.jpg" for i in range(20)]
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from NoKeeA.AI import deadline
+
+STAGES = ["audio", "transcript", "frames", "ocr", "captions", "matching", "summary"]
+
+
+def settings():
+    return {"frame_rate": 1, "whisper_model": "base", "caption_quality": "high", "captions": True}
+
+
+def test_project_runtime_follows_settings():
+    full = deadline.project_runtime(settings(), 3600, STAGES)
+    assert deadline.project_runtime({**settings(), "captions": False}, 3600, STAGES) < full
+    assert deadline.project_runtime({**settings(), "frame_rate": 0.2}, 3600, STAGES) < full
+    assert deadline.project_runtime(settings(), 3600, ["summary"]) == deadline.SUMMARY_SECONDS
+
+
+def test_degrade_follows_ladder_until_deadline_fits():
+    token = deadline.DeadlineToken()
+    current = settings()
+    assert token.degrade(current, 3600, lambda s: STAGES) == []
+
+    token = deadline.DeadlineToken(time.time() + 1)
+    assert token.degrade(current, 3600, lambda s: STAGES) == list(deadline.DEGRADATION_LADDER)
+    assert current == {"frame_rate": 0.2, "whisper_model": "tiny", "caption_quality": "high", "captions": False}
+
+    # Fewer frames suffice for a generous deadline
+    current = settings()
+    token = deadline.DeadlineToken(time.time() + deadline.project_runtime(settings(), 3600, STAGES) / 2)
+    assert token.degrade(current, 3600, lambda s: STAGES) == ["fewer_frames"]
+
+
+def test_degrade_skips_stages_that_already_ran():
+    token = deadline.DeadlineToken(time.time() + 1)
+    current = settings()
+    assert token.degrade(current, 3600, lambda s: ["captions", "matching", "summary"]) == ["skip_captions"]
+    assert current["whisper_model"] == "base"
+
+
+def test_check_polls_cancel_flag(monkeypatch):
+    calls = []
+
+    def cancelled():
+        calls.append(1)
+        return len(calls) > 1
+
+    token = deadline.DeadlineToken(cancelled=cancelled)
+    token.check()
+    token.check()
+    assert len(calls) == 1
+    monkeypatch.setattr(deadline, "CANCEL_POLL_INTERVAL", 0.0)
+    with pytest.raises(deadline.Cancelled):
+        token.check()
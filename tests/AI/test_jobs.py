@@ -0,0 +1,223 @@
+import threading
+import time
+
+import pytest
+
+from NoKeeA.AI import admission, jobs
+from NoKeeA.AI import video2text as v2t
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobs.JobQueue(tmp_path / "jobs.sqlite3")
+
+
+def test_jobs_are_claimed_in_order(queue):
+    first = queue.submit("tmp/a.video.mp4", {"caption_quality": "high"})
+    second = queue.submit("tmp/b.video.mp4")
+
+    assert [job["position"] for job in queue.get_many([second, first])] == [1, 0]
+    queue.heartbeat(1)
+    claimed = queue.claim(1)
+    assert claimed["id"] == first
+    assert claimed["status"] == "running"
+    assert claimed["params"] == {"caption_quality": "high"}
+    assert queue.get(second)["position"] == 0
+
+    queue.finish(first, "Zusammenfassung")
+    job = queue.get(first)
+    assert (job["status"], job["result"], job["progress"]) == ("done", "Zusammenfassung", 1.0)
+
+
+def test_jobs_of_dead_workers_are_queued_again(queue, monkeypatch):
+    job_id = queue.submit("tmp/a.video.mp4")
+    queue.heartbeat(1)
+    assert queue.claim(1)["id"] == job_id
+    assert queue.claim(2) is None
+
+    monkeypatch.setattr(jobs, "WORKER_TIMEOUT", 0.0)
+    time.sleep(0.01)
+    assert queue.claim(2)["id"] == job_id
+
+
+def test_jobs_crashing_every_worker_fail(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "WORKER_TIMEOUT", 0.0)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    job_id = queue.submit("tmp/a.video.mp4")
+    assert queue.claim(1)["attempts"] == 1
+    time.sleep(0.01)
+    assert queue.claim(2)["attempts"] == 2
+    time.sleep(0.01)
+    assert queue.claim(3) is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "2 Versuchen" in job["error"]
+    assert job["finished"] is not None
+
+
+def test_run_job_records_progress_and_result(queue, monkeypatch):
+    def process_video(path, token=None, **params):
+        assert params == {"stream": True}
+        yield "✅ Datei gespeichert"
+        yield 0.5
+        yield {"event": "section", "index": 0, "count": 1, "start": 0, "end": 5, "text": "Teil 1"}
+        yield {"event": "token", "text": "Hallo"}
+        return "Hallo"
+
+    monkeypatch.setattr(v2t, "process_video", process_video)
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 0.0)
+    queue.submit("tmp/a.video.mp4", {"stream": True})
+    job = queue.claim(1)
+    jobs.run_job(queue, job)
+
+    job = queue.get(job["id"])
+    assert job["status"] == "done"
+    assert job["messages"] == ["✅ Datei gespeichert"]
+    assert job["sections"]["0"]["text"] == "Teil 1"
+    assert job["partial"] == "Hallo"
+    assert job["result"] == "Hallo"
+    assert job["metrics"]["cpu"]["cpu_threads"] >= 1
+
+
+def test_run_job_records_errors(queue, monkeypatch):
+    def process_video(path, token=None, **params):
+        yield "✅ Datei gespeichert"
+        raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(v2t, "process_video", process_video)
+    queue.submit("tmp/a.video.mp4")
+    job = queue.claim(1)
+    jobs.run_job(queue, job)
+    assert queue.get(job["id"])["error"] == "RuntimeError: ffmpeg failed"
+
+
+def test_worker_runs_queued_jobs(queue, monkeypatch):
+    def process_video(path, token=None, **params):
+        yield "✅ Datei gespeichert"
+        return f"Zusammenfassung von {path}"
+
+    monkeypatch.setattr(v2t, "process_video", process_video)
+    monkeypatch.setattr(admission, "admit_job", lambda job, reserved: {
+        "admitted": True, "rejected": False, "reason": None, "bytes": 0, "components": {}})
+    job_ids = [queue.submit(f"tmp/{name}.video.mp4") for name in ("a", "b")]
+    stop = threading.Event()
+    worker = threading.Thread(target=jobs.work, args=(queue.path, 0.05, stop))
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and any(job["status"] != "done" for job in queue.get_many(job_ids)):
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert [job["result"] for job in queue.get_many(job_ids)] == [
+        "Zusammenfassung von tmp/a.video.mp4", "Zusammenfassung von tmp/b.video.mp4"]
+    assert queue.live_workers() == 0
+
+
+def test_ensure_workers_starts_only_missing_workers(queue):
+    assert queue.ensure_workers(2, command=["true"]) == 2
+    assert queue.ensure_workers(2, command=["true"]) == 0
+    assert queue.live_workers() == 2
+
+
+def test_cancel_jobs(queue, monkeypatch):
+    queued = queue.submit("tmp/a.video.mp4")
+    queue.cancel(queued)
+    assert queue.get(queued)["status"] == "cancelled"
+
+    running = queue.submit("tmp/b.video.mp4", {"deadline": 300})
+    job = queue.claim(1)
+    queue.cancel(running)
+    assert queue.get(running)["status"] == "running"
+    assert queue.cancel_requested(running)
+
+    def process_video(path, token=None, **params):
+        assert token.deadline == job["created"] + 300
+        while True:
+            token.check()
+            yield 0.5
+
+    monkeypatch.setattr(v2t, "process_video", process_video)
+    jobs.run_job(queue, job)
+    assert queue.get(running)["status"] == "cancelled"
+
+
+def test_cancelled_jobs_of_dead_workers_are_not_queued_again(queue, monkeypatch):
+    job_id = queue.submit("tmp/a.video.mp4")
+    queue.claim(1)
+    queue.cancel(job_id)
+    monkeypatch.setattr(jobs, "WORKER_TIMEOUT", 0.0)
+    time.sleep(0.01)
+    assert queue.claim(2) is None
+    job = queue.get(job_id)
+    assert job["status"] == "cancelled"
+    assert job["status"] in jobs.JOB_STATUSES
+    assert job["finished"] is not None
+
+
+def test_admission_runs_outside_the_write_transaction(queue):
+    job_id = queue.submit("tmp/a.video.mp4")
+    other = jobs.JobQueue(queue.path)
+
+    def admit(job, reserved):
+        # Another session can write while the video is probed
+        other.submit("tmp/b.video.mp4")
+        return {"admitted": True, "rejected": False, "reason": None, "bytes": 0, "components": {}}
+
+    queue.heartbeat(1)
+    assert queue.claim(1, admit)["id"] == job_id
+
+
+def test_jobs_failing_admission_do_not_block_the_queue(queue, monkeypatch):
+    def admit(job, reserved):
+        if job["video_path"] == "tmp/a.video.mp4":
+            raise RuntimeError("ffprobe crashed")
+        return admission.decide(0, reserved, available=1, total=1)
+
+    monkeypatch.setattr(admission, "admit_job", admit)
+    broken = queue.submit("tmp/a.video.mp4")
+    next_job = queue.submit("tmp/b.video.mp4")
+    stop = threading.Event()
+    worker = threading.Thread(target=jobs.work, args=(queue.path, 0.01, stop))
+    monkeypatch.setattr(jobs, "run_job", lambda queue, job: queue.finish(job["id"], "Zusammenfassung"))
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and queue.get(next_job)["status"] != "done":
+            time.sleep(0.01)
+        assert worker.is_alive()
+    finally:
+        stop.set()
+        worker.join()
+    job = queue.get(broken)
+    assert (job["status"], job["error"]) == ("failed", "RuntimeError: ffprobe crashed")
+    assert queue.get(next_job)["status"] == "done"
+
+
+def test_idle_workers_do_not_share_the_cpu_budget(queue, monkeypatch):
+    from NoKeeA.AI import cpu_budget
+
+    monkeypatch.setattr(cpu_budget, "job_slots", 1)
+    slots = []
+
+    def run_job(queue, job):
+        slots.append(cpu_budget.job_slots)
+        queue.finish(job["id"], "Zusammenfassung")
+
+    monkeypatch.setattr(jobs, "run_job", run_job)
+    monkeypatch.setattr(admission, "admit_job", None)
+    for worker in (11, 12, 13):
+        queue.heartbeat(worker)
+    job_id = queue.submit("tmp/a.video.mp4")
+    stop = threading.Event()
+    worker = threading.Thread(target=jobs.work, args=(queue.path, 0.01, stop))
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and queue.get(job_id)["status"] != "done":
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        worker.join()
+    assert slots == [1]
@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+import pytest
+import torch
+
+from NoKeeA.AI import memory
+from NoKeeA.AI import video2text as v2t
+from tests.AI.language_models import CharTokenizer
+
+GIB = 1024 ** 3
+
+
+def test_parse_memory_size():
+    assert memory.parse_memory_size("12GiB") == 12 * GIB
+    assert memory.parse_memory_size("500 MB") == 500 * 1000 ** 2
+    assert memory.parse_memory_size(1024) == 1024
+    with pytest.raises(ValueError):
+        memory.parse_memory_size("viel")
+
+
+def test_plan_keeps_small_model_in_memory():
+    plan = memory.plan_llm_memory(2 * GIB, "bf16", available_memory=16 * GIB)
+    assert plan["weights_bytes"] == 4 * GIB
+    assert plan["resident_bytes"] == 4 * GIB
+    assert plan["offload_bytes"] == 0
+
+
+def test_plan_offloads_what_exceeds_the_limit():
+    plan = memory.plan_llm_memory(8 * GIB, "bf16", max_memory="10GiB", available_memory=64 * GIB,
+                                  free_disk=100 * GIB)
+    assert plan["max_memory"] == 8 * GIB
+    assert plan["resident_bytes"] == 8 * GIB
+    assert plan["offload_bytes"] == 8 * GIB
+
+
+def test_plan_refuses_when_nothing_fits():
+    with pytest.raises(MemoryError, match="disk"):
+        memory.plan_llm_memory(8 * GIB, "fp32", max_memory="10GiB", available_memory=64 * GIB,
+                               free_disk=GIB)
+    with pytest.raises(MemoryError, match="RAM"):
+        memory.plan_llm_memory(8 * GIB, "bf16", available_memory=GIB, free_disk=100 * GIB)
+    with pytest.raises(MemoryError, match="bf16"):
+        memory.plan_llm_memory(8 * GIB, "int8", max_memory="10GiB", available_memory=64 * GIB)
+
+
+def test_quantize_linear_layers_keeps_greedy_output(tiny_llama):
+    model = tiny_llama()
+    inputs = CharTokenizer()("Fasse zusammen")
+    with torch.inference_mode():
+        expected = model.generate(**inputs, max_new_tokens=5, do_sample=False)
+
+    model = model.to(torch.bfloat16)
+    assert memory.quantize_linear_layers(model) == 15
+    assert not any(type(module) is torch.nn.Linear for module in model.modules())
+    with torch.inference_mode():
+        actual = model.generate(**inputs, max_new_tokens=5, do_sample=False)
+    assert torch.equal(expected, actual)
+
+
+@pytest.fixture
+def cpu_loading(monkeypatch, tmp_path):
+    from_pretrained = MagicMock()
+    monkeypatch.setattr(v2t, "snapshot_download", MagicMock())
+    monkeypatch.setattr(v2t.torch.cuda, "is_available", lambda: False)
+    monkeypatch.setattr(v2t, "base_folder", tmp_path)
+    monkeypatch.setattr(v2t, "deepseek_model", None)
+    monkeypatch.setattr(v2t, "deepseek_tokenizer", None)
+    monkeypatch.setattr(v2t.AutoTokenizer, "from_pretrained", MagicMock())
+    monkeypatch.setattr(v2t.AutoModelForCausalLM, "from_pretrained", from_pretrained)
+    monkeypatch.setattr(memory, "checkpoint_parameters", lambda local_dir: 16 * GIB)
+    monkeypatch.setattr(memory.psutil, "virtual_memory", lambda: MagicMock(available=64 * GIB))
+    return from_pretrained
+
+
+def test_load_summarizer_model_offloads(cpu_loading, monkeypatch):
+    monkeypatch.setattr(v2t, "LLM_PRECISION", "bf16")
+    monkeypatch.setattr(v2t, "LLM_MAX_MEMORY", "20GiB")
+    monkeypatch.setattr(v2t.shutil, "disk_usage", lambda path: MagicMock(free=100 * GIB))
+
+    assert "ausgelagert" in v2t.load_summarizer_model()
+    kwargs = cpu_loading.call_args.kwargs
+    assert kwargs["torch_dtype"] == torch.bfloat16
+    assert kwargs["max_memory"] == {"cpu": 18 * GIB}
+    assert kwargs["offload_folder"].endswith("deepseek_offload")
+    assert v2t.deepseek_memory_plan["offload_bytes"] == 14 * GIB
+
+
+def test_load_summarizer_model_refuses_before_loading(cpu_loading, monkeypatch):
+    monkeypatch.setattr(v2t, "LLM_PRECISION", "fp32")
+    monkeypatch.setattr(v2t, "LLM_MAX_MEMORY", "20GiB")
+    monkeypatch.setattr(v2t.shutil, "disk_usage", lambda path: MagicMock(free=GIB))
+
+    with pytest.raises(MemoryError):
+        v2t.load_summarizer_model()
+    cpu_loading.assert_not_called()
+    assert v2t.deepseek_model is None
@@ -0,0 +1,96 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from NoKeeA.AI.model_server import ModelServer, ModelClient, ModelServerError, DynamicBatcher, get_client
+from NoKeeA.AI.video2text import text_recognition
+
+
+def test_batcher_groups_concurrent_requests():
+    batches = []
+
+    def handler(payloads):
+        batches.append(list(payloads))
+        return [payload * 2 for payload in payloads]
+
+    batcher = DynamicBatcher(handler, max_batch_size=4, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(6)]
+    assert [future.result() for future in futures] == [0, 2, 4, 6, 8, 10]
+    batcher.close()
+    assert [len(batch) for batch in batches] == [4, 2]
+
+
+def test_server_batches_requests_of_concurrent_clients(tmp_path):
+    def caption(payloads):
+        time.sleep(0.01)
+        return [f"caption of {payload['path']}" for payload in payloads]
+
+    def broken(payloads):
+        raise RuntimeError("model not available")
+
+    socket_path = tmp_path / "models.sock"
+    with ModelServer(socket_path, {"caption": caption, "generate": broken}, max_wait=0.2) as server:
+        results = {}
+
+        def job(name):
+            client = ModelClient(socket_path)
+            results[name] = list(client.map(
+                "caption", [{"path": f"{name}_{i}.jpg"} for i in range(3)]))
+
+        threads = [threading.Thread(target=job, args=(name,))
+                   for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results["a"] == [f"caption of a_{i}.jpg" for i in range(3)]
+        assert results["b"] == [f"caption of b_{i}.jpg" for i in range(3)]
+        assert max(server.batchers["caption"].batch_sizes) > 1
+
+        client = ModelClient(socket_path)
+        with pytest.raises(ModelServerError, match="model not available"):
+            client.request("generate", {"prompt": "Hallo"})
+        with pytest.raises(ModelServerError, match="Unknown request kind"):
+            client.request("unknown", {})
+        client.close()
+
+    assert not Path(socket_path).exists()
+
+
+def test_text_recognition_uses_model_server(tmp_path, monkeypatch):
+    def ocr(payloads):
+        return [{"text": f"Text {payload['path']}", "words": []} for payload in payloads]
+
+    socket_path = tmp_path / "models.sock"
+    monkeypatch.setenv("MODEL_SERVER_SOCKET", str(socket_path))
+    with ModelServer(socket_path, {"ocr": ocr}):
+        gen = text_recognition([{"path": "a.jpg"}, {"path": "b.jpg"}])
+        steps = []
+        try:
+            while True:
+                steps.append(next(gen))
+        except StopIteration as e:
+            result = e.value
+
+    assert steps == [0.5, 1.0, "✅ Text aus Frames extrahiert"]
+    assert [frame["text"] for frame in result] == ["Text a.jpg", "Text b.jpg"]
+
+
+def test_get_client_reuses_the_connection(tmp_path, monkeypatch):
+    socket_path = tmp_path / "models.sock"
+    monkeypatch.setenv("MODEL_SERVER_SOCKET", str(socket_path))
+    with ModelServer(socket_path, {"echo": lambda payloads: payloads}):
+        client = get_client()
+        assert client.request("echo", {"a": 1}) == {"a": 1}
+        connection = client._local.socket
+
+        assert get_client() is client
+        assert get_client().request("echo", {"b": 2}) == {"b": 2}
+        assert client._local.socket is connection
+        client.close()
+
+    monkeypatch.setenv("MODEL_SERVER_SOCKET", str(tmp_path / "other.sock"))
+    assert get_client() is not client
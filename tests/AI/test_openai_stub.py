@@ -0,0 +1,40 @@
+import openai
+import pytest
+
+from NoKeeA.AI import video2text as v2t
+from NoKeeA.AI.openai_stub import OpenAIStub
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    monkeypatch.setattr(v2t, "openai_client", None)
+    monkeypatch.setattr(v2t, "OPENAI_BACKOFF", 0.01)
+
+
+def test_use_openai_retries_against_stub(monkeypatch):
+    with OpenAIStub(fail_first=2) as stub:
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        answer = v2t.use_openai("test-key", "Bitte fasse das Video zusammen")
+        assert answer == "Zusammenfassung: Bitte fasse das Video zusammen"
+        assert stub.request_count == 3
+
+        client = v2t.openai_client
+        v2t.use_openai("test-key", "Noch einmal")
+        assert v2t.openai_client is client
+
+
+def test_stream_openai_against_stub(monkeypatch):
+    with OpenAIStub() as stub:
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        pieces = list(v2t.stream_openai("test-key", "eins zwei drei"))
+    assert len(pieces) == 4
+    assert "".join(pieces) == "Zusammenfassung: eins zwei drei"
+
+
+def test_use_openai_gives_up_after_retries(monkeypatch):
+    monkeypatch.setattr(v2t, "OPENAI_MAX_RETRIES", 1)
+    with OpenAIStub(failure_rate=1.0) as stub:
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        with pytest.raises(openai.InternalServerError):
+            v2t.use_openai("test-key", "Prompt")
+        assert stub.request_count == 2
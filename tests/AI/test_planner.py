@@ -0,0 +1,115 @@
+import subprocess
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from NoKeeA.AI import planner
+from NoKeeA.AI import video2text as v2t
+
+ASSETS_DIR = Path(__file__).parent.parent / "assets"
+
+FFPROBE_OUTPUT = {
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "avg_frame_rate": "30000/1001", "r_frame_rate": "30000/1001", "nb_frames": "1798"},
+        {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+    ],
+    "format": {"duration": "60.0"},
+}
+
+
+def write_video(path, fps, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (64, 48))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def test_parse_ffprobe():
+    info = planner.parse_ffprobe(FFPROBE_OUTPUT)
+    assert info["fps"] == pytest.approx(29.97, abs=0.01)
+    assert (info["has_video"], info["has_audio"]) == (True, False)
+    assert (info["video_codec"], info["audio_codec"]) == ("h264", None)
+    assert (info["width"], info["height"], info["frame_count"], info["duration"]) == (1920, 1080, 1798, 60.0)
+
+
+def test_probe_falls_back_to_opencv(monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("ffprobe")
+
+    monkeypatch.setattr(subprocess, "run", missing)
+    info = planner.probe_video(str(ASSETS_DIR / "test_video.mp4"))
+    assert info["source"] == "opencv"
+    assert info["has_video"] and info["has_audio"] is None
+    assert info["duration"] > 0 and info["width"] > 0
+
+
+def test_is_static_video(tmp_path):
+    still = np.full((48, 64, 3), 128, np.uint8)
+    static = write_video(tmp_path / "static.mp4", 10, [still] * 30)
+    moving = write_video(tmp_path / "moving.mp4", 10, [np.full((48, 64, 3), i * 8, np.uint8) for i in range(30)])
+    assert planner.is_static_video(static, planner.probe_with_opencv(static), v2t.FRAME_DIFFERENCE_THRESHOLD)
+    assert not planner.is_static_video(moving, planner.probe_with_opencv(moving), v2t.FRAME_DIFFERENCE_THRESHOLD)
+
+
+def test_plan_pipeline():
+    settings = {"frame_rate": 1, "whisper_model": "base", "caption_quality": "fast", "captions": True}
+    info = planner.parse_ffprobe(FFPROBE_OUTPUT)
+
+    plan = planner.plan_pipeline(info, settings)
+    assert (plan["audio"], plan["video"], plan["frame_rate"]) == (False, True, 1)
+    assert plan["skipped"] == ["keine Tonspur"]
+    assert plan["estimated_seconds"] > 0
+
+    plan = planner.plan_pipeline(info, settings, static=True)
+    assert plan["frame_rate"] == pytest.approx(1 / 60)
+    assert "keine Tonspur" in planner.describe_plan(info, plan)
+
+    slow = {**info, "fps": 0.5, "has_audio": None}
+    plan = planner.plan_pipeline(slow, settings)
+    assert (plan["audio"], plan["frame_rate"]) == (True, 0.5)
+
+
+def test_extract_frames_with_fractional_frame_rate(tmp_path):
+    frames = [np.full((48, 64, 3), (i // 15) * 60 % 256, np.uint8) for i in range(75)]
+    path = write_video(tmp_path / "video.mp4", 14.985, frames)
+    gen = v2t.extract_frames_convert2text(path, 0.5, frames_folder=str(tmp_path / "frames"))
+    try:
+        while True:
+            next(gen)
+    except StopIteration as e:
+        result = e.value
+    # Samples at 0 s, 2 s and 4 s of a five second video
+    assert [frame["timestamp"] for frame in result] == pytest.approx([0, 2, 4], abs=0.1)
+
+
+def test_parse_and_normalize_ranges():
+    assert planner.parse_ranges("1:00-5:30, 10:00 - 12:00,") == [[60, 330], [600, 720]]
+    with pytest.raises(ValueError):
+        planner.parse_ranges("1:00")
+    with pytest.raises(ValueError):
+        planner.parse_ranges("1::00-2:00")
+
+    assert planner.normalize_ranges([[50, 70], [-5, 10], [5, 20]], 60) == [[0, 20], [50, 60]]
+    assert planner.normalize_ranges([[0, 30], [30, 90]], 60) is None
+    assert planner.normalize_ranges(None, 60) is None
+    with pytest.raises(ValueError):
+        planner.normalize_ranges([[70, 80]], 60)
+    assert planner.ranges_duration([[0, 20], [50, 60]], 60) == 30
+
+
+def test_extract_frames_of_time_ranges(tmp_path):
+    frames = [np.full((48, 64, 3), i * 20 % 256, np.uint8) for i in range(100)]
+    path = write_video(tmp_path / "video.mp4", 10, frames)
+    gen = v2t.extract_frames_convert2text(path, 1, frames_folder=str(tmp_path / "frames"),
+                                          ranges=[[1.5, 3], [7, 8.5]])
+    try:
+        while True:
+            next(gen)
+    except StopIteration as e:
+        result = e.value
+    assert [frame["timestamp"] for frame in result] == pytest.approx([1.5, 2.5, 7, 8], abs=0.01)
+    assert [frame["frame_number"] for frame in result] == [0, 1, 2, 3]
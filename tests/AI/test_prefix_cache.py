@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+from NoKeeA.AI import video2text as v2t
+from tests.AI.language_models import CharTokenizer
+
+
+@pytest.fixture
+def tiny_model(monkeypatch, tiny_llama):
+    model = tiny_llama()
+    monkeypatch.setattr(v2t, "deepseek_model", model)
+    monkeypatch.setattr(v2t, "deepseek_tokenizer", CharTokenizer())
+    monkeypatch.setattr(v2t, "deepseek_prefix_caches", {})
+    monkeypatch.setattr(v2t, "prefix_cache_stats", {
+                        "hits": 0, "misses": 0, "saved_seconds": 0.0})
+    return model
+
+
+def test_prefix_cache_gives_same_output(tiny_model):
+    prompt = v2t.PROMPT_PREAMBLE + "Spoken text: Hallo und willkommen"
+    full = CharTokenizer()(prompt)
+    with torch.inference_mode():
+        expected = tiny_model.generate(**full, max_new_tokens=8, do_sample=False)
+
+    for _ in range(2):
+        inputs = v2t.deepseek_inputs(prompt)
+        assert "past_key_values" in inputs
+        with torch.inference_mode():
+            actual = tiny_model.generate(**inputs, max_new_tokens=8, do_sample=False)
+        assert torch.equal(expected, actual)
+
+    assert len(v2t.deepseek_prefix_caches) == 1
+    assert v2t.prefix_cache_stats["hits"] == 2
+    assert v2t.prefix_cache_stats["saved_seconds"] > 0
+
+
+def test_prompt_without_preamble_is_not_cached(tiny_model):
+    inputs = v2t.deepseek_inputs("Etwas ganz anderes")
+    assert "past_key_values" not in inputs
+    assert v2t.prefix_cache_stats["misses"] == 1
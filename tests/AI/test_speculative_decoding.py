@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+import torch
+
+from NoKeeA.AI import video2text as v2t
+from tests.AI.language_models import CharTokenizer
+
+
+@pytest.fixture
+def models(monkeypatch, tiny_llama):
+    model = tiny_llama(seed=0, layers=2)
+    draft = tiny_llama(seed=0, layers=1)
+    monkeypatch.setattr(v2t, "deepseek_model", model)
+    monkeypatch.setattr(v2t, "deepseek_tokenizer", CharTokenizer())
+    monkeypatch.setattr(v2t, "draft_model", draft)
+    monkeypatch.setattr(v2t, "draft_tokenizer", CharTokenizer())
+    monkeypatch.setattr(v2t, "draft_same_vocabulary", True)
+    monkeypatch.setattr(v2t, "speculative_stats", {
+                        "proposed": 0, "accepted": 0, "new_tokens": 0, "seconds": 0.0})
+    return model, draft
+
+
+def test_assisted_decoding_keeps_greedy_output(models):
+    model, draft = models
+    inputs = CharTokenizer()("Fasse dieses Video zusammen")
+    with torch.inference_mode():
+        expected = model.generate(**inputs, max_new_tokens=12, do_sample=False)
+        before = dict(v2t.speculative_stats)
+        actual = v2t.deepseek_generate(**inputs, max_new_tokens=12, do_sample=False)
+
+    assert torch.equal(expected, actual)
+    stats = v2t.speculative_stats
+    assert stats["new_tokens"] == 12
+    assert stats["proposed"] > 0
+    assert 0 <= stats["accepted"] <= stats["proposed"]
+    assert v2t.speculative_report(before).startswith("✅ Entwurfsmodell:")
+
+
+def test_without_draft_model_nothing_is_reported(models, monkeypatch):
+    monkeypatch.setattr(v2t, "draft_model", None)
+    before = dict(v2t.speculative_stats)
+    with torch.inference_mode():
+        v2t.deepseek_generate(**CharTokenizer()("Hallo"), max_new_tokens=3, do_sample=False)
+    assert v2t.speculative_report(before) is None
+
+
+def test_concurrent_generations_count_their_own_proposals(models):
+    model, draft = models
+    inputs = CharTokenizer()("Fasse dieses Video zusammen")
+    with torch.inference_mode():
+        expected = model.generate(**inputs, max_new_tokens=12, do_sample=False)
+    outputs = []
+
+    def generate():
+        with torch.inference_mode():
+            outputs.append(v2t.deepseek_generate(**inputs, max_new_tokens=12, do_sample=False))
+
+    threads = [threading.Thread(target=generate) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(torch.equal(expected, output) for output in outputs)
+    stats = v2t.speculative_stats
+    assert stats["new_tokens"] == 24
+    assert stats["proposed"] > 0
+    assert 0 <= stats["accepted"] <= stats["proposed"]
+
+
+def test_acceptance_rate_needs_a_shared_vocabulary(models, monkeypatch):
+    monkeypatch.setattr(v2t, "draft_same_vocabulary", False)
+    before = dict(v2t.speculative_stats)
+    v2t.speculative_stats.update(new_tokens=10, seconds=2.0)
+    assert v2t.speculative_report(before) == "✅ Entwurfsmodell: 5.0 Tokens/s"
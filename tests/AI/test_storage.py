@@ -0,0 +1,62 @@
+import pytest
+
+from NoKeeA.AI import jobs, storage
+
+
+@pytest.fixture
+def tmp(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "STORAGE_DATABASE", tmp_path / "storage.sqlite3")
+    monkeypatch.setattr(jobs, "JOBS_DATABASE", tmp_path / "jobs.sqlite3")
+    return tmp_path
+
+
+def write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_enforce_evicts_least_recently_used_videos(tmp):
+    storage.track("a.video.mp4", write(tmp / "a.video.mp4", 100), write(tmp / "a.frames" / "frame_0000.jpg", 50).parent)
+    storage.track("b.video.mp4", write(tmp / "b.video.mp4", 100))
+    storage.track("c.video.mp4", write(tmp / "c.video.mp4", 100))
+    # Using a video again makes it the most recently used
+    storage.track("a.video.mp4", tmp / "a.video.mp4")
+    assert storage.usage() == {"bytes": 350, "budget": storage.TMP_BUDGET, "videos": 3, "pinned": 0}
+
+    with storage.pinned("b.video.mp4"):
+        assert storage.usage()["pinned"] == 1
+        assert storage.enforce(250) == ["c.video.mp4"]
+        assert storage.enforce(100) == ["a.video.mp4"]
+    assert not (tmp / "a.frames").exists() and not (tmp / "c.video.mp4").exists()
+    assert (tmp / "b.video.mp4").exists()
+    assert storage.usage()["bytes"] == 100
+    assert storage.enforce(100) == []
+
+
+def test_videos_of_queued_jobs_are_not_evicted(tmp):
+    storage.track("a.video.mp4", write(tmp / "a.video.mp4", 100))
+    queue = jobs.JobQueue()
+    job_id = queue.submit("tmp/a.video.mp4")
+    assert storage.enforce(0) == []
+
+    queue.cancel(job_id)
+    assert storage.enforce(0) == ["a.video.mp4"]
+
+
+def test_release_keeps_files_other_processes_may_read(tmp):
+    wav = write(tmp / "audio.wav", 100)
+    storage.track("a.video.mp4", wav)
+    with storage.pinned("a.video.mp4"), storage.pinned("a.video.mp4"):
+        assert not storage.release("a.video.mp4", wav)
+    with storage.pinned("a.video.mp4"):
+        assert storage.release("a.video.mp4", wav)
+    assert not wav.exists()
+    assert storage.usage()["bytes"] == 0
+
+
+def test_pins_of_dead_processes_expire(tmp, monkeypatch):
+    storage.track("a.video.mp4", write(tmp / "a.video.mp4", 100))
+    with storage.pinned("a.video.mp4"):
+        monkeypatch.setattr(storage, "_alive", lambda pid: False)
+        assert storage.enforce(0) == ["a.video.mp4"]
@@ -1,11 +1,15 @@
+import io
 import numbers
 import os
 import hashlib
 import shutil
 import json
+import time
 from pathlib import Path
 from types import GeneratorType
 
+import cv2
+import numpy as np
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -14,8 +18,11 @@ from NoKeeA.AI.video2text import (
     extract_audio_convert2text,
     extract_frames_convert2text,
     text_recognition,
+    rebuild_ocr_text,
     describe_image,
     build_prompt,
+    build_prompt_with_stats,
+    PROMPT_PREAMBLE,
     video2text,
 )
 
@@ -27,6 +34,12 @@ ASSETS_DIR = Path("tests/assets")
 TMP_DIR = Path("tmp")
 
 
+@pytest.fixture(autouse=True)
+def fresh_openai_client(monkeypatch):
+    import NoKeeA.AI.video2text as v2t
+    monkeypatch.setattr(v2t, "openai_client", None)
+
+
 @pytest.fixture(scope="module", autouse=True)
 def clean_tmp():
     if TMP_DIR.exists():
@@ -36,17 +49,15 @@ def clean_tmp():
     shutil.rmtree(TMP_DIR)
 
 
-def test_save_video():
-    class DummyVideo:
-        def __init__(self, path):
-            self._data = Path(path).read_bytes()
-            self.type = "video/mp4"
-
-        def read(self): return self._data
+class DummyVideo(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.type = "video/mp4"
 
-        def getbuffer(self): return self._data
 
-    dummy_video = DummyVideo(ASSETS_DIR / "test_video.mp4")
+def test_save_video():
+    data = (ASSETS_DIR / "test_video.mp4").read_bytes()
+    dummy_video = DummyVideo(data)
     gen = save_video(dummy_video)
     assert isinstance(gen, GeneratorType)
     msg = next(gen)
@@ -56,10 +67,53 @@ def test_save_video():
     except StopIteration as e:
         path = e.value
     assert os.path.isfile(path)
-    expected_hash = hashlib.sha3_256(dummy_video.read()).hexdigest()
+    expected_hash = hashlib.sha3_256(data).hexdigest()
     assert expected_hash in path
 
 
+def test_save_video_in_chunks(monkeypatch, tmp_path):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(v2t, "SAVE_CHUNK_BYTES", 4)
+    monkeypatch.setattr(v2t, "VIDEO_HASH", "blake2b")
+    data = b"0123456789"
+    assert list(save_video(DummyVideo(data))) == ["✅ Datei gespeichert"]
+    path = next(Path("tmp").glob("*.mp4"))
+    assert path.name == f"{hashlib.blake2b(data, digest_size=32).hexdigest()}.video.mp4"
+    assert path.read_bytes() == data
+
+    # An existing video is not written again
+    mtime = path.stat().st_mtime_ns
+    assert list(save_video(DummyVideo(data))) == ["⏭️ Datei bereits gespeichert"]
+    assert path.stat().st_mtime_ns == mtime
+
+    # Non-seekable streams are hashed while they are written
+    stream = MagicMock(type="video/mp4", read=DummyVideo(b"abcdefghij").read, seekable=lambda: False)
+    assert list(save_video(stream)) == ["✅ Datei gespeichert"]
+    assert (Path("tmp") / f"{hashlib.blake2b(b'abcdefghij', digest_size=32).hexdigest()}.video.mp4").is_file()
+    assert not list(Path("tmp").glob("*.tmp"))
+
+
+def test_save_video_removes_partial_upload(monkeypatch, tmp_path):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(v2t, "SAVE_CHUNK_BYTES", 4)
+    chunks = iter([b"0123", OSError("connection reset")])
+
+    def read(size):
+        chunk = next(chunks)
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    stream = MagicMock(type="video/mp4", read=read, seekable=lambda: False)
+    with pytest.raises(OSError, match="connection reset"):
+        list(save_video(stream))
+    assert not list(Path("tmp").iterdir())
+
+
 def test_extract_audio_convert2text():
     video_path = TMP_DIR / os.listdir(TMP_DIR)[0]  # saved mp4
     gen = extract_audio_convert2text(str(video_path))
@@ -73,6 +127,28 @@ def test_extract_audio_convert2text():
     assert "segments" in result
 
 
+def test_time_ranges_of_audio(monkeypatch):
+    import NoKeeA.AI.video2text as v2t
+    commands = []
+    monkeypatch.setattr(v2t.subprocess, "run", lambda command, **kwargs: commands.append(command) or MagicMock(
+        returncode=0))
+    list(v2t.extract_audio("video.mp4", "audio.wav", [[10, 20], [30, 35]]))
+    assert commands[0][3:11] == ["-ss", "10", "-t", "10", "-i", "video.mp4", "-ss", "30"]
+    assert "[0:a][1:a]concat=n=2:v=0:a=1[a]" in commands[0]
+
+    # Times in the concatenated audio map back to the video
+    model = MagicMock()
+    model.transcribe.return_value = {"segments": [{"start": 2, "end": 10, "text": "a"},
+                                                  {"start": 10, "end": 14, "text": "b"}]}
+    monkeypatch.setattr(v2t.model_server, "get_client", lambda: None)
+    monkeypatch.setattr(v2t, "load_transcription_model", lambda name: model)
+    gen = v2t.transcribe_audio("audio.wav", "tiny", [[10, 20], [30, 35]])
+    next(gen)
+    with pytest.raises(StopIteration) as e:
+        next(gen)
+    assert [(s["start"], s["end"]) for s in e.value.value["segments"]] == [(12, 20), (30, 34)]
+
+
 def test_extract_frames_convert2text():
     video_path = TMP_DIR / os.listdir(TMP_DIR)[0]
     gen = extract_frames_convert2text(str(video_path))
@@ -91,6 +167,46 @@ def test_extract_frames_convert2text():
     assert all(f in extracted_files for f in ["frame_0000.jpg"])
 
 
+class KeyframeCapture:
+    """VideoCapture of a 10 fps video with a keyframe every 50 frames, seeking lands on the keyframe before."""
+
+    def __init__(self, path):
+        self.position = 0
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: 10.0, cv2.CAP_PROP_FRAME_COUNT: 1000,
+                cv2.CAP_PROP_POS_FRAMES: self.position}[prop]
+
+    def set(self, prop, value):
+        self.position = value // 50 * 50
+
+    def grab(self):
+        self.position += 1
+        return self.position <= 1000
+
+    def retrieve(self):
+        return True, np.full((4, 4, 3), self.position % 256, dtype=np.uint8)
+
+    def release(self):
+        pass
+
+
+def test_extract_frames_of_ranges_uses_decoder_position(monkeypatch, tmp_path):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.setattr(v2t.cv2, "VideoCapture", KeyframeCapture)
+    written = []
+    monkeypatch.setattr(v2t.cv2, "imwrite", lambda path, frame: written.append(int(frame[0, 0, 0])))
+    gen = v2t.extract_frames_convert2text("video.mp4", frame_rate=1, threshold=-1, frames_folder=str(tmp_path),
+                                          ranges=[[12, 15]])
+    with pytest.raises(StopIteration) as e:
+        while True:
+            next(gen)
+    assert [frame["timestamp"] for frame in e.value.value] == [12, 13, 14, 15]
+    # The saved images are the frames at these times, frame n shows the value n + 1
+    assert written == [121, 131, 141, 151]
+
+
 def test_text_recognition_known_image():
     test_image = ASSETS_DIR / "text_frame.png"
     data = [{"path": str(test_image), "frame_number": 0}]
@@ -111,6 +227,25 @@ def test_text_recognition_known_image():
     assert "Noisy,image\nto test\nTesseract OCR" in result[0]["text"]
 
 
+def test_rebuild_ocr_text_filters_and_orders():
+    data = {
+        "text": ["", "world", "Hello", "%$&", "second", "line", "next"],
+        "conf": [-1, 91, 95, 12.5, 88, 90, 80],
+        "left": [0, 60, 0, 120, 0, 70, 0],
+        "top": [0, 0, 0, 0, 20, 20, 60],
+        "width": [0, 50, 50, 10, 60, 40, 40],
+        "height": [0, 10, 10, 10, 10, 10, 10],
+        "block_num": [1, 1, 1, 1, 1, 1, 2],
+        "par_num": [1, 1, 1, 1, 1, 1, 1],
+        "line_num": [1, 1, 1, 1, 2, 2, 1],
+    }
+    text, words = rebuild_ocr_text(data, min_confidence=60)
+    assert text == "Hello world\nsecond line\n\nnext"
+    assert [w["text"] for w in words] == [
+        "world", "Hello", "second", "line", "next"]
+    assert all(w["conf"] >= 60 for w in words)
+
+
 def test_describe_image_does_not_crash():
     test_image = ASSETS_DIR / "sample_frame.jpg"
     data = [{"path": str(test_image), "frame_number": 0, "text": "Test"}]
@@ -123,7 +258,7 @@ def test_describe_image_does_not_crash():
             mock_model.generate.return_value = [[1, 2, 3]]
             mock_proc.decode.return_value = "Eine Szene mit Menschen."
 
-            gen = describe_image(data)
+            gen = describe_image(data, quality="high")
             try:
                 while True:
                     step = next(gen)
@@ -137,9 +272,44 @@ def test_describe_image_does_not_crash():
                 result = e.value
             assert len(result) == 1
             assert "description" in result[0]
+            assert result[0]["caption_tier"] == "large"
             print(f"description: {result[0]['description']}")
 
 
+def test_describe_image_tiered(monkeypatch):
+    monkeypatch.setenv("SKIPP_LARGE_AI_TESTS", "NO")
+    data = [{"path": str(ASSETS_DIR / "sample_frame.jpg"), "frame_number": 0},
+            {"path": str(ASSETS_DIR / "text_frame.png"), "frame_number": 1}]
+
+    with patch("NoKeeA.AI.video2text.visual_complexity", side_effect=[0.01, 0.5]), \
+            patch("NoKeeA.AI.video2text.load_small_image_description_model",
+                  return_value="✅ Schnelle Bilderkennung geladen"), \
+            patch("NoKeeA.AI.video2text.load_image_description_model",
+                  return_value="✅ Bilderkennung geladen"), \
+            patch("NoKeeA.AI.video2text.caption_frame", side_effect=["klein", "groß"]) as mock_caption:
+        gen = describe_image(data)
+        steps = []
+        try:
+            while True:
+                steps.append(next(gen))
+        except StopIteration as e:
+            result = e.value
+
+    assert "✅ Schnelle Bilderkennung geladen" in steps
+    assert "✅ Bilderkennung geladen" in steps
+    assert [frame["caption_tier"] for frame in result] == ["small", "large"]
+    assert [frame["description"] for frame in result] == ["klein", "groß"]
+    assert mock_caption.call_count == 2
+
+
+def test_visual_complexity():
+    from NoKeeA.AI.video2text import visual_complexity
+
+    complexity = visual_complexity(str(ASSETS_DIR / "text_frame.png"))
+    assert 0 < complexity < 1
+    assert visual_complexity(str(ASSETS_DIR / "missing.png")) == 0.0
+
+
 def test_prompt_building():
     video_desc = [
         {
@@ -162,6 +332,44 @@ def test_prompt_building():
     assert "* Description of szene: Ein Logo wird gezeigt" in prompt
 
 
+def count_words(text):
+    return len(text.split())
+
+
+def test_prompt_deduplicates_screen_text():
+    slide = {"text": "Kapitel 1\n  Einleitung", "description": "a slide"}
+    video_desc = [
+        {"start": 0, "end": 2, "text": "Erster Satz.", "frames": [slide]},
+        {"start": 2, "end": 4, "text": "Zweiter Satz.",
+         "frames": [{"text": "kapitel 1 einleitung", "description": "A slide"}]},
+    ]
+    prompt, stats = build_prompt_with_stats(video_desc, count_tokens=count_words)
+    assert prompt.count("Text on screen") == 1
+    assert prompt.count("Description of szene") == 1
+    assert "Erster Satz." in prompt and "Zweiter Satz." in prompt
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_prompt_respects_token_budget_by_priority():
+    video_desc = [
+        {"start": i, "end": i + 1, "text": f"Gesprochen {i}.",
+         "frames": [{"text": f"Folie {i}", "description": f"Bild {i} mit viel Inhalt"}]}
+        for i in range(10)
+    ]
+    full, full_stats = build_prompt_with_stats(video_desc, count_tokens=count_words)
+    # Nothing is repeated, so the full prompt is as long as the uncompacted one, segment headers included
+    assert full_stats["tokens_before"] == full_stats["tokens_after"]
+    budget = count_words(PROMPT_PREAMBLE) + 60
+    prompt, stats = build_prompt_with_stats(
+        video_desc, token_budget=budget, count_tokens=count_words)
+
+    assert stats["tokens_after"] <= budget < full_stats["tokens_after"]
+    assert stats["dropped_spoken"] == 0
+    assert stats["dropped_descriptions"] > 0
+    assert all(f"Gesprochen {i}." in prompt for i in range(10))
+    assert prompt.startswith(PROMPT_PREAMBLE)
+
+
 @patch("NoKeeA.AI.video2text.OpenAI")
 def test_use_openai_mocked(mock_openai):
     from NoKeeA.AI.video2text import use_openai
@@ -180,7 +388,8 @@ def test_use_openai_mocked(mock_openai):
     # Assertions
     assert isinstance(response, str)
     assert "Test" in response
-    mock_openai.assert_called_once_with(api_key="test-key")
+    mock_openai.assert_called_once()
+    assert mock_openai.call_args.kwargs["api_key"] == "test-key"
     mock_client.chat.completions.create.assert_called_once()
 
 
@@ -191,15 +400,6 @@ def test_video2text_end_to_end(monkeypatch):
     test_video_path = Path("tests/assets/test_video.mp4")
     video_data = test_video_path.read_bytes()
 
-    class DummyVideo:
-        def __init__(self, data):
-            self._data = data
-            self.type = "video/mp4"
-
-        def read(self): return self._data
-
-        def getbuffer(self): return self._data
-
     fake_video = DummyVideo(video_data)
 
     # ---- Mock für OpenAI ----
@@ -246,3 +446,249 @@ def test_video2text_end_to_end(monkeypatch):
     assert isinstance(video_desc, list)
     assert len(video_desc) > 0
     assert "text" in video_desc[0]
+
+
+def test_load_image_description_model_precisions():
+    from NoKeeA.AI import video2text as v2t
+
+    with pytest.raises(ValueError):
+        v2t.load_image_description_model("fp8")
+
+    with patch("NoKeeA.AI.video2text.Blip2Processor") as mock_proc, \
+            patch("NoKeeA.AI.video2text.Blip2ForConditionalGeneration") as mock_model, \
+            patch("torch.ao.quantization.quantize_dynamic") as mock_quantize, \
+            patch.multiple(v2t, blip_model=None, blip_processor=None, blip_precision=None,
+                           blip_requested_backend=None, blip_backend=None):
+        assert v2t.load_image_description_model("bf16") == "✅ Bilderkennung geladen"
+        kwargs = mock_model.from_pretrained.call_args.kwargs
+        assert kwargs["torch_dtype"] == v2t.torch.bfloat16
+        assert kwargs["low_cpu_mem_usage"] is True
+        mock_quantize.assert_not_called()
+        assert v2t.load_image_description_model("bf16") == "⏭️ Bilderkennung geladen"
+
+        assert v2t.load_image_description_model("int8") == "✅ Bilderkennung geladen"
+        mock_quantize.assert_called_once()
+        assert v2t.blip_precision == "int8"
+        assert mock_proc.from_pretrained.call_count == 2
+
+
+def test_load_image_description_model_records_tracing_fallback():
+    from NoKeeA.AI import video2text as v2t
+
+    with patch("NoKeeA.AI.video2text.Blip2Processor") as mock_proc, \
+            patch("NoKeeA.AI.video2text.Blip2ForConditionalGeneration"), \
+            patch("NoKeeA.AI.video2text.trace_caption_model",
+                  side_effect=lambda model, example: (model, "eager")) as mock_trace, \
+            patch.multiple(v2t, blip_model=None, blip_processor=None, blip_precision=None,
+                           blip_requested_backend=None, blip_backend=None):
+        assert v2t.load_image_description_model("fp32", "torchscript") == "✅ Bilderkennung geladen"
+        mock_trace.assert_called_once()
+        assert v2t.blip_backend == "eager"
+
+        # The fallback does not make every later request for TorchScript reload the model
+        assert v2t.load_image_description_model("fp32", "torchscript") == "⏭️ Bilderkennung geladen"
+        assert mock_proc.from_pretrained.call_count == 1
+
+
+def test_split_into_chunks():
+    from NoKeeA.AI.video2text import split_into_chunks
+
+    segments = [{"start": s, "end": s + 5, "text": str(s), "frames": []}
+                for s in (0, 5, 61, 65, 200)]
+    chunks = split_into_chunks(segments, chunk_seconds=60)
+    assert [[segment["start"] for segment in chunk] for chunk in chunks] == [
+        [0, 5], [61, 65], [200]]
+
+
+def test_summarize_hierarchical(monkeypatch):
+    from NoKeeA.AI.video2text import summarize_hierarchical
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    segments = [{"start": s, "end": s + 5, "text": f"Satz {s}", "frames": []}
+                for s in (0, 70, 130)]
+    prompts = []
+
+    def fake_summary(prompt):
+        prompts.append(prompt)
+        if prompt.startswith("The following texts are summaries"):
+            return "Gesamt"
+        return f"Teil {len(prompts)}"
+
+    with patch("NoKeeA.AI.video2text.generate_summary", side_effect=fake_summary):
+        gen = summarize_hierarchical(segments, chunk_seconds=60, max_workers=2)
+        steps = []
+        try:
+            while True:
+                steps.append(next(gen))
+        except StopIteration as e:
+            result = e.value
+
+    sections = [step for step in steps if isinstance(step, dict)]
+    assert sorted(section["index"] for section in sections) == [0, 1, 2]
+    assert all(section["count"] == 3 for section in sections)
+    assert "✅ 3 Abschnitte zusammengefasst" in steps
+    assert result == "Gesamt"
+    assert len(prompts) == 4
+    assert all(section["text"] in prompts[-1] for section in sections)
+
+
+def test_summarize_hierarchical_stops_when_cancelled(monkeypatch):
+    import NoKeeA.AI.video2text as v2t
+    from NoKeeA.AI import deadline
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(deadline, "CANCEL_POLL_INTERVAL", 0.0)
+    segments = [{"start": s, "end": s + 5, "text": f"Satz {s}", "frames": []}
+                for s in range(0, 480, 60)]
+    prompts = []
+
+    def fake_summary(prompt):
+        prompts.append(prompt)
+        time.sleep(0.05)
+        return "Teil"
+
+    monkeypatch.setattr(v2t, "generate_summary", fake_summary)
+    cancelled = []
+    token = deadline.DeadlineToken(cancelled=lambda: bool(cancelled))
+
+    gen = v2t.checked(v2t.summarize_hierarchical(segments, chunk_seconds=60, max_workers=1), token)
+    with pytest.raises(deadline.Cancelled):
+        for step in gen:
+            if isinstance(step, dict):
+                cancelled.append(True)
+    # Only the part already started is summarized after the cancellation
+    assert len(prompts) <= 2
+
+
+@patch("NoKeeA.AI.video2text.OpenAI")
+def test_summarize_streaming_openai(mock_openai, monkeypatch):
+    from NoKeeA.AI.video2text import summarize_streaming
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    chunks = [MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+              for text in ("Das ", None, "ist ", "gut.")]
+    mock_openai.return_value.chat.completions.create.return_value = iter(chunks)
+
+    gen = summarize_streaming("Prompt")
+    steps = []
+    try:
+        while True:
+            steps.append(next(gen))
+    except StopIteration as e:
+        result = e.value
+
+    assert [step["text"] for step in steps if isinstance(step, dict)] == [
+        "Das ", "ist ", "gut."]
+    assert isinstance(steps[-1], str) and "erste Ausgabe nach" in steps[-1]
+    assert result == "Das ist gut."
+    assert mock_openai.return_value.chat.completions.create.call_args.kwargs["stream"] is True
+
+
+def test_stream_summary_raises_generation_errors(monkeypatch):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(v2t.model_server, "get_client", lambda: None)
+    monkeypatch.setattr(v2t, "deepseek_inputs", lambda prompt: {})
+    monkeypatch.setattr(v2t, "deepseek_tokenizer", MagicMock())
+
+    def deepseek_generate(**kwargs):
+        raise RuntimeError("CUDA out of memory")
+
+    monkeypatch.setattr(v2t, "deepseek_generate", deepseek_generate)
+    # The consumer must not wait for pieces of a generation that failed
+    with pytest.raises(RuntimeError, match="CUDA out of memory"):
+        list(v2t.stream_summary("Prompt"))
+
+
+def test_summary_cache(monkeypatch, tmp_path):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(v2t, "SUMMARY_CACHE_FOLDER", tmp_path)
+    monkeypatch.setattr(v2t, "summary_cache_stats", {"hits": 0, "misses": 0})
+    data = b"summary cache video"
+    video = DummyVideo(data)
+    video_text = [{"start": 0, "end": 5, "text": "Hallo Welt", "frames": []}]
+    calls = []
+
+    def cached_stage(stage, inputs, params, name, run, valid=None, token=None):
+        yield f"⏭️ {name} aus dem Cache geladen"
+        if stage == "probe":
+            return stage, run(stage)
+        if stage == "audio":
+            return stage, str(tmp_path / "audio.wav")
+        return stage, video_text if stage == "matching" else {"segments": []}
+
+    def fake_summary(prompt):
+        calls.append(prompt)
+        yield "✅ Zusammengefasst"
+        return f"Zusammenfassung {len(calls)}"
+
+    def run(**kwargs):
+        gen = video2text(video, summary_mode="single", **kwargs)
+        steps = []
+        try:
+            while True:
+                steps.append(next(gen))
+        except StopIteration as e:
+            return steps, e.value
+
+    monkeypatch.setattr(v2t, "run_stage", cached_stage)
+    with patch("NoKeeA.AI.video2text.summarize_with_deepseek", side_effect=fake_summary):
+        _, first = run()
+        steps, second = run()
+        _, regenerated = run(regenerate=True)
+        monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:8001/v1")
+        _, other_backend = run()
+
+    assert first == second == "Zusammenfassung 1"
+    assert any(isinstance(step, str) and "aus dem Cache" in step for step in steps)
+    assert regenerated == "Zusammenfassung 2"
+    assert other_backend == "Zusammenfassung 3"
+    assert len(calls) == 3
+    assert v2t.summary_cache_stats == {"hits": 1, "misses": 2}
+
+
+def test_auto_summary_mode_uses_length_of_time_ranges(monkeypatch, tmp_path):
+    import NoKeeA.AI.video2text as v2t
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(v2t, "SUMMARY_CACHE_FOLDER", tmp_path)
+    info = {"duration": 7200.0, "has_video": True, "has_audio": True, "video_codec": "h264", "audio_codec": "aac",
+            "width": 640, "height": 360, "fps": 25.0, "frame_count": 180000, "source": "ffprobe"}
+    # A two minute range one hour into the video
+    video_text = [{"start": 3600, "end": 3720, "text": "Hallo Welt", "frames": []}]
+
+    def cached_stage(stage, inputs, params, name, run, valid=None, token=None):
+        yield f"⏭️ {name} aus dem Cache geladen"
+        if stage == "probe":
+            return stage, {"info": info, "static": False}
+        if stage == "audio":
+            return stage, str(tmp_path / "audio.wav")
+        return stage, video_text if stage == "matching" else {"segments": []}
+
+    def fake_summary(prompt):
+        yield "✅ Zusammengefasst"
+        return "Zusammenfassung"
+
+    monkeypatch.setattr(v2t, "run_stage", cached_stage)
+    with patch("NoKeeA.AI.video2text.summarize_with_deepseek", side_effect=fake_summary), \
+            patch("NoKeeA.AI.video2text.summarize_hierarchical") as mock_hierarchical:
+        steps = list(v2t.video2text(DummyVideo(b"range video"), ranges=[[3600, 3720]]))
+    mock_hierarchical.assert_not_called()
+    assert "✅ Zusammengefasst" in steps
+
+
+def test_match_frames_with_audio_assigns_every_frame_once():
+    from NoKeeA.AI.video2text import match_frames_with_audio
+
+    segments = [{"start": 10, "end": 20, "text": "b"}, {"start": 0, "end": 10, "text": "a"},
+                {"start": 12, "end": 15, "text": "c"}, {"start": 30, "end": 40, "text": "d"}]
+    frames = [{"frame_number": i, "timestamp": timestamp}
+              for i, timestamp in enumerate([-1, 0, 10, 13, 16, 21, 26, 25, 45])]
+    matched = match_frames_with_audio(frames, segments)
+    # Borders belong to the starting segment, overlaps to the latest running one, pauses to the nearer segment
+    assert {segment["text"]: [frame["timestamp"] for frame in segment["frames"]] for segment in matched} == {
+        "a": [-1, 0], "b": [10, 16, 21, 25], "c": [13], "d": [26, 45]}
+    assert match_frames_with_audio(frames, []) == []
@@ -1,3 +1,5 @@
+import re
+
 import pytest
 from unittest.mock import patch, MagicMock, call
 import streamlit as st
@@ -13,11 +15,11 @@ def mock_session_state():
         "video2text_file_content": MagicMock(name="UploadedFile"),
         "video2text_progress_bar_text": "Frames werden extrahiert.",
     }
-    with patch.dict(st.session_state, state, clear=True):
+    with patch.dict(st.session_state, state, clear=True), patch("NoKeeA.AI.jobs.JOB_MODE", "inline"):
         yield
 
 
-def fake_video2text_generator(_file):
+def fake_video2text_generator(_file, **_kwargs):
     # Simuliert die Rückgabe von Fortschritt und Erfolgsmeldungen
     yield "✅ Datei gespeichert"
     yield "✅ Audio extrahiert"
@@ -81,3 +83,267 @@ def test_video2text_workflow(mock_button, mock_file_uploader, mock_progress, moc
         state="complete",
         expanded=False,
     )
+
+
+def fake_hierarchical_generator(_file, **_kwargs):
+    yield {"event": "section", "index": 1, "count": 2, "start": 600, "end": 900, "text": "Teil 2"}
+    assert st.session_state["editor_content"] == "<p>Alt</p><p>Teil 2</p>"
+    yield {"event": "section", "index": 0, "count": 2, "start": 0, "end": 600, "text": "Teil 1"}
+    assert st.session_state["editor_content"] == "<p>Alt</p><p>Teil 1</p><p>Teil 2</p>"
+    return "Gesamt"
+
+
+@patch("NoKeeA.AI.video2text.video2text", side_effect=fake_hierarchical_generator)
+@patch("streamlit.markdown")
+@patch("streamlit.write")
+@patch("streamlit.success")
+@patch("streamlit.status")
+@patch("streamlit.file_uploader")
+@patch("streamlit.button")
+def test_video2text_inserts_sections_progressively(mock_button, mock_file_uploader, mock_status, mock_success,
+                                                   mock_write, mock_markdown, mock_v2t, mock_session_state):
+    mock_button.side_effect = [False, True]
+    st.session_state["editor_content"] = "<p>Alt</p>"
+
+    with patch("streamlit.rerun"):
+        video2text()
+
+    assert mock_markdown.call_count == 2
+    assert st.session_state["editor_content"] == "<p>Alt</p><p>Gesamt</p>"
+
+
+def fake_streaming_generator(_file, **kwargs):
+    assert kwargs["stream"] is True
+    yield {"event": "token", "text": "Hallo "}
+    yield {"event": "token", "text": "Welt"}
+    yield "✅ Zusammenfassung in 2.0 s erstellt (erste Ausgabe nach 0.5 s)"
+    return "Hallo Welt"
+
+
+@patch("NoKeeA.AI.video2text.video2text", side_effect=fake_streaming_generator)
+@patch("streamlit.empty")
+@patch("streamlit.write")
+@patch("streamlit.success")
+@patch("streamlit.status")
+@patch("streamlit.file_uploader")
+@patch("streamlit.button")
+def test_video2text_renders_tokens_live(mock_button, mock_file_uploader, mock_status, mock_success,
+                                        mock_write, mock_empty, mock_v2t, mock_session_state):
+    mock_button.side_effect = [False, True]
+
+    with patch("streamlit.rerun"):
+        video2text()
+
+    mock_empty.assert_called_once()
+    mock_empty.return_value.markdown.assert_has_calls(
+        [call("Hallo "), call("Hallo Welt")])
+    assert st.session_state["editor_content"].endswith("<p>Hallo Welt</p>")
+
+
+def fake_save_video(_file):
+    yield "✅ Datei gespeichert"
+    return "tmp/abc.video.mp4"
+
+
+@patch("NoKeeA.AI.video2text.save_video", side_effect=fake_save_video)
+@patch("streamlit.file_uploader")
+@patch("streamlit.button")
+def test_video2text_background_job(mock_button, mock_file_uploader, mock_save, tmp_path):
+    from NoKeeA.AI import jobs
+    from NoKeeA.UI import streamlit_content
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    state = {
+        "show_video2text_uploader": True,
+        "editor_content": "<p>Alt</p>",
+        "video2text_jobs": [],
+    }
+    mock_button.side_effect = [False, True]
+    with patch.dict(st.session_state, state, clear=True), patch("NoKeeA.AI.jobs.JOB_MODE", "background"), \
+            patch("NoKeeA.AI.jobs.get_queue", return_value=queue), \
+            patch.object(queue, "ensure_workers") as mock_workers, patch("streamlit.rerun"):
+        video2text()
+        mock_workers.assert_called_once()
+        job_id, = st.session_state["video2text_jobs"]
+        assert queue.get(job_id)["params"] == {"caption_quality": "fast", "stream": True, "regenerate": False}
+
+        queue.heartbeat(1)
+        queue.claim(1)
+        queue.finish(job_id, "Zusammenfassung")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Zusammenfassung</p>"
+        assert st.session_state["video2text_jobs"] == []
+        assert queue.get(job_id)["collected"]
+
+        # Collected results are never inserted twice, e.g. after a page reload
+        st.session_state["video2text_jobs"] = [job_id]
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Zusammenfassung</p>"
+
+
+@patch("streamlit.markdown")
+@patch("streamlit.progress")
+def test_video2text_job_inserts_sections_into_note(mock_progress, mock_markdown, tmp_path):
+    from NoKeeA.AI import jobs
+    from NoKeeA.UI import streamlit_content
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    job_id = queue.submit("tmp/a.video.mp4")
+    queue.heartbeat(1)
+    queue.claim(1)
+    section = {"event": "section", "index": 0, "count": 2, "start": 0, "end": 60}
+    with patch.dict(st.session_state, {"editor_content": "<p>Alt</p>", "video2text_jobs": [job_id]},
+                    clear=True), patch("NoKeeA.AI.jobs.get_queue", return_value=queue), \
+            patch.object(queue, "ensure_workers") as mock_workers, patch("streamlit.rerun") as mock_rerun:
+        queue.update(job_id, sections={"0": {**section, "text": "Teil 1"}})
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert "<p>Teil 1</p>" in st.session_state["editor_content"]
+        mock_rerun.assert_called_once()
+        # Polling replaces workers that died while the job ran
+        mock_workers.assert_called_once()
+
+        # Quill re-serializes the note, the block is still found by its anchors
+        st.session_state["editor_content"] = st.session_state["editor_content"].replace(
+            '">', '" rel="noopener noreferrer" target="_blank">') + "<p>Neu</p>"
+        queue.update(job_id, sections={"0": {**section, "text": "Teil 1"},
+                                       "1": {**section, "index": 1, "text": "Teil 2"}})
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"].count("Teil 1") == 1
+        assert "<p>Teil 1</p><p>Teil 2</p>" in st.session_state["editor_content"]
+
+        # Polling without new sections leaves the editor alone
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert mock_rerun.call_count == 2
+
+        queue.finish(job_id, "Zusammenfassung")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Zusammenfassung</p><p>Neu</p>"
+
+
+@patch("streamlit.button")
+def test_video2text_job_cancel_and_degradation_note(mock_button, tmp_path):
+    from NoKeeA.AI import jobs
+    from NoKeeA.UI import streamlit_content
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    cancelled = queue.submit("tmp/a.video.mp4")
+    degraded = queue.submit("tmp/b.video.mp4", {"deadline": 60})
+    queue.heartbeat(1)
+    queue.claim(1)
+    mock_button.side_effect = lambda label, key=None: key == f"video2text_cancel_{cancelled}"
+    with patch.dict(st.session_state, {"editor_content": "", "video2text_jobs": [cancelled, degraded]},
+                    clear=True), patch("NoKeeA.AI.jobs.get_queue", return_value=queue), \
+            patch.object(queue, "ensure_workers"):
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert queue.get(cancelled)["cancel_requested"]
+        assert queue.get(degraded)["status"] == "queued"
+
+        queue.update(cancelled, status="cancelled")
+        queue.claim(1)
+        queue.update(degraded, metrics={"degradations": ["skip_captions"]})
+        queue.finish(degraded, "Zusammenfassung")
+        with patch("streamlit.rerun"):
+            streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["video2text_jobs"] == []
+        assert st.session_state["editor_content"] == (
+            "<p>Zusammenfassung</p><p><em>Wegen der Frist mit reduzierter Qualität erstellt: "
+            "ohne Bildbeschreibung</em></p>")
+
+
+def test_video2text_full_summary_replaces_draft(tmp_path):
+    from NoKeeA.AI import jobs
+    from NoKeeA.UI import streamlit_content
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    with patch.dict(st.session_state, {"editor_content": "<p>Alt</p>", "video2text_jobs": [],
+                                       "video2text_file_content": MagicMock()}, clear=True), \
+            patch("NoKeeA.AI.video2text.save_video", side_effect=fake_save_video), \
+            patch("NoKeeA.AI.jobs.get_queue", return_value=queue), patch.object(queue, "ensure_workers"), \
+            patch("streamlit.rerun"):
+        streamlit_content.submit_video2text_job(False, False, draft=True)
+        draft_id, full_id = st.session_state["video2text_jobs"]
+        assert queue.get(draft_id)["params"]["draft"]
+        assert queue.get(full_id)["replaces"] == draft_id
+
+        queue.heartbeat(1)
+        assert queue.claim(1)["id"] == draft_id
+        queue.finish(draft_id, "Entwurf\nmit Q&A")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert "<p>Entwurf\nmit Q&A</p>" in st.session_state["editor_content"]
+        assert "Entwurf: Wird durch die vollständige Zusammenfassung ersetzt" in st.session_state["editor_content"]
+        assert st.session_state["video2text_jobs"] == [full_id]
+
+        st.session_state["editor_content"] = quill(st.session_state["editor_content"]) + "<p>Neu</p>"
+        assert queue.claim(1)["id"] == full_id
+        queue.finish(full_id, "Zusammenfassung")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Zusammenfassung</p><p>Neu</p>"
+
+
+def quill(html):
+    """
+    Re-serializes HTML like the Quill editor: newlines become spaces, entities are escaped and links get
+    rel and target attributes.
+    """
+    html = html.replace("\n", " ").replace("&", "&amp;")
+    return re.sub(r'<a href="([^"]*)">', r'<a href="\1" rel="noopener noreferrer" target="_blank">', html)
+
+
+@patch("streamlit.error")
+def test_video2text_draft_note_is_removed_when_full_summary_fails(mock_error, tmp_path):
+    from NoKeeA.AI import jobs
+    from NoKeeA.UI import streamlit_content
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    with patch.dict(st.session_state, {"editor_content": "<p>Alt</p>", "video2text_jobs": [],
+                                       "video2text_file_content": MagicMock()}, clear=True), \
+            patch("NoKeeA.AI.video2text.save_video", side_effect=fake_save_video), \
+            patch("NoKeeA.AI.jobs.get_queue", return_value=queue), patch.object(queue, "ensure_workers"), \
+            patch("streamlit.rerun"):
+        streamlit_content.submit_video2text_job(False, False, draft=True)
+        draft_id, full_id = st.session_state["video2text_jobs"]
+        queue.heartbeat(1)
+        queue.claim(1)
+        queue.finish(draft_id, "Entwurf")
+        streamlit_content.video2text_jobs.__wrapped__()
+
+        st.session_state["editor_content"] = quill(st.session_state["editor_content"])
+        queue.claim(1)
+        queue.fail(full_id, "MemoryError: zu wenig Speicher")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Entwurf</p>"
+
+        # A draft finishing after the full summary failed is inserted without the note
+        st.session_state["video2text_jobs"] = []
+        streamlit_content.submit_video2text_job(False, False, draft=True)
+        draft_id, full_id = st.session_state["video2text_jobs"]
+        queue.claim(1)
+        queue.update(full_id, status="cancelled")
+        streamlit_content.video2text_jobs.__wrapped__()
+        queue.finish(draft_id, "Zweiter Entwurf")
+        streamlit_content.video2text_jobs.__wrapped__()
+        assert st.session_state["editor_content"] == "<p>Alt</p><p>Entwurf</p><p>Zweiter Entwurf</p>"
+
+
+@patch("streamlit.error")
+@patch("streamlit.text_input")
+@patch("streamlit.button")
+def test_video2text_job_with_time_ranges(mock_button, mock_text_input, mock_error, tmp_path):
+    from NoKeeA.AI import jobs
+
+    queue = jobs.JobQueue(tmp_path / "jobs.sqlite3")
+    state = {"show_video2text_uploader": True, "editor_content": "", "video2text_jobs": []}
+    mock_button.side_effect = [False, True, False, True]
+    mock_text_input.side_effect = ["1:00-5:30, 10:00-12:00", "5:30"]
+    with patch.dict(st.session_state, state, clear=True), patch("NoKeeA.AI.jobs.JOB_MODE", "background"), \
+            patch("NoKeeA.AI.video2text.save_video", side_effect=fake_save_video), \
+            patch("streamlit.file_uploader", return_value=MagicMock()), \
+            patch("NoKeeA.AI.jobs.get_queue", return_value=queue), patch.object(queue, "ensure_workers"), \
+            patch("streamlit.rerun"):
+        video2text()
+        job_id, = st.session_state["video2text_jobs"]
+        assert queue.get(job_id)["params"]["ranges"] == [[60, 330], [600, 720]]
+
+        video2text()
+        mock_error.assert_called_once()
+        assert st.session_state["video2text_jobs"] == [job_id]